@@ -0,0 +1,274 @@
+"""Load benchmark for the sample AuthProtocol implementations and the auth routes
+
+By default every scenario runs in-process: HTTP scenarios go through an ASGI client against the test webserver
+app, so results measure the auth code rather than the network. With `--url`, the HTTP scenarios (restapi.*,
+route.*) go to a running test webserver instead, i.e. to compare worker counts.
+
+Usage:
+    python benchmarks/bench_auth.py                                   # all scenarios
+    python benchmarks/bench_auth.py --scenarios route.check simple.check_auth --concurrency 100
+    python benchmarks/bench_auth.py --save benchmarks/baseline.json   # record a baseline
+    python benchmarks/bench_auth.py --compare benchmarks/baseline.json --fail-on-regression
+    AUTH_WORKERS=4 AUTH_USER_LOGIN_LIMIT=1000000 AUTH_ADDRESS_LOGIN_LIMIT=1000000 python src_test_webserver/main.py
+    python benchmarks/bench_auth.py --url http://localhost:8000 --scenarios route.check route.token
+"""
+import argparse
+import asyncio
+import json
+import platform
+import sys
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT / "src_dev"), str(ROOT / "src_test_webserver")]
+
+import httpx  # noqa: E402
+from loguru import logger  # noqa: E402
+from shinylive_auth import SecretStr  # noqa: E402
+
+USERNAME = "username"
+PASSWORD = "password"
+GROUPS_NEEDED = ["group1"]
+
+
+@dataclass
+class Result:
+    requests: int
+    errors: int
+    seconds: float
+    rps: float
+    mean_ms: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+
+
+# A scenario builds one async call per worker; the call is awaited repeatedly and may keep its own state
+Scenario = Callable[[], Awaitable[Callable[[], Awaitable[None]]]]
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def run_scenario(scenario: Scenario, requests: int, concurrency: int) -> Result:
+    workers = [await scenario() for _ in range(min(concurrency, requests))]
+    remaining = requests
+    latencies: List[float] = []
+    errors = 0
+
+    async def worker(call: Callable[[], Awaitable[None]]):
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                await call()
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker(call) for call in workers])
+    seconds = time.perf_counter() - start
+    latencies.sort()
+    return Result(
+        requests=len(latencies),
+        errors=errors,
+        seconds=round(seconds, 4),
+        rps=round(len(latencies) / seconds, 1),
+        mean_ms=round(sum(latencies) / len(latencies) * 1000, 3),
+        p50_ms=round(percentile(latencies, 50) * 1000, 3),
+        p95_ms=round(percentile(latencies, 95) * 1000, 3),
+        p99_ms=round(percentile(latencies, 99) * 1000, 3),
+    )
+
+
+##########################################################################
+# Scenarios
+##########################################################################
+def asgi_client() -> httpx.AsyncClient:
+    from main import app
+
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+
+
+def http_client(url: str, concurrency: int) -> httpx.AsyncClient:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    return httpx.AsyncClient(base_url=url, limits=limits, timeout=60)
+
+
+def simple_auth():
+    from simple_security.auth import SimpleAuth
+
+    return SimpleAuth(groups_needed=GROUPS_NEEDED)
+
+
+def restapi_auth(client: httpx.AsyncClient, **kwargs):
+    from restapi_security.auth import RestAPIAuth
+    from restapi_security.transport import HTTPXTransport, ResilientTransport
+
+    return RestAPIAuth(
+        groups_needed=GROUPS_NEEDED,
+        base_url=str(client.base_url).rstrip("/"),
+        transport=ResilientTransport(HTTPXTransport(client=client)),
+        **kwargs,
+    )
+
+
+def make_scenarios(url: Optional[str] = None, concurrency: int = 1) -> Dict[str, Scenario]:
+    import app_security
+
+    client = asgi_client() if url is None else http_client(url, concurrency)
+    # Every scenario logs in as the same user from the same address; measure auth work, not the rate limiter
+    # (a server started for `--url` needs AUTH_USER_LOGIN_LIMIT/AUTH_ADDRESS_LOGIN_LIMIT raised instead)
+    app_security.user_limiter.limit = app_security.address_limiter.limit = sys.maxsize
+
+    async def simple_get_auth():
+        app_auth = simple_auth()
+        return lambda: app_auth.get_auth(USERNAME, SecretStr(PASSWORD))
+
+    async def simple_check_auth():
+        # SimpleAuth rotates tokens, so each worker follows its own token chain
+        app_auth = simple_auth()
+        state = {"token": await app_auth.get_auth(USERNAME, SecretStr(PASSWORD))}
+
+        async def call():
+            state["token"] = await app_auth.check_auth(state["token"])
+        return call
+
+    async def restapi_get_auth():
+        app_auth = restapi_auth(client)
+        return lambda: app_auth.get_auth(USERNAME, SecretStr(PASSWORD))
+
+    async def restapi_check_auth():
+        app_auth = restapi_auth(client)
+        state = {"token": await app_auth.get_auth(USERNAME, SecretStr(PASSWORD))}
+
+        async def call():
+            state["token"] = await app_auth.check_auth(state["token"])
+        return call
+
+    # One RestAPIAuth shared by every worker, as in one Shiny server process
+    batched = {}
+
+    async def restapi_check_auth_batched():
+        if "auth" not in batched:
+            batched["auth"] = restapi_auth(client, batch_window=0.002)
+        app_auth = batched["auth"]
+        state = {"token": await app_auth.get_auth(USERNAME, SecretStr(PASSWORD))}
+
+        async def call():
+            state["token"] = await app_auth.check_auth(state["token"])
+        return call
+
+    async def route_token():
+        body = {"username": USERNAME, "password": PASSWORD, "groups_needed": GROUPS_NEEDED}
+
+        async def call():
+            (await client.post("/auth/token", json=body)).raise_for_status()
+        return call
+
+    async def route_check():
+        response = await client.post(
+            "/auth/token", json={"username": USERNAME, "password": PASSWORD, "groups_needed": GROUPS_NEEDED}
+        )
+        body = {"token": response.json()["token"], "groups_needed": GROUPS_NEEDED}
+
+        async def call():
+            (await client.post("/auth/check", json=body)).raise_for_status()
+        return call
+
+    return {
+        "simple.get_auth": simple_get_auth,
+        "simple.check_auth": simple_check_auth,
+        "restapi.get_auth": restapi_get_auth,
+        "restapi.check_auth": restapi_check_auth,
+        "restapi.check_auth_batched": restapi_check_auth_batched,
+        "route.token": route_token,
+        "route.check": route_check,
+    }
+
+
+# Logins hash passwords on purpose, so they get far fewer requests by default
+LOGIN_SCENARIOS = {"simple.get_auth", "restapi.get_auth", "route.token"}
+
+
+##########################################################################
+# Reporting
+##########################################################################
+def print_table(results: Dict[str, Result]):
+    header = f"{'scenario':<28} {'requests':>9} {'errors':>7} {'req/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        print(f"{name:<28} {r.requests:>9} {r.errors:>7} {r.rps:>10} {r.p50_ms:>9} {r.p95_ms:>9} {r.p99_ms:>9}")
+
+
+def compare(results: Dict[str, Result], baseline_path: Path, threshold: float) -> bool:
+    """Print changes against a saved baseline; returns True if any scenario regressed beyond `threshold`"""
+    baseline = json.loads(baseline_path.read_text())["results"]
+    regressed = False
+    print(f"\nCompared with {baseline_path} (regression threshold {threshold:.0%})")
+    for name, r in results.items():
+        if name not in baseline:
+            continue
+        old = baseline[name]
+        rps_change = (r.rps - old["rps"]) / old["rps"] if old["rps"] else 0.0
+        p95_change = (r.p95_ms - old["p95_ms"]) / old["p95_ms"] if old["p95_ms"] else 0.0
+        flag = rps_change < -threshold or p95_change > threshold
+        regressed = regressed or flag
+        print(f"{name:<28} req/s {rps_change:+7.1%}   p95 {p95_change:+7.1%}{'   REGRESSION' if flag else ''}")
+    return regressed
+
+
+async def main(args: argparse.Namespace) -> int:
+    scenarios = make_scenarios(args.url, args.concurrency)
+    logger.remove()  # route logging would dominate the measurement
+    names = args.scenarios or list(scenarios)
+    results = {}
+    for name in names:
+        requests = args.login_requests if name in LOGIN_SCENARIOS else args.requests
+        results[name] = await run_scenario(scenarios[name], requests, args.concurrency)
+    print_table(results)
+
+    if args.save:
+        args.save.write_text(json.dumps({
+            "meta": {
+                "created": datetime.now(timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "concurrency": args.concurrency,
+                "url": args.url,
+            },
+            "results": {name: asdict(r) for name, r in results.items()},
+        }, indent=2))
+        print(f"\nSaved results to {args.save}")
+    if args.compare and compare(results, args.compare, args.threshold) and args.fail_on_regression:
+        return 1
+    return 0
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="*", help="scenarios to run (default: all)")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per check/route scenario")
+    parser.add_argument("--login-requests", type=int, default=40, help="requests per login scenario")
+    parser.add_argument("--concurrency", type=int, default=20, help="concurrent workers per scenario")
+    parser.add_argument("--url", help="send HTTP scenarios to a running test webserver (i.e. http://localhost:8000)")
+    parser.add_argument("--save", type=Path, help="write results as a JSON baseline")
+    parser.add_argument("--compare", type=Path, help="compare with a JSON baseline")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change counted as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit 1 when --compare finds a regression")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
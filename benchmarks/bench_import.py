@@ -0,0 +1,140 @@
+"""Import-time benchmark for shinylive_auth and the sample auth modules
+
+In shinylive, every module imported before the login form shows is paid on each page load (download, unpack,
+compile and run, in the browser), so import cost is part of time-to-login.
+
+- CPython: each module is imported in fresh interpreters (`--repeat` times); reports the import time and the
+  modules it pulled in (`pydantic` is listed as a reference for what a pydantic dependency adds)
+- Pyodide: times `micropip.install` of the requirements, then each import, in the running interpreter
+
+Usage:
+    python benchmarks/bench_import.py
+    python benchmarks/bench_import.py --modules shinylive_auth simple_security.auth --repeat 20
+    python benchmarks/bench_import.py --save benchmarks/import_baseline.json
+
+    # Pyodide (i.e. the console at https://pyodide.org/en/stable/console.html), in a freshly loaded page:
+    from pyodide.http import pyfetch
+    exec(await (await pyfetch("http://localhost:8000/bench_import.py")).string())   # wherever the file is served
+    await pyodide_main(["shiny", "http://localhost:8000/apps/libs/shinylive_auth-2024.8.4-py3-none-any.whl"])
+"""
+import argparse
+import importlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent if "__file__" in globals() else Path(".")
+PYTHONPATH = [str(ROOT / "src"), str(ROOT / "src_dev"), str(ROOT / "src_test_webserver")]
+MODULES = ["shinylive_auth", "shinylive_auth.backend", "simple_security.auth", "restapi_security.auth", "pydantic"]
+# Third-party packages worth calling out when an import pulls them in
+HEAVY = ("pydantic", "httpx", "loguru", "fastapi")
+
+# Imports `module` once and prints the time taken and the top-level modules it added
+PROBE = """
+import json, sys, time
+before = set(sys.modules)
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "modules": sorted(m for m in set(sys.modules) - before if "." not in m)}}))
+"""
+
+
+@dataclass
+class Result:
+    runs: int
+    median_ms: float
+    min_ms: float
+    max_ms: float
+    modules: int
+    heavy: List[str]
+
+
+def summarize(timings: List[float], modules: Iterable[str]) -> Result:
+    modules = sorted(modules)
+    return Result(
+        runs=len(timings),
+        median_ms=round(statistics.median(timings) * 1000, 2),
+        min_ms=round(min(timings) * 1000, 2),
+        max_ms=round(max(timings) * 1000, 2),
+        modules=len(modules),
+        heavy=[m for m in modules if m in HEAVY],
+    )
+
+
+def measure(module: str, repeat: int) -> Result:
+    """Import `module` in `repeat` fresh interpreters"""
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(PYTHONPATH + [os.environ.get("PYTHONPATH", "")])}
+    # Warm-up run, so every measured run finds compiled bytecode (Pyodide packages ship it, too)
+    subprocess.run([sys.executable, "-c", f"import {module}"], env=env, check=True, capture_output=True)
+    timings, modules = [], set()
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module)], env=env, check=True, capture_output=True, text=True
+        ).stdout
+        probe = json.loads(output.strip().splitlines()[-1])
+        timings.append(probe["seconds"])
+        modules.update(probe["modules"])
+    return summarize(timings, modules)
+
+
+def print_table(results: Dict[str, Result]):
+    header = f"{'module':<24} {'runs':>5} {'median ms':>10} {'min ms':>9} {'max ms':>9} {'modules':>8}  heavy"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        heavy = ", ".join(r.heavy) or "-"
+        print(f"{name:<24} {r.runs:>5} {r.median_ms:>10} {r.min_ms:>9} {r.max_ms:>9} {r.modules:>8}  {heavy}")
+
+
+async def pyodide_main(requirements: Iterable[str] = (), modules: Iterable[str] = ("shinylive_auth",)):
+    """Pyodide: time installing `requirements` (micropip), then importing `modules` in this interpreter
+
+    - Imports share this interpreter, so a module's time excludes anything an earlier one already imported;
+      reload the page between runs
+    """
+    import micropip
+
+    for requirement in requirements:
+        start = time.perf_counter()
+        await micropip.install(requirement)
+        print(f"install {requirement}: {(time.perf_counter() - start) * 1000:.1f} ms")
+    results = {}
+    for module in modules:
+        before = set(sys.modules)
+        start = time.perf_counter()
+        importlib.import_module(module)
+        seconds = time.perf_counter() - start
+        results[module] = summarize([seconds], {m for m in set(sys.modules) - before if "." not in m})
+    print_table(results)
+    return results
+
+
+def main(args: argparse.Namespace) -> int:
+    results = {module: measure(module, args.repeat) for module in args.modules}
+    print_table(results)
+    if args.save:
+        args.save.write_text(json.dumps({
+            "meta": {"python": sys.version.split()[0], "platform": sys.platform, "repeat": args.repeat},
+            "results": {name: asdict(r) for name, r in results.items()},
+        }, indent=2))
+        print(f"\nSaved results to {args.save}")
+    return 0
+
+
+def parse_args(argv: Optional[Iterable[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", nargs="*", default=MODULES, help="modules to import (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=10, help="fresh interpreters per module")
+    parser.add_argument("--save", type=Path, help="write results as JSON")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__" and sys.platform != "emscripten":
+    sys.exit(main(parse_args()))
@@ -0,0 +1,1804 @@
+import asyncio
+import base64
+import binascii
+import bisect
+import hashlib
+import inspect
+import itertools
+import json
+import logging
+import math
+import random
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import (
+    Any, Awaitable, Callable, Dict, FrozenSet, Hashable, Iterable, List, Optional, Protocol, Set, Tuple, TypeVar, Union
+)
+
+from shiny import Inputs, Outputs, Session, module, reactive, ui
+
+DEFAULT_AUTH_MODULE_ID = "shiny_auth_module"
+
+T = TypeVar("T")
+
+
+class SecretStr:
+    """Password wrapper that keeps the value out of reprs, logs and tracebacks
+
+    - Same interface as `pydantic.SecretStr` (which is also accepted everywhere a `SecretStr` is), without
+      importing pydantic in the browser
+    """
+    __slots__ = ("_secret_value",)
+
+    def __init__(self, value: str):
+        self._secret_value = value
+
+    def get_secret_value(self) -> str:
+        return self._secret_value
+
+    def __len__(self) -> int:
+        return len(self._secret_value)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, SecretStr) and self._secret_value == other._secret_value
+
+    def __hash__(self) -> int:
+        return hash(self._secret_value)
+
+    def __str__(self) -> str:
+        return "**********" if self._secret_value else ""
+
+    def __repr__(self) -> str:
+        return f"SecretStr('{self}')"
+
+
+##########################################################################
+##########################################################################
+# Protocol for building custom login/session logic around Shinylive Auth
+##########################################################################
+##########################################################################
+class AuthProtocol(Protocol):
+    permissions: Optional[list] = None
+
+    async def get_auth(self, username: str, password: SecretStr) -> str:
+        """Request Authentication for ShinyLive
+
+        - **Instructions**:
+          - If auth is successful, return a session string (i.e. JWT) to be saved to browser local storage
+          - If auth is invalid, raise `self.ShinyLiveAuthFailed`
+          - If insufficient permissions, raise `self.ShinyLivePermissions`
+          - If the auth server can't be reached, raise `ShinyLiveAuthUnavailable`
+
+        Args:
+            username (str): Valid username
+            password (SecretStr): Vaide password
+        
+        Returns:
+            str: session string (i.e. JWT)
+              
+        Raises:
+            ShinyLiveAuthFailed: failed to validate credentials
+            ShinyLivePermissions: credentials were validated, but user has insufficient permissions for the page/app
+            ShinyLiveAuthUnavailable: the credentials could not be checked (i.e. the auth server is down)
+        """
+        ...
+
+    async def check_auth(self, token: str) -> str:
+        """Check Existing Authentication Session for ShinyLive
+        
+        - **Instructions**:
+          - If existing session is still valide, return a session string (i.e. JWT) to be re-saved to browser local storeage
+          - If session is expired, raise `self.ShinyLiveAuthExpired`
+          - If insufficient permissions, raise `self.ShinyLivePermissions`
+          - If the auth server can't be reached, raise `ShinyLiveAuthUnavailable` (the session is kept)
+          - ***Options:***
+            - **If Session Never Refreshes:** Return the existing token
+            - **If Sessoin Refreshes:** Return a different/refreshed token
+
+        Args:
+            username (str): Valid username
+            password (SecretStr): Valid password
+        
+        Returns:
+            str: session string (i.e. JWT)
+        
+        Raises:
+            ShinyLiveAuthExpired: existing session is expired
+            ShinyLivePermissions: session is valid, but user has insufficient permissions for the page/app
+            ShinyLiveAuthUnavailable: the session could not be checked (i.e. the auth server is down)
+        """
+        ...
+
+    class ShinyLiveAuthFailed(Exception):
+        ...
+
+    class ShinyLiveAuthExpired(Exception):
+        ...
+
+    class ShinyLivePermissions(Exception):
+        ...
+
+
+class ShinyLiveAuthUnavailable(Exception):
+    """The auth server could not be reached (timeout, connection error, open circuit breaker, 5xx)
+
+    - Module-level, like `ShinyLiveRateLimited`: the same for every `AuthProtocol` implementation
+    - `server` keeps the session (and the token) when a check fails this way: a network blip is not a logout
+    """
+
+
+class BatchAuthProtocol(AuthProtocol, Protocol):
+    async def check_auth_many(self, tokens: List[str]) -> List[Union[str, Exception]]:
+        """Check Several Existing Authentication Sessions at Once
+
+        - **Instructions**:
+          - Return one entry per token, in the same order
+          - Each entry is what `check_auth` would return for that token (a session string), or the exception
+            it would raise (i.e. `self.ShinyLiveAuthExpired()`), returned rather than raised
+          - Use `check_auth_many(app_auth, tokens)` to call it; that falls back to `check_auth` per token
+            for implementations without it
+
+        Args:
+            tokens (list[str]): existing session strings
+
+        Returns:
+            list[str | Exception]: session string or exception per token
+        """
+        ...
+
+
+async def check_auth_many(app_auth: AuthProtocol, tokens: List[str]) -> List[Union[str, Exception]]:
+    """`app_auth.check_auth_many(tokens)` if implemented, otherwise `check_auth` for each token concurrently"""
+    batch_check = getattr(app_auth, "check_auth_many", None)
+    if batch_check is not None:
+        return await batch_check(tokens)
+    return await asyncio.gather(*[app_auth.check_auth(token) for token in tokens], return_exceptions=True)
+
+
+async def token_expires(app_auth: AuthProtocol, token: str) -> Optional[float]:
+    """When `token` expires (epoch seconds), if `app_auth` can tell without a full check
+
+    - Optional hook: implementations may define `token_expires(token) -> float | None` (sync or async)
+    - Returns None when the hook is missing, the token is unknown, or the lookup fails
+    """
+    hook = getattr(app_auth, "token_expires", None)
+    if hook is None:
+        return None
+    try:
+        expires_at = hook(token)
+        if inspect.isawaitable(expires_at):
+            expires_at = await expires_at
+    except Exception:
+        return None
+    return expires_at
+
+
+async def token_subject(app_auth: AuthProtocol, token: str) -> Optional[str]:
+    """Who `token` belongs to (i.e. the username), so revoking a user ends all of their sessions
+
+    - Optional hook: implementations may define `token_subject(token) -> str | None` (sync or async)
+    - Without the hook, the `sub` claim of JWT-format tokens is used (unverified; only used to end sessions)
+    """
+    hook = getattr(app_auth, "token_subject", None)
+    if hook is None:
+        subject = (peek_claims(token) or {}).get("sub")
+        return subject if isinstance(subject, str) else None
+    try:
+        subject = hook(token)
+        if inspect.isawaitable(subject):
+            subject = await subject
+    except Exception:
+        return None
+    return subject
+
+
+async def token_claims(app_auth: AuthProtocol, token: str) -> Optional[dict]:
+    """What `token` grants: `{"sub": str, "groups": [str], "exp": float | None}`, so other apps can check their
+    own `groups_needed` against it (see `SharedSession`)
+
+    - Optional hook: implementations may define `token_claims(token) -> dict | None` (sync or async)
+    - Without the hook, the claims of JWT-format tokens are used (unverified; only call it for a token that
+      `check_auth`/`get_auth` just accepted)
+    - Returns None when the claims are unknown or the lookup fails
+    """
+    hook = getattr(app_auth, "token_claims", None)
+    if hook is None:
+        claims = peek_claims(token)
+    else:
+        try:
+            claims = hook(token)
+            if inspect.isawaitable(claims):
+                claims = await claims
+        except Exception:
+            return None
+    if not isinstance(claims, dict) or not isinstance(claims.get("sub"), str):
+        return None
+    groups = claims.get("groups") or []
+    if not isinstance(groups, (list, tuple)):
+        return None
+    expires_at = claims.get("exp")
+    return {"sub": claims["sub"], "groups": list(groups), "exp": expires_at if isinstance(expires_at, (int, float)) else None}
+
+
+async def end_auth(app_auth: AuthProtocol, token: str):
+    """Tell `app_auth` that the session for `token` was logged out, so the token stops being accepted
+
+    - Optional hook: implementations may define `end_auth(token)` (sync or async)
+    - Failures are logged, not raised: the browser has already dropped the token
+    """
+    hook = getattr(app_auth, "end_auth", None)
+    if hook is None:
+        return
+    try:
+        result = hook(token)
+        if inspect.isawaitable(result):
+            await result
+    except Exception as e:
+        log_auth_event("end_auth", logging.WARNING, status="FAILED", reason=type(e).__name__)
+
+
+##########################################################################
+##########################################################################
+# Structured auth event logging
+##########################################################################
+##########################################################################
+auth_logger = logging.getLogger("shinylive_auth")
+auth_logger.addHandler(logging.NullHandler())
+
+
+def log_auth_event(event: str, level: int = logging.INFO, **fields):
+    """Emit a structured auth event, i.e. `log_auth_event("login", username="username", status="FAILED")`
+
+    - Costs one level check when the `shinylive_auth` logger is disabled for `level`
+    - See `configure_auth_logging` to write events as JSON lines
+    """
+    if auth_logger.isEnabledFor(level):
+        auth_logger.log(level, event, extra={"auth_event": fields})
+
+
+class JSONLinesFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(
+            {
+                "ts": round(record.created, 3),
+                "level": record.levelname,
+                "event": record.getMessage(),
+                **getattr(record, "auth_event", {}),
+            },
+            default=str,
+            separators=(",", ":"),
+        )
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a `sample_rate` fraction of records below `always_level`; records at or above it are always kept"""
+
+    def __init__(self, sample_rate: float = 1.0, always_level: int = logging.WARNING):
+        super().__init__()
+        self.sample_rate = sample_rate
+        self.always_level = always_level
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= self.always_level or random.random() < self.sample_rate
+
+
+def configure_auth_logging(
+    stream=None,
+    path: Optional[str] = None,
+    level: int = logging.INFO,
+    sample_rate: float = 1.0,
+):
+    """Write auth events as JSON lines, off the event loop
+
+    - Events are put on a queue and written by a `logging.handlers.QueueListener` thread, so stdout/file I/O
+      never runs inside a request or a Shiny session
+    - Events below WARNING are sampled at `sample_rate` before they are queued
+    - In pyodide (no threads) the handler writes directly
+    - Calling it again replaces the previous configuration; `stop_auth_logging` flushes and stops it
+
+    Args:
+        stream (file-like, optional): destination stream (defaults to stdout)
+        path (str, optional): append to this file instead of a stream
+        level (int): minimum level to emit
+        sample_rate (float): fraction of sub-WARNING events to keep
+    """
+    global _auth_log_listener
+    import logging.handlers
+
+    stop_auth_logging()
+    handler = logging.FileHandler(path) if path is not None else logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(JSONLinesFormatter())
+    auth_logger.setLevel(level)
+    auth_logger.propagate = False
+
+    if "pyodide" in sys.modules:
+        front = handler
+    else:
+        import atexit
+        import queue
+
+        events = queue.SimpleQueue()
+        front = logging.handlers.QueueHandler(events)
+        _auth_log_listener = logging.handlers.QueueListener(events, handler)
+        _auth_log_listener.start()
+        atexit.unregister(stop_auth_logging)
+        atexit.register(stop_auth_logging)
+    front.addFilter(SamplingFilter(sample_rate=sample_rate))
+    auth_logger.addHandler(front)
+
+
+def stop_auth_logging():
+    """Flush queued events and remove the handlers added by `configure_auth_logging`"""
+    global _auth_log_listener
+    if _auth_log_listener is not None:
+        _auth_log_listener.stop()
+        _auth_log_listener = None
+    for handler in list(auth_logger.handlers):
+        if not isinstance(handler, logging.NullHandler):
+            auth_logger.removeHandler(handler)
+            handler.close()
+
+
+_auth_log_listener = None
+
+
+##########################################################################
+##########################################################################
+# Auth metrics (latency, outcomes, active sessions)
+##########################################################################
+##########################################################################
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+@dataclass
+class Histogram:
+    buckets: Tuple[float, ...] = LATENCY_BUCKETS
+    counts: List[int] = field(init=False)  # one per bucket, plus +Inf
+    sum: float = 0.0
+    count: int = 0
+
+    def __post_init__(self):
+        self.counts = [0] * (len(self.buckets) + 1)
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+@dataclass
+class AuthMetrics:
+    """Counters, latency histograms and gauges for auth activity
+
+    - `calls[(call, outcome)]`: count per `AuthProtocol` call and outcome
+      (`success`, `failed`, `expired`, `permissions`, `error`)
+    - `latency[call]`: `Histogram` of call durations in seconds
+    - `active_sessions`: Shiny sessions currently showing the protected app
+    - `login_prompts_open`: Shiny sessions currently showing the login modal
+    """
+    buckets: Tuple[float, ...] = LATENCY_BUCKETS
+    calls: Dict[Tuple[str, str], int] = field(default_factory=dict)
+    latency: Dict[str, Histogram] = field(default_factory=dict)
+    active_sessions: int = 0
+    login_prompts_open: int = 0
+
+    def observe(self, call: str, outcome: str, seconds: float):
+        self.calls[(call, outcome)] = self.calls.get((call, outcome), 0) + 1
+        histogram = self.latency.get(call)
+        if histogram is None:
+            histogram = self.latency[call] = Histogram(buckets=self.buckets)
+        histogram.observe(seconds)
+
+    async def timed(self, call: str, app_auth: AuthProtocol, awaitable: Awaitable[T]) -> T:
+        """Await `awaitable` (an `app_auth` call) and record its duration and outcome"""
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await awaitable
+            outcome = "success"
+            return result
+        except Exception as e:
+            outcome = _outcome(app_auth, e)
+            raise
+        finally:
+            self.observe(call, outcome, time.perf_counter() - start)
+
+    def snapshot(self) -> dict:
+        return {
+            "calls": {f"{call}:{outcome}": count for (call, outcome), count in self.calls.items()},
+            "latency": {call: {"count": h.count, "sum": h.sum} for call, h in self.latency.items()},
+            "active_sessions": self.active_sessions,
+            "login_prompts_open": self.login_prompts_open,
+        }
+
+
+def _outcome(app_auth: AuthProtocol, error: Exception) -> str:
+    for outcome, name in (
+        ("failed", "ShinyLiveAuthFailed"),
+        ("expired", "ShinyLiveAuthExpired"),
+        ("permissions", "ShinyLivePermissions"),
+    ):
+        exception = getattr(app_auth, name, None)
+        if exception is not None and isinstance(error, exception):
+            return outcome
+    if isinstance(error, ShinyLiveRateLimited):
+        return "rate_limited"
+    if isinstance(error, ShinyLiveAuthUnavailable):
+        return "unavailable"
+    return "error"
+
+
+class MetricsExporter(Protocol):
+    def export(self, metrics: AuthMetrics) -> Any:
+        ...
+
+
+@dataclass
+class LogExporter:
+    """Emit a `metrics` auth event with a snapshot (useful in shinylive, where there is no endpoint to scrape)"""
+    level: int = logging.INFO
+
+    def export(self, metrics: AuthMetrics):
+        log_auth_event("metrics", self.level, **metrics.snapshot())
+
+
+DEFAULT_METRICS = AuthMetrics()
+
+
+##########################################################################
+##########################################################################
+# Wrappers that add behavior around any AuthProtocol implementation
+##########################################################################
+##########################################################################
+def _token_key(token: str) -> str:
+    """Hash a token so wrappers never hold raw session strings as keys"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+@dataclass
+class _AuthWrapper:
+    auth: AuthProtocol
+
+    def __getattr__(self, name: str):
+        # Exceptions (i.e. `ShinyLiveAuthExpired`) and any other attributes resolve to the wrapped auth class
+        if name == "auth":
+            raise AttributeError(name)
+        return getattr(self.auth, name)
+
+    async def get_auth(self, username: str, password: SecretStr) -> str:
+        return await self.auth.get_auth(username, password)
+
+    async def check_auth(self, token: str) -> str:
+        return await self.auth.check_auth(token)
+
+    async def check_auth_many(self, tokens: List[str]) -> List[Union[str, Exception]]:
+        # Through this wrapper's `check_auth`, so caching/coalescing/etc. still apply per token
+        return await asyncio.gather(*[self.check_auth(token) for token in tokens], return_exceptions=True)
+
+
+@dataclass
+class MicroBatcher:
+    """Collect single calls for up to `window` seconds (or `max_batch` items) and send them as one batch
+
+    - `batch_fn(items)` returns one result per item, in order; exceptions in that list are raised to the
+      matching caller, and an exception raised by `batch_fn` itself is raised to every caller in the batch
+    - i.e. `MicroBatcher(app_auth.check_auth_many)` turns many `check_auth` calls into one request
+
+    Args:
+        batch_fn (callable): async `(items) -> results`
+        window (float): seconds to wait for more items after the first one
+        max_batch (int): send immediately once this many items are waiting
+    """
+    batch_fn: Callable[[List[Any]], Awaitable[List[Any]]]
+    window: float = 0.005
+    max_batch: int = 100
+    _pending: List[Tuple[Any, asyncio.Future]] = field(default_factory=list, init=False, repr=False)
+    _timer: Optional[asyncio.TimerHandle] = field(default=None, init=False, repr=False)
+    # Batches being sent (the event loop only keeps weak references to tasks)
+    _tasks: Set[asyncio.Task] = field(default_factory=set, init=False, repr=False)
+
+    async def submit(self, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: List[Tuple[Any, asyncio.Future]]):
+        try:
+            results = await self.batch_fn([item for item, _ in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+        if len(results) != len(batch):
+            results = [ValueError(f"Batch returned {len(results)} results for {len(batch)} items")] * len(batch)
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+@dataclass
+class SingleFlight:
+    """Merge concurrent calls that share a key into one in-flight awaitable
+
+    - The first caller for a key starts the call; later callers await the same result (or exception)
+    - Once the call finishes the key is released, so the next call starts fresh
+    - A cancelled caller does not cancel the shared call for everyone else
+    """
+    _calls: Dict[Hashable, asyncio.Future] = field(default_factory=dict, init=False, repr=False)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        call = self._calls.get(key)
+        if call is None:
+            call = asyncio.ensure_future(fn())
+            self._calls[key] = call
+            call.add_done_callback(lambda done: self._release(key, done))
+        return await asyncio.shield(call)
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._calls
+
+    def _release(self, key: Hashable, call: asyncio.Future):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+
+@dataclass
+class CoalescedAuth(_AuthWrapper):
+    """Share one `check_auth`/`get_auth` call between concurrent callers with the same token/credentials
+
+    - Fixes the rotation race when several sessions check the same token at once: the wrapped
+      `check_auth` runs once, and every caller receives the same (possibly refreshed) token
+    - **Note**: only calls within one Python process are merged (i.e. server-side Shiny sessions);
+      each shinylive browser tab runs its own Python runtime
+    """
+    _flight: SingleFlight = field(default_factory=SingleFlight, init=False, repr=False)
+
+    async def get_auth(self, username: str, password: SecretStr) -> str:
+        key = ("get_auth", username, _token_key(password.get_secret_value()))
+        return await self._flight.do(key, lambda: self.auth.get_auth(username, password))
+
+    async def check_auth(self, token: str) -> str:
+        key = ("check_auth", _token_key(token))
+        return await self._flight.do(key, lambda: self.auth.check_auth(token))
+
+
+@dataclass
+class _CacheEntry:
+    token: Optional[str]  # None marks a negative (expired) entry
+    checked_at: float
+    # Key of `token` when the check returned another token (a refresh/rotation), so ending it ends this too
+    alias_of: Optional[str] = None
+
+
+@dataclass
+class CachedAuth(_AuthWrapper):
+    """Cache `check_auth` results for any `AuthProtocol` implementation
+
+    - **Behavior**:
+      - Successful checks are reused for `ttl` seconds, so reloads and extra tabs skip the round-trip
+      - Tokens returned by `get_auth`/`check_auth` are cached as valid, so a refreshed token is a hit too
+      - `ShinyLiveAuthExpired` is cached for `negative_ttl` seconds; permission failures are never cached
+      - Entries older than `revalidate_after` seconds are still served, but re-checked in the background
+      - At most `maxsize` entries are kept (least recently used are dropped first)
+      - Concurrent misses for the same token share one `check_auth` call (see `SingleFlight`)
+      - Ending or revoking a token also expires the entries of earlier tokens that were refreshed into it
+    - **Note**: create one instance at the module level (not inside `server()`) so sessions share it
+
+    Args:
+        auth (AuthProtocol): auth implementation to wrap
+        ttl (float): seconds a successful check is trusted
+        revalidate_after (float, optional): seconds after which a hit triggers a background re-check
+        negative_ttl (float): seconds an expired token is remembered
+        maxsize (int): max number of cached tokens
+    """
+    ttl: float = 60.0
+    revalidate_after: Optional[float] = None
+    negative_ttl: float = 30.0
+    maxsize: int = 1024
+    clock: Callable[[], float] = time.monotonic
+    _entries: "OrderedDict[str, _CacheEntry]" = field(default_factory=OrderedDict, init=False, repr=False)
+    _revalidating: Dict[str, asyncio.Task] = field(default_factory=dict, init=False, repr=False)
+    # Key of a returned token -> keys of the entries that map to it (`_CacheEntry.alias_of`)
+    _aliases: Dict[str, Set[str]] = field(default_factory=dict, init=False, repr=False)
+    _flight: SingleFlight = field(default_factory=SingleFlight, init=False, repr=False)
+
+    async def get_auth(self, username: str, password: SecretStr) -> str:
+        token = await self.auth.get_auth(username, password)
+        self._store(_token_key(token), token)
+        return token
+
+    async def check_auth(self, token: str) -> str:
+        key = _token_key(token)
+        entry = self._lookup(key)
+        if entry is None:
+            return await self._flight.do(key, lambda: self._validate(token, key))
+        if entry.token is None:
+            raise self.auth.ShinyLiveAuthExpired
+        if self.revalidate_after is not None and key not in self._revalidating and not self._flight.in_flight(key):
+            if self.clock() - entry.checked_at >= self.revalidate_after:
+                self._revalidating[key] = asyncio.create_task(self._revalidate(token, key))
+        return entry.token
+
+    def invalidate(self, token: str):
+        """Drop a single token from the cache (i.e. on logout)"""
+        key = _token_key(token)
+        self._unlink(key)
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+        self._aliases.clear()
+
+    async def end_auth(self, token: str):
+        # Remembered as expired, so a check racing the logout can't re-cache it as valid
+        self._expire(_token_key(token))
+        await end_auth(self.auth, token)
+
+    def revoke(self, revocation: "Revocation"):
+        """Treat revoked tokens as expired (i.e. `feed.subscribe(app_auth.revoke)`)
+
+        - Tokens are cached by digest, so revoked tokens are matched directly; revoking a subject clears the
+          whole cache, since entries don't record whose token they hold
+        """
+        if revocation.subjects:
+            self.clear()
+        for key in revocation.tokens:
+            self._expire(key)
+
+    async def _validate(self, token: str, key: str) -> str:
+        try:
+            returned_token = await self.auth.check_auth(token)
+        except self.auth.ShinyLiveAuthExpired:
+            self._store(key, None)
+            raise
+        if returned_token == token:
+            self._store(key, returned_token)
+        else:
+            returned_key = _token_key(returned_token)
+            self._store(key, returned_token, alias_of=returned_key)
+            self._store(returned_key, returned_token)
+        return returned_token
+
+    async def _revalidate(self, token: str, key: str):
+        try:
+            await self._flight.do(key, lambda: self._validate(token, key))
+        except Exception:
+            # Expired tokens are already cached as negative; other failures keep the entry until `ttl`
+            pass
+        finally:
+            self._revalidating.pop(key, None)
+
+    def _lookup(self, key: str) -> Optional[_CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        max_age = self.ttl if entry.token is not None else self.negative_ttl
+        if self.clock() - entry.checked_at >= max_age:
+            self._unlink(key)
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key: str, token: Optional[str], alias_of: Optional[str] = None):
+        self._unlink(key)
+        self._entries[key] = _CacheEntry(token=token, checked_at=self.clock(), alias_of=alias_of)
+        self._entries.move_to_end(key)
+        if alias_of is not None:
+            self._aliases.setdefault(alias_of, set()).add(key)
+        while len(self._entries) > self.maxsize:
+            evicted, _ = next(iter(self._entries.items()))
+            self._unlink(evicted)
+            del self._entries[evicted]
+
+    def _expire(self, key: str):
+        """Cache `key` as expired, along with every entry that was refreshed into it (transitively)"""
+        keys = [key]
+        while keys:
+            key = keys.pop()
+            keys.extend(self._aliases.pop(key, ()))
+            self._store(key, None)
+
+    def _unlink(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None or entry.alias_of is None:
+            return
+        aliases = self._aliases.get(entry.alias_of)
+        if aliases is not None:
+            aliases.discard(key)
+            if not aliases:
+                del self._aliases[entry.alias_of]
+
+
+##########################################################################
+##########################################################################
+# Login rate limiting
+##########################################################################
+##########################################################################
+class ShinyLiveRateLimited(Exception):
+    """Too many attempts; raised by `RateLimitedAuth.get_auth` (and auth clients that see an HTTP 429)
+
+    Args:
+        retry_after (float): seconds until the next attempt is allowed
+    """
+    def __init__(self, retry_after: float = 0.0, *args):
+        super().__init__(f"Too many attempts. Retry after {retry_after:.0f}s", *args)
+        self.retry_after = retry_after
+
+
+##########################################################################
+##########################################################################
+# Permission checks compiled to bitmasks
+##########################################################################
+##########################################################################
+@dataclass(frozen=True)
+class Requirement:
+    """Compiled permission requirement (see `PermissionIndex.require`)"""
+    all_of: int = 0
+    any_of: int = 0
+
+    def satisfied_by(self, group_mask: int) -> bool:
+        return group_mask & self.all_of == self.all_of and (self.any_of == 0 or group_mask & self.any_of != 0)
+
+
+class PermissionIndex:
+    """Intern group names as bits so permission checks become integer operations
+
+    - `encode(groups)` turns a user's/session's groups into an int mask once (at login/session creation)
+    - `require(all_of, any_of)` compiles an app's requirement once (i.e. from `groups_needed`)
+    - `hierarchy` maps a role to the groups it implies (transitively), i.e. `{"admin": ["group1", "group2"]}`;
+      a user with `admin` then satisfies a requirement for `group1`
+    - Bit positions are only meaningful within one index: compile requirements and encode groups with the same one
+    - Requirements sent by clients should be compiled with `known_only=True`: names the index has never seen then
+      can't be met (no user has them) instead of growing the index; groups sent by clients should be encoded with
+      `known_only=True` too, which leaves those names out of the mask
+
+    Args:
+        hierarchy (dict, optional): role -> implied groups
+    """
+    _CACHE_SIZE = 1024
+    # Reserved bit no group mask contains: requirements on unknown groups (`known_only=True`) include it
+    _UNGRANTED = 1
+
+    def __init__(self, hierarchy: Optional[Dict[str, Iterable[str]]] = None):
+        self._hierarchy = {role: tuple(groups) for role, groups in (hierarchy or {}).items()}
+        self._bits: Dict[str, int] = {}
+        self._expanded: Dict[str, int] = {}
+        self._encoded: Dict[Tuple[str, ...], int] = {}
+        self._required: Dict[Tuple[Tuple[str, ...], Tuple[str, ...]], Requirement] = {}
+
+    def bit(self, group: str) -> int:
+        bit = self._bits.get(group)
+        if bit is None:
+            bit = self._bits[group] = 1 << (len(self._bits) + 1)
+        return bit
+
+    def encode(self, groups: Optional[Iterable[str]], known_only: bool = False) -> int:
+        key = tuple(groups or ())
+        mask = self._encoded.get(key)
+        if mask is None:
+            if known_only:
+                known = tuple(group for group in key if group in self._bits or group in self._hierarchy)
+                # Not cached when it names unknown groups: they may be given bits later
+                if len(known) != len(key):
+                    return self.encode(known)
+            mask = 0
+            for group in key:
+                mask |= self._expand(group)
+            if len(self._encoded) >= self._CACHE_SIZE:
+                self._encoded.clear()
+            self._encoded[key] = mask
+        return mask
+
+    def require(
+        self, all_of: Optional[Iterable[str]] = None, any_of: Optional[Iterable[str]] = None, known_only: bool = False
+    ) -> Requirement:
+        key = (tuple(all_of or ()), tuple(any_of or ()))
+        requirement = self._required.get(key)
+        if requirement is None:
+            unknown = known_only and any(group not in self._bits for group in key[0] + key[1])
+            all_mask = any_mask = 0
+            for group in key[0]:
+                all_mask |= self._known_bit(group) if known_only else self.bit(group)
+            for group in key[1]:
+                any_mask |= self._known_bit(group) if known_only else self.bit(group)
+            requirement = Requirement(all_of=all_mask, any_of=any_mask)
+            # Not cached when it names unknown groups: they may be given bits later
+            if not unknown:
+                if len(self._required) >= self._CACHE_SIZE:
+                    self._required.clear()
+                self._required[key] = requirement
+        return requirement
+
+    def compile(self, groups_needed: Union[None, Iterable[str], Requirement], known_only: bool = False) -> Requirement:
+        """`groups_needed` as used by `AuthProtocol` implementations: a list (all required) or a `Requirement`"""
+        if isinstance(groups_needed, Requirement):
+            return groups_needed
+        return self.require(all_of=groups_needed, known_only=known_only)
+
+    def _known_bit(self, group: str) -> int:
+        return self._bits.get(group, self._UNGRANTED)
+
+    def _expand(self, group: str) -> int:
+        mask = self._expanded.get(group)
+        if mask is None:
+            mask, _ = self._walk(group, ())
+        return mask
+
+    def _walk(self, group: str, path: Tuple[str, ...]) -> Tuple[int, set]:
+        """Mask of `group`, and the groups on `path` where a cycle was cut below it
+
+        - A mask is only cached when it is complete: no cycle was cut, or only cycles back to `group` itself
+        """
+        mask = self._expanded.get(group)
+        if mask is not None:
+            return mask, set()
+        path = path + (group,)
+        mask, cut = self.bit(group), set()
+        for implied in self._hierarchy.get(group, ()):
+            if implied in path:
+                cut.add(implied)
+                continue
+            implied_mask, implied_cut = self._walk(implied, path)
+            mask |= implied_mask
+            cut |= implied_cut
+        cut.discard(group)
+        if not cut:
+            self._expanded[group] = mask
+        return mask, cut
+
+
+DEFAULT_PERMISSIONS = PermissionIndex()
+
+
+##########################################################################
+##########################################################################
+# Stateless signed tokens (verified locally, no session storage)
+##########################################################################
+##########################################################################
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def peek_claims(token: str) -> Optional[dict]:
+    """Claims of a JWT-format token WITHOUT verifying its signature (None if it is not one)
+
+    - Only for UI hints (i.e. `server(optimistic=True)` reading `exp`); never for access decisions
+    """
+    try:
+        claims = json.loads(_b64decode(token.split(".")[1]))
+    except (ValueError, IndexError, binascii.Error):
+        return None
+    return claims if isinstance(claims, dict) else None
+
+
+##########################################################################
+##########################################################################
+# Session revocation pushed to live sessions
+##########################################################################
+##########################################################################
+@dataclass(frozen=True)
+class Revocation:
+    """Sessions to end: single tokens, and/or every session of a subject (i.e. a username)
+
+    - Holds `_token_key` digests, never raw tokens or usernames, so it can be published to browsers
+      (see `to_dict`/`from_dict`)
+    """
+    tokens: FrozenSet[str] = frozenset()
+    subjects: FrozenSet[str] = frozenset()
+
+    @classmethod
+    def of(cls, tokens: Iterable[str] = (), subjects: Iterable[str] = ()) -> "Revocation":
+        return cls(frozenset(map(_token_key, tokens)), frozenset(map(_token_key, subjects)))
+
+    def matches(self, token: str, subject: Optional[str] = None) -> bool:
+        if _token_key(token) in self.tokens:
+            return True
+        return subject is not None and _token_key(subject) in self.subjects
+
+    def to_dict(self) -> dict:
+        return {"tokens": sorted(self.tokens), "subjects": sorted(self.subjects)}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Revocation":
+        return cls(frozenset(data.get("tokens") or ()), frozenset(data.get("subjects") or ()))
+
+
+@dataclass
+class RevocationFeed:
+    """In-process pub/sub of revoked sessions
+
+    - `server(..., revocations=feed)` watches each Shiny session's current token (and subject); a matching
+      `Revocation` logs that session out immediately, without waiting for a `check_auth`
+    - Watches are indexed by digest, so publishing costs O(revoked tokens + subjects), not O(sessions)
+    - `subscribe` receives every revocation (i.e. to forward them to browsers, or to drop cache entries)
+    - Callbacks run synchronously inside `publish`; keep them short (`server` only schedules the logout)
+    - **Note**: one feed per process; with several worker processes, forward revocations between them
+    """
+    _watches: Dict[Hashable, Tuple[str, Optional[str], Callable[[Revocation], Any]]] = field(
+        default_factory=dict, init=False, repr=False
+    )
+    _by_token: Dict[str, Set[Hashable]] = field(default_factory=dict, init=False, repr=False)
+    _by_subject: Dict[str, Set[Hashable]] = field(default_factory=dict, init=False, repr=False)
+    _subscribers: Dict[int, Callable[[Revocation], Any]] = field(default_factory=dict, init=False, repr=False)
+    _next_id: int = field(default=0, init=False, repr=False)
+
+    def watch(self, key: Hashable, token: str, subject: Optional[str], callback: Callable[[Revocation], Any]):
+        """Call `callback` once when `token` or `subject` is revoked (replaces any earlier watch for `key`)"""
+        self.unwatch(key)
+        token_id = _token_key(token)
+        subject_id = None if subject is None else _token_key(subject)
+        self._watches[key] = (token_id, subject_id, callback)
+        self._by_token.setdefault(token_id, set()).add(key)
+        if subject_id is not None:
+            self._by_subject.setdefault(subject_id, set()).add(key)
+
+    def unwatch(self, key: Hashable):
+        watch = self._watches.pop(key, None)
+        if watch is None:
+            return
+        token_id, subject_id, _ = watch
+        for index, digest in ((self._by_token, token_id), (self._by_subject, subject_id)):
+            keys = index.get(digest)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del index[digest]
+
+    def subscribe(self, callback: Callable[[Revocation], Any]) -> Callable[[], None]:
+        """Call `callback` for every published revocation; returns a function that unsubscribes"""
+        subscriber_id = self._next_id
+        self._next_id += 1
+        self._subscribers[subscriber_id] = callback
+        return lambda: self._subscribers.pop(subscriber_id, None)
+
+    def revoke(self, tokens: Iterable[str] = (), subjects: Iterable[str] = ()) -> int:
+        """Publish the revocation of `tokens` and of every session of `subjects`; returns sessions notified"""
+        return self.publish(Revocation.of(tokens, subjects))
+
+    def publish(self, revocation: Revocation) -> int:
+        keys = set()
+        for index, digests in ((self._by_token, revocation.tokens), (self._by_subject, revocation.subjects)):
+            for digest in digests:
+                keys.update(index.get(digest, ()))
+        for key in keys:
+            # Each watch fires once; a session watches again when it gets a new token
+            callback = self._watches[key][2]
+            self.unwatch(key)
+            self._notify(callback, revocation)
+        for callback in list(self._subscribers.values()):
+            self._notify(callback, revocation)
+        return len(keys)
+
+    def __len__(self) -> int:
+        return len(self._watches)
+
+    @staticmethod
+    def _notify(callback: Callable[[Revocation], Any], revocation: Revocation):
+        try:
+            callback(revocation)
+        except Exception as e:
+            log_auth_event("revocation_callback", logging.ERROR, status="FAILED", reason=type(e).__name__)
+
+
+##########################################################################
+##########################################################################
+# One validated session shared by every app of an origin
+##########################################################################
+##########################################################################
+SHARED_SESSION_STORAGE_KEY = "x-auth-session"
+SHARED_SESSION_CHANNEL = "shinylive-auth"
+
+
+@dataclass
+class SharedSession:
+    """Share the result of validating the token between every app (and tab) served from one origin
+
+    - i.e. many shinylive apps under `/apps`: they already share the token in localStorage; with this, the app
+      that validates it (`check_auth`/`get_auth`) also stores its claims (`sub`, `groups`, `exp`, see
+      `token_claims`) and the check time as a record next to it
+    - Other apps and tabs accept the token from a record younger than `max_age` seconds, checking only their
+      own `groups_needed` against its groups, without calling `check_auth`
+    - A refreshed (or rotated) token and a logout reach the apps open in other tabs through a
+      `BroadcastChannel`: they switch to the new token (or log out) instead of validating the old one
+    - With `RefreshSchedule`, an app skips a due refresh when another app checked the token after the refresh
+      was scheduled, so one app refreshes for the whole origin
+    - Pass the same instance to `view(shared=...)` and `server(shared=...)`
+    - **Note**: records come from the browser, so they are only accepted in shinylive apps (Python running in
+      pyodide), where the browser is the trust boundary anyway and data services verify the token themselves.
+      In server-side Shiny anyone could write a record, so `accepts` ignores records (every token goes through
+      `check_auth`, and refreshes are not skipped); logouts in other apps are still followed there
+
+    Args:
+        groups_needed (list or Requirement, optional): groups this app requires (usually the same as its
+            `AuthProtocol` implementation's)
+        max_age (float): seconds a record is trusted after the check that wrote it
+        permissions (PermissionIndex): index used to compile `groups_needed` and encode the record's groups
+        storage_key (str): localStorage key of the record
+        channel (str): `BroadcastChannel` name
+    """
+    groups_needed: Union[None, List[str], Requirement] = None
+    max_age: float = 60.0
+    permissions: PermissionIndex = DEFAULT_PERMISSIONS
+    storage_key: str = SHARED_SESSION_STORAGE_KEY
+    channel: str = SHARED_SESSION_CHANNEL
+    clock: Callable[[], float] = time.time
+
+    def __post_init__(self):
+        self._required = self.permissions.compile(self.groups_needed)
+
+    def record(self, token: str, claims: dict) -> dict:
+        """Record for `token`, which was just checked (`claims` as returned by `token_claims`)"""
+        return {
+            "token": token, "sub": claims["sub"], "groups": claims["groups"], "exp": claims["exp"], "checked": self.clock()
+        }
+
+    def accepts(self, record: Optional[dict], token: str) -> Optional[bool]:
+        """Whether `record` settles `token` for this app without a `check_auth` call
+
+        Returns:
+            bool | None: True if it was checked recently and its groups satisfy `groups_needed`; False if it was
+                checked recently but the groups don't; None if the record is missing, stale, expired, for
+                another token, or records aren't trusted here (see `trusted`)
+        """
+        if not self.trusted() or not isinstance(record, dict) or record.get("token") != token:
+            return None
+        now = self.clock()
+        checked, expires_at = record.get("checked"), record.get("exp")
+        if not isinstance(checked, (int, float)) or not 0 <= now - checked < self.max_age:
+            return None
+        if isinstance(expires_at, (int, float)) and expires_at <= now:
+            return None
+        # Shiny delivers JSON arrays in input values as tuples
+        groups = record.get("groups")
+        groups = groups if isinstance(groups, (list, tuple)) else None
+        return self._required.satisfied_by(self.permissions.encode(groups, known_only=True))
+
+    @staticmethod
+    def trusted() -> bool:
+        """Whether records can settle tokens: only when running in pyodide (a shinylive app, in the browser)"""
+        return "pyodide" in sys.modules
+
+    def checked_since(self, record: Optional[dict], token: str, since: float) -> bool:
+        """Whether `record` shows `token` was checked (by any app of the origin) after `since`"""
+        if not self.trusted() or not isinstance(record, dict) or record.get("token") != token:
+            return False
+        checked = record.get("checked")
+        return isinstance(checked, (int, float)) and checked > since
+
+
+##########################################################################
+##########################################################################
+# Shinylive Auth UI Related
+##########################################################################
+##########################################################################
+def login_popup():
+    m = ui.modal(
+        ui.input_text("username", "Username"),
+        ui.input_password("password", "Password"),
+        footer=(ui.input_action_button("submit_btn", "Submit")),
+        title="Login",
+        size='s'
+    )
+    ui.modal_show(m)
+    return
+
+
+class ProtectedView(Protocol):  # may use this to try and provide interface for 
+    name: str = "main_view"
+
+
+# Input binding that reports the token saved in localStorage as the input's value. Shiny reads bound inputs
+# before connecting, so the token is part of the session's first message (no extra round trip per page load)
+TOKEN_BINDING_JS = """
+(function() {
+    if (window.shinyliveAuthTokenBinding) { return; }
+    var binding = new Shiny.InputBinding();
+    $.extend(binding, {
+        find: function(scope) { return $(scope).find('.shinylive-auth-token'); },
+        getValue: function(el) { return localStorage.getItem(el.dataset.storageKey) || ''; },
+        subscribe: function(el, callback) {},
+        unsubscribe: function(el) {}
+    });
+    Shiny.inputBindings.register(binding, 'shinylive_auth.token');
+    window.shinyliveAuthTokenBinding = binding;
+})();
+"""
+# Custom message type (namespaced by module id) that writes `{"token": str}` to localStorage, or clears it for null
+TOKEN_MESSAGE = "token"
+TOKEN_STORAGE_KEY = "x-auth-token"
+
+
+def token_input(id: str, storage_key: str = TOKEN_STORAGE_KEY) -> ui.TagList:
+    """Hidden input whose value is the token saved under `storage_key`, plus the handler that updates it
+
+    - The server writes the token with `session.send_custom_message(id, {"token": token})`; `null` clears it
+    """
+    resolved = module.resolve_id(id)
+    return ui.TagList(
+        ui.tags.script(TOKEN_BINDING_JS),
+        ui.tags.div(id=resolved, class_="shinylive-auth-token", data_storage_key=storage_key, hidden=True),
+        ui.tags.script(
+            f"""
+            Shiny.addCustomMessageHandler('{resolved}', function(message) {{
+                if (message.token === null) {{
+                    localStorage.removeItem('{storage_key}');
+                }} else {{
+                    localStorage.setItem('{storage_key}', message.token);
+                }}
+            }});
+            """
+        ),
+    )
+
+
+# Input (namespaced by module id) that receives `Revocation.to_dict()` payloads from `revocation_listener`
+REVOKED_INPUT = "revoked"
+
+
+def revocation_listener(id: str, url: str) -> ui.TagList:
+    """Forwards revocations from a server-sent events stream (`event: revocation`) to the input `id`
+
+    - Opened once Shiny has connected; `EventSource` reconnects by itself after network errors
+    """
+    resolved = module.resolve_id(id)
+    return ui.TagList(
+        ui.tags.script(
+            f"""
+            $(document).on('shiny:connected', function() {{
+                var source = new EventSource({json.dumps(url)});
+                source.addEventListener('revocation', function(event) {{
+                    Shiny.setInputValue({json.dumps(resolved)}, JSON.parse(event.data), {{priority: 'event'}});
+                }});
+            }});
+            """
+        )
+    )
+
+
+# Input binding that reports the `SharedSession` record saved in localStorage, and reports it again whenever
+# another app or tab of the origin announces a change on the `BroadcastChannel`
+SHARED_SESSION_BINDING_JS = """
+(function() {
+    if (window.shinyliveAuthSharedBinding) { return; }
+    var binding = new Shiny.InputBinding();
+    $.extend(binding, {
+        find: function(scope) { return $(scope).find('.shinylive-auth-shared'); },
+        getValue: function(el) {
+            try { return JSON.parse(localStorage.getItem(el.dataset.storageKey)); } catch (e) { return null; }
+        },
+        subscribe: function(el, callback) {
+            if (!window.BroadcastChannel) { return; }
+            el.shinyliveAuthChannel = new BroadcastChannel(el.dataset.channel);
+            el.shinyliveAuthChannel.onmessage = function() { callback(); };
+        },
+        unsubscribe: function(el) {
+            if (el.shinyliveAuthChannel) { el.shinyliveAuthChannel.close(); }
+        }
+    });
+    Shiny.inputBindings.register(binding, 'shinylive_auth.shared');
+    window.shinyliveAuthSharedBinding = binding;
+})();
+"""
+# Input and custom message type (namespaced by module id) for the `SharedSession` record; the message writes
+# `{"session": record}` to localStorage (or clears it for null) and announces the change to the other apps/tabs
+SHARED_SESSION_INPUT = "shared_session"
+
+
+def shared_session_input(id: str, shared: SharedSession) -> ui.TagList:
+    """Hidden input whose value is the `SharedSession` record, plus the handler that updates and announces it
+
+    - The announcement is posted from this input's own channel, which doesn't receive it, so only the other
+      apps/tabs report the record again
+    """
+    resolved = module.resolve_id(id)
+    storage_key = json.dumps(shared.storage_key)
+    return ui.TagList(
+        ui.tags.script(SHARED_SESSION_BINDING_JS),
+        ui.tags.div(
+            id=resolved, class_="shinylive-auth-shared", data_storage_key=shared.storage_key,
+            data_channel=shared.channel, hidden=True
+        ),
+        ui.tags.script(
+            f"""
+            Shiny.addCustomMessageHandler({json.dumps(resolved)}, function(message) {{
+                if (message.session === null) {{
+                    localStorage.removeItem({storage_key});
+                }} else {{
+                    localStorage.setItem({storage_key}, JSON.stringify(message.session));
+                }}
+                var channel = document.getElementById({json.dumps(resolved)}).shinyliveAuthChannel;
+                if (channel) {{ channel.postMessage(null); }}
+            }});
+            """
+        ),
+    )
+
+
+# Input and custom message type (namespaced by module id) for the origin's refresh lock; see `refresh_lock`
+REFRESH_LOCK = "refresh_lock"
+REFRESH_LOCK_NAME = "shinylive-auth-refresh"
+
+
+def refresh_lock(id: str, storage_key: str = TOKEN_STORAGE_KEY, lock_name: str = REFRESH_LOCK_NAME) -> ui.TagList:
+    """Browser side of the refresh lock shared by every tab and app of the origin (Web Locks API)
+
+    - The server sends `{"request": n, "timeout": ms}`; once the lock is held, the input `id` reports
+      `{"request": n, "token": <stored token>}`, so a tab that waited sees a token refreshed meanwhile
+    - `{"release": n}` releases the lock (after the new token is stored); so does the timeout, and closing the tab
+    - Without Web Locks, the lock is granted at once
+    """
+    resolved = json.dumps(module.resolve_id(id))
+    return ui.TagList(
+        ui.tags.script(
+            f"""
+            (function() {{
+                var held = {{}};
+                Shiny.addCustomMessageHandler({resolved}, function(message) {{
+                    if (message.release !== undefined) {{
+                        if (held[message.release]) {{ held[message.release](); }}
+                        return;
+                    }}
+                    var granted = function() {{
+                        var token = localStorage.getItem({json.dumps(storage_key)}) || '';
+                        Shiny.setInputValue({resolved}, {{request: message.request, token: token}}, {{priority: 'event'}});
+                    }};
+                    if (!(navigator.locks && navigator.locks.request)) {{ granted(); return; }}
+                    navigator.locks.request({json.dumps(lock_name)}, function() {{
+                        granted();
+                        return new Promise(function(resolve) {{
+                            var release = function() {{ delete held[message.request]; resolve(); }};
+                            held[message.request] = release;
+                            setTimeout(release, message.timeout);
+                        }});
+                    }});
+                }});
+            }})();
+            """
+        )
+    )
+
+
+@module.ui
+def view(revocations_url: Optional[str] = None, shared: Optional[SharedSession] = None):
+    """Auth module UI (token storage and logout button)
+
+    Args:
+        revocations_url (str, optional): server-sent events endpoint publishing revocations (i.e. the test
+            webserver's `/auth/revocations`); sessions whose token or user is revoked are logged out immediately
+        shared (SharedSession, optional): share the validated session with the other apps of this origin
+            (pass the same instance to `server`)
+    """
+    return ui.row(
+        token_input(TOKEN_MESSAGE),
+        revocation_listener(REVOKED_INPUT, revocations_url) if revocations_url else None,
+        shared_session_input(SHARED_SESSION_INPUT, shared) if shared is not None else None,
+        refresh_lock(REFRESH_LOCK),
+        ui.input_action_button("logout_btn", "Logout")
+    )
+
+
+##########################################################################
+##########################################################################
+# Shinylive Auth Server Module Related
+##########################################################################
+##########################################################################
+AUTH_PENDING = "pending"
+AUTH_OPTIMISTIC = "optimistic"  # stored token looks valid; shown while `check_auth` runs
+AUTH_AUTHENTICATED = "authenticated"
+AUTH_LOGGED_OUT = "logged_out"
+
+
+@dataclass
+class AuthReactiveValues:
+    """Reactive auth state for one session (create one per `server` call)
+
+    - `auth_state` only changes on real transitions (`AUTH_PENDING` -> `AUTH_AUTHENTICATED` -> `AUTH_LOGGED_OUT`
+      -> ...), so UI that depends on it is not rebuilt when the token is refreshed
+    - `hide_app` is False while `AUTH_OPTIMISTIC` or `AUTH_AUTHENTICATED`, so a view built from it is not
+      rebuilt when an optimistic session is confirmed
+    """
+    token: reactive.Value[str] = field(default_factory=reactive.Value)
+    user: reactive.Value[str] = field(default_factory=reactive.Value)
+    hide_app: reactive.Value[bool] = field(default_factory=lambda: reactive.Value(True))
+    login_prompt: reactive.Value[bool] = field(default_factory=reactive.Value)
+    logout: reactive.Value[bool] = field(default_factory=reactive.Value)
+    auth_state: reactive.Value[str] = field(default_factory=lambda: reactive.Value(AUTH_PENDING))
+
+    def set_token(self, token: str) -> bool:
+        """Set `token` only if it differs from the current one; returns True if it changed
+
+        - `reactive.Value.set` compares by identity, so an equal token string returned by `check_auth`
+          would otherwise invalidate everything that depends on `token`
+        """
+        with reactive.isolate():
+            if self.token.is_set() and self.token.get() == token:
+                return False
+        self.token.set(token)
+        return True
+
+    def set_state(self, state: str):
+        # `reactive.Value.set` is a no-op for an unchanged value, so dependents only rerun on transitions
+        self.auth_state.set(state)
+        self.hide_app.set(state not in (AUTH_OPTIMISTIC, AUTH_AUTHENTICATED))
+
+
+@dataclass
+class RefreshSchedule:
+    """When `server` should refresh a session's token in the background
+
+    - Refreshes `lead` seconds before the token expires, using `app_auth.token_expires(token)` when the
+      `AuthProtocol` implementation provides it; otherwise every `interval` seconds
+    - Each delay is shortened by a random fraction (up to `jitter`), so sessions that logged in together
+      do not all refresh at the same moment
+    - With `SignedTokenAuth`, keep `lead` below its `refresh_within`, so the check actually re-issues the token
+    - **Coordinated** (`coordinate`): a due refresh first takes the origin's refresh lock in the browser (Web Locks,
+      see `refresh_lock`), so tabs and apps refresh one at a time; a tab that waited finds the token another one
+      stored meanwhile and checks that one (with `check_auth`) instead of its own, so it does not rotate the token
+      again. Without a reply within `lock_timeout` seconds (i.e. no Web Locks, or a custom view without
+      `refresh_lock`), the refresh goes ahead on its own. Off by default: it needs `refresh_lock` in the view
+
+    Args:
+        lead (float): seconds before expiry to refresh
+        interval (float): seconds between refreshes when the expiry is unknown
+        jitter (float): maximum fraction taken off each delay (0 to 1)
+        min_delay (float): shortest delay between refreshes, in seconds
+        coordinate (bool): refresh under the origin's refresh lock
+        lock_timeout (float): seconds to wait for the lock (and the longest it is held)
+    """
+    lead: float = 30.0
+    interval: float = 60.0
+    jitter: float = 0.2
+    min_delay: float = 5.0
+    coordinate: bool = False
+    lock_timeout: float = 10.0
+
+    def next_delay(self, expires_at: Optional[float], now: Optional[float] = None) -> float:
+        if expires_at is None:
+            delay = self.interval
+        else:
+            delay = expires_at - (time.time() if now is None else now) - self.lead
+        delay *= 1 - random.uniform(0, self.jitter)
+        return max(self.min_delay, delay)
+
+
+@dataclass
+class _SessionState:
+    """Bookkeeping for one `server` session (plain values: changing them triggers nothing)"""
+    # Gauges this session counts towards (`AuthMetrics.active_sessions`, `login_prompts_open`)
+    active: bool = False
+    prompt: bool = False
+    # Token (and its subject) held while authenticated; watched on `revocations`
+    token: Optional[str] = None
+    subject: Optional[str] = None
+    # Token already ended elsewhere, by a revocation or a logout in another app/tab (its logout is then not
+    # published or sent to `end_auth` again)
+    ended: Optional[str] = None
+    # Last token written to the browser (None when cleared), so each change is sent once
+    stored: Optional[str] = None
+    # `shared`: the last record seen from (or written for) the other apps of this origin, and the last token
+    # taken from one (already validated, so not shared again)
+    record: Optional[dict] = None
+    adopted: Optional[str] = None
+    # `refresh`: token the pending refresh is for, when it was scheduled, and the refresh lock request it is
+    # waiting on
+    scheduled: Optional[str] = None
+    scheduled_at: float = 0.0
+    lock_request: Optional[int] = None
+
+
+@module.server
+def server(
+    input: Inputs, output: Outputs, session: Session, 
+    session_auth: AuthReactiveValues,
+    app_auth: AuthProtocol,
+    metrics: Optional[AuthMetrics] = None,
+    refresh: Optional[RefreshSchedule] = None,
+    optimistic: bool = False,
+    revocations: Optional[RevocationFeed] = None,
+    shared: Optional[SharedSession] = None
+):
+    """Auth module server
+
+    Args:
+        session_auth (AuthReactiveValues): reactive auth state shared with the app
+        app_auth (AuthProtocol): validates credentials and sessions
+        metrics (AuthMetrics, optional): defaults to `DEFAULT_METRICS`
+        refresh (RefreshSchedule, optional): refresh the token in the background before it expires
+            (off by default; the token is then only refreshed when the page loads)
+        optimistic (bool): show the app right away when the stored token is an unexpired JWT-format token
+            (see `peek_claims`), while `check_auth` runs in the background; the app is hidden again if the
+            check fails. Only the view is shown early: keep data access behind `check_auth`/`auth_state`
+        revocations (RevocationFeed, optional): log this session out as soon as its token or user is revoked
+            on the feed; logging out publishes the token's revocation to it (so other sessions holding the
+            same token end too). Revocations from `view(revocations_url=...)` are published to it as well
+        shared (SharedSession, optional): reuse a recent validation by another app (or tab) of this origin
+            instead of calling `check_auth`, follow its token refreshes and logouts, and share this app's
+            validations with them (pass the same instance to `view`)
+    """
+    metrics = DEFAULT_METRICS if metrics is None else metrics
+    state = _SessionState()
+
+    def set_counted(name: str, value: bool):
+        if getattr(state, name) is value:
+            return
+        setattr(state, name, value)
+        if name == "active":
+            metrics.active_sessions += 1 if value else -1
+        else:
+            metrics.login_prompts_open += 1 if value else -1
+
+    watch_key = object()
+    pending: Set[asyncio.Task] = set()
+
+    @session.on_ended
+    def _():
+        set_counted("active", False)
+        set_counted("prompt", False)
+        if revocations is not None:
+            revocations.unwatch(watch_key)
+
+    @reactive.effect
+    @reactive.event(input.logout_btn)
+    def _():
+        session_auth.logout.set(True)
+
+    async def store_token(token: Optional[str]):
+        if token == state.stored:
+            return
+        state.stored = token
+        await session.send_custom_message(session.ns(TOKEN_MESSAGE), {"token": token})
+
+    @reactive.effect
+    async def _():
+        token = session_auth.token.get()
+        await store_token(token)
+        session_auth.set_state(AUTH_AUTHENTICATED)
+        session_auth.logout.set(False)
+        set_counted("active", True)
+        await watch_token(token)
+        if token != state.adopted:
+            await share_token(token)
+
+    def read_shared_record() -> Optional[dict]:
+        with reactive.isolate():
+            return input.shared_session() if input.shared_session.is_set() else None
+
+    async def share_token(token: Optional[str]):
+        """Write the record for `token`, just validated by this app (None clears it)"""
+        if shared is None:
+            return
+        if token is None:
+            record = None
+        else:
+            claims = await token_claims(app_auth, token)
+            if claims is None:
+                return  # the other apps validate the token themselves
+            record = shared.record(token, claims)
+        if record is None and state.record is None:
+            return
+        state.record = record
+        await session.send_custom_message(session.ns(SHARED_SESSION_INPUT), {"session": record})
+
+    async def watch_token(token: str):
+        state.token, state.subject = token, await token_subject(app_auth, token)
+        if revocations is not None:
+            revocations.watch(watch_key, token, state.subject, lambda revocation: schedule_revoked(token))
+
+    def end_revoked(token: str):
+        if state.token != token:
+            return  # already logged out, or refreshed since
+        state.ended = token
+        log_auth_event("session_revoked")
+        ui.notification_show(
+            "Your session was ended. Please log in again.", type="warning", id="notify-session-revoked", session=session
+        )
+        session_auth.logout.set(True)
+
+    def schedule_revoked(token: str):
+        # Called from `RevocationFeed.publish`, which may run outside this session (another session, a route,
+        # a background task): log out from a task that holds the reactive lock, as Shiny requires
+        async def run():
+            async with reactive.lock():
+                end_revoked(token)
+                await reactive.flush()
+        task = asyncio.get_running_loop().create_task(run())
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+
+    @reactive.effect
+    @reactive.event(input.revoked)
+    def _():
+        # From `view(revocations_url=...)`
+        revocation = Revocation.from_dict(input.revoked())
+        if revocations is not None:
+            # Reaches this session through its watch, and any other session in this process holding the token
+            revocations.publish(revocation)
+        elif state.token is not None and revocation.matches(state.token, state.subject):
+            end_revoked(state.token)
+
+
+    def auth_unavailable():
+        ui.notification_show(
+            "The login service is unavailable. Please try again shortly.", type="warning", id="notify-auth-unavailable"
+        )
+
+    def reject_token(e: Exception):
+        if isinstance(e, app_auth.ShinyLivePermissions):
+            ui.notification_show("Insufficient permissions. Check with IT and then try again.", type="warning")
+        elif isinstance(e, ShinyLiveAuthUnavailable):
+            # The token stays in the browser's storage, so the next page load can check it again
+            auth_unavailable()
+        else:
+            ui.notification_show("Session expired. Please try again.", type="warning", id="notify-session-expired")
+        # Withdraws an optimistically shown app; no-op otherwise
+        session_auth.set_state(AUTH_PENDING)
+        session_auth.login_prompt.set(True)
+
+    # Only used with `optimistic=True`: verifies outside the reactive flush, so the app is sent to the browser first
+    @reactive.extended_task
+    async def verify_token(token: str) -> str:
+        return await metrics.timed("check_auth", app_auth, app_auth.check_auth(token))
+
+    @reactive.effect
+    def _():
+        try:
+            returned_token = verify_token.result()
+        except (app_auth.ShinyLiveAuthExpired, app_auth.ShinyLivePermissions, ShinyLiveAuthUnavailable) as e:
+            reject_token(e)
+            return
+        session_auth.set_token(returned_token)
+
+    # Runs once, in the session's first flush: the token input's value comes with the client's first message
+    @reactive.effect
+    async def read_token():
+        existing_token = input.token()
+        # Already in the browser's localStorage; only write it back if `check_auth` returns a new one
+        state.stored = existing_token or None
+        # If no token, login
+        if existing_token in ("", None):
+            session_auth.login_prompt.set(True)
+            return
+
+        if shared is not None:
+            state.record = read_shared_record()
+            accepted = shared.accepts(state.record, existing_token)
+            if accepted is not None:
+                # Validated by another app (or tab) of this origin moments ago
+                log_auth_event("shared_session", status="SUCCESS" if accepted else "FAILED")
+                if accepted is False:
+                    reject_token(app_auth.ShinyLivePermissions())
+                    return
+                state.adopted = existing_token
+                session_auth.set_token(existing_token)
+                return
+
+        if optimistic:
+            claims = peek_claims(existing_token) or {}
+            if isinstance(claims.get("exp"), (int, float)) and claims["exp"] > time.time():
+                session_auth.set_state(AUTH_OPTIMISTIC)
+                verify_token.invoke(existing_token)
+                return
+
+        # Use `AuthProtocol.check_auth` to validate the existing session
+        try:
+            returned_token = await metrics.timed("check_auth", app_auth, app_auth.check_auth(existing_token))
+        except (app_auth.ShinyLiveAuthExpired, app_auth.ShinyLivePermissions, ShinyLiveAuthUnavailable) as e:
+            reject_token(e)
+            return
+
+        # If both checks pass, set the token
+        # - This does two things:
+        #   1. Triggers function that changes "auth_state" to authenticated (and "hide_app" to False)
+        #   2. Stores the token again if `check_auth` updated/refreshed it
+        session_auth.set_token(returned_token)
+
+
+    if shared is not None:
+        @reactive.effect
+        @reactive.event(input.shared_session, ignore_none=False, ignore_init=True)
+        def _():
+            # Another app (or tab) of this origin logged in, refreshed the token, or logged out
+            record = state.record = input.shared_session()
+            token = state.token
+            if record is None:
+                if token is not None:
+                    state.ended = token
+                    session_auth.logout.set(True)
+                return
+            if record.get("token") == token or shared.accepts(record, record.get("token")) is not True:
+                return
+            log_auth_event("shared_session", status="ADOPTED")
+            state.adopted = state.stored = record["token"]
+            session_auth.set_token(record["token"])
+            if state.prompt:
+                ui.modal_remove()
+                set_counted("prompt", False)
+
+    @reactive.effect
+    def _():
+        # Only triggered when login_prompt is set; login_prompt is freeze/unset after launching login popup
+        if session_auth.login_prompt.is_set():
+            if session_auth.login_prompt.get() is True:
+                login_popup()
+                set_counted("prompt", True)
+                session_auth.login_prompt.freeze()
+
+
+    @reactive.effect
+    @reactive.event(input.submit_btn, ignore_none=True)
+    async def _():
+        username = input.username()
+        password = SecretStr(value=input.password())
+        if all([username, password]) is False:
+            ui.notification_show("'username' and 'password' fields are both required.", type="warning", id="notify-login-warning")
+            return
+        
+        # Use `AuthProtocol.get_auth` to validate provided credentials
+        try:
+            token = await metrics.timed("get_auth", app_auth, app_auth.get_auth(username, password))
+        except app_auth.ShinyLiveAuthFailed:
+            ui.notification_show("Invalid username or password", type="warning")
+            return
+        except app_auth.ShinyLivePermissions:
+            ui.notification_show("Insufficient permissions. Check with IT and then try again.", type="warning")
+            session_auth.login_prompt.set(True)
+            return
+        except ShinyLiveRateLimited as e:
+            ui.notification_show(
+                f"Too many login attempts. Try again in {math.ceil(e.retry_after)} seconds.",
+                type="warning", id="notify-rate-limited"
+            )
+            return
+        except ShinyLiveAuthUnavailable:
+            auth_unavailable()
+            return
+
+        # Code to return/assign a token here (i.e., an endpoint that produces JWT)
+        session_auth.set_token(token)
+        # session_auth.login_prompt.freeze()  # not sure if this is requierd
+
+        # Close login popup
+        ui.modal_remove()
+        set_counted("prompt", False)
+
+    if refresh is not None:
+        # The timer is cancelled whenever the token changes, so a rerun for `state.scheduled` means the refresh is
+        # due. With `refresh.coordinate`, a due refresh first asks for the refresh lock (`state.lock_request`), and
+        # runs when it is granted or times out
+        lock_requests = itertools.count(1)
+        lock_granted: reactive.Value[Optional[dict]] = reactive.Value(None)
+
+        @reactive.effect
+        @reactive.event(input.refresh_lock)
+        async def _():
+            grant = input.refresh_lock()
+            if grant.get("request") == state.lock_request:
+                lock_granted.set(grant)
+            else:
+                # Granted after this session stopped waiting: let the other tabs have it
+                await release_lock(grant.get("request"))
+
+        async def release_lock(request: Optional[int]):
+            if request is not None:
+                await session.send_custom_message(session.ns(REFRESH_LOCK), {"release": request})
+
+        @reactive.effect
+        async def _():
+            token = session_auth.token.get()
+            grant = lock_granted.get()
+            if token == state.scheduled and shared is not None and shared.checked_since(
+                state.record, token, state.scheduled_at
+            ):
+                # Another app of this origin checked the token since; its refresh counts for this app too
+                log_auth_event("background_refresh", status="SKIPPED")
+            elif token == state.scheduled and refresh.coordinate and state.lock_request is None:
+                state.lock_request = next(lock_requests)
+                await session.send_custom_message(
+                    session.ns(REFRESH_LOCK), {"request": state.lock_request, "timeout": refresh.lock_timeout * 1000}
+                )
+                reactive.invalidate_later(refresh.lock_timeout)
+                return
+            elif token == state.scheduled:
+                request, state.lock_request = state.lock_request, None
+                # Another tab or app refreshed while this one waited for the lock: check its token instead
+                followed = grant is not None and grant["request"] == request and grant["token"] not in ("", token)
+                try:
+                    refreshed = await metrics.timed(
+                        "check_auth", app_auth, app_auth.check_auth(grant["token"] if followed else token)
+                    )
+                except (app_auth.ShinyLiveAuthExpired, app_auth.ShinyLivePermissions) as e:
+                    await release_lock(request)
+                    log_auth_event("background_refresh", logging.WARNING, status="FAILED", reason=type(e).__name__)
+                    ui.notification_show("Session expired. Please log in again.", type="warning", id="notify-session-expired")
+                    state.scheduled = None
+                    session_auth.logout.set(True)
+                    return
+                except ShinyLiveAuthUnavailable as e:
+                    # Keeps the session (a network blip is not a logout) and tries again after `min_delay`
+                    await release_lock(request)
+                    log_auth_event("background_refresh", logging.WARNING, status="RETRY", reason=type(e).__name__)
+                    reactive.invalidate_later(refresh.min_delay)
+                    return
+                log_auth_event(
+                    "background_refresh", status="FOLLOWED" if followed else "SUCCESS", rotated=refreshed != token
+                )
+                # Stored before the lock is released, so the next tab to take it finds the new token
+                await store_token(refreshed)
+                await release_lock(request)
+                if refreshed != token:
+                    # This effect runs again for the new token and schedules the next refresh
+                    session_auth.set_token(refreshed)
+                    return
+                await share_token(token)
+            elif state.lock_request is not None:
+                # The token changed while waiting for the lock
+                await release_lock(state.lock_request)
+                state.lock_request = None
+            state.scheduled, state.scheduled_at = token, shared.clock() if shared is not None else 0.0
+            reactive.invalidate_later(refresh.next_delay(await token_expires(app_auth, token)))
+
+    @reactive.effect
+    async def _():
+        if session_auth.logout.is_set():
+            if session_auth.logout.get() is True:
+                await store_token(None)
+                await share_token(None)
+                token, state.token = state.token, None
+                if revocations is not None:
+                    revocations.unwatch(watch_key)
+                if token is not None and token != state.ended:
+                    await end_auth(app_auth, token)
+                    if revocations is not None:
+                        revocations.revoke(tokens=[token])
+                session_auth.set_state(AUTH_LOGGED_OUT)
+                set_counted("active", False)
+                session_auth.token.freeze()
+                session_auth.login_prompt.set(True)
+
+
+##########################################################################
+##########################################################################
+# Server-side parts, imported on first use (see `shinylive_auth.backend`)
+##########################################################################
+##########################################################################
+_BACKEND_NAMES = frozenset({
+    "InvalidToken", "MemorySessionStore", "PasswordHasher", "PrometheusExporter", "RateLimitedAuth", "RateLimiter",
+    "RevocationFilter", "RotationGrace", "SQLiteSessionStore", "SessionStore", "SignedTokenAuth", "TokenSigner",
+})
+
+
+def __getattr__(name: str):
+    if name not in _BACKEND_NAMES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from . import backend
+
+    value = globals()[name] = getattr(backend, name)
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | _BACKEND_NAMES)
@@ -0,0 +1,856 @@
+"""Server-side parts of `shinylive_auth`: session storage, password hashing, rate limiting, signed tokens,
+revocation filters and the Prometheus exporter
+
+- Imported on first use of one of its names (i.e. `shinylive_auth.PasswordHasher`), so apps that only need the
+  UI, `server` and an `AuthProtocol` client don't pay for it at startup (in shinylive, in the browser)
+"""
+import asyncio
+import binascii
+import hashlib
+import heapq
+import hmac
+import inspect
+import json
+import logging
+import math
+import secrets
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Protocol, Tuple, TypeVar, Union
+
+from . import (
+    AuthMetrics, DEFAULT_PERMISSIONS, PermissionIndex, Requirement, SecretStr, ShinyLiveRateLimited, _AuthWrapper,
+    _b64decode, _b64encode, _token_key, log_auth_event
+)
+
+T = TypeVar("T")
+
+
+##########################################################################
+##########################################################################
+# Auth metrics export
+##########################################################################
+##########################################################################
+@dataclass
+class PrometheusExporter:
+    """Render `AuthMetrics` in the Prometheus text exposition format (i.e. for a `/metrics` endpoint)"""
+    prefix: str = "shinylive_auth"
+
+    def export(self, metrics: AuthMetrics) -> str:
+        p = self.prefix
+        lines = [
+            f"# HELP {p}_call_duration_seconds Duration of AuthProtocol calls",
+            f"# TYPE {p}_call_duration_seconds histogram",
+        ]
+        for call, histogram in sorted(metrics.latency.items()):
+            cumulative = 0
+            for bound, count in zip((*histogram.buckets, "+Inf"), histogram.counts):
+                cumulative += count
+                lines.append(f'{p}_call_duration_seconds_bucket{{call="{call}",le="{bound}"}} {cumulative}')
+            lines.append(f'{p}_call_duration_seconds_sum{{call="{call}"}} {histogram.sum}')
+            lines.append(f'{p}_call_duration_seconds_count{{call="{call}"}} {histogram.count}')
+        lines += [f"# HELP {p}_calls_total AuthProtocol calls by outcome", f"# TYPE {p}_calls_total counter"]
+        for (call, outcome), count in sorted(metrics.calls.items()):
+            lines.append(f'{p}_calls_total{{call="{call}",outcome="{outcome}"}} {count}')
+        lines += [
+            f"# HELP {p}_active_sessions Sessions showing the protected app",
+            f"# TYPE {p}_active_sessions gauge",
+            f"{p}_active_sessions {metrics.active_sessions}",
+            f"# HELP {p}_login_prompts_open Sessions showing the login modal",
+            f"# TYPE {p}_login_prompts_open gauge",
+            f"{p}_login_prompts_open {metrics.login_prompts_open}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+##########################################################################
+##########################################################################
+# Login rate limiting
+##########################################################################
+##########################################################################
+@dataclass
+class _Window:
+    start: float
+    previous: int = 0
+    current: int = 0
+
+
+@dataclass
+class RateLimiter:
+    """Sliding-window rate limit per key (i.e. username or client address)
+
+    - Approximates a true sliding window with two fixed windows: the previous window's count is weighted by
+      how much of it still overlaps the sliding window, so each key costs one small record
+    - At most `maxsize` keys are tracked (least recently used are dropped first), so memory stays bounded
+      under a burst of distinct usernames/addresses
+    - Check before doing any credential work: `acquire(*keys)` counts an attempt against every key, or
+      returns the seconds to wait (without counting) if any key is over its limit
+    - Keys limited by separate instances (i.e. per username and per address): check them all with
+      `retry_after` first, then `acquire` each, so an attempt one limiter rejects isn't counted by the others
+
+    Args:
+        limit (int): attempts allowed per key within `window`
+        window (float): window length in seconds
+        maxsize (int): max number of keys tracked
+    """
+    limit: int = 5
+    window: float = 60.0
+    maxsize: int = 10_000
+    clock: Callable[[], float] = time.monotonic
+    _windows: "OrderedDict[Hashable, _Window]" = field(default_factory=OrderedDict, init=False, repr=False)
+
+    def acquire(self, *keys: Hashable) -> float:
+        """Count an attempt for each key; returns 0.0 if allowed, otherwise seconds until one would be"""
+        now = self.clock()
+        windows = [self._window(key, now) for key in keys]
+        retry_after = max([self._retry_after(w, now) for w in windows], default=0.0)
+        if retry_after > 0:
+            return retry_after
+        for w in windows:
+            w.current += 1
+        return 0.0
+
+    def retry_after(self, *keys: Hashable) -> float:
+        """Seconds until an attempt for every key would be allowed (0.0 if it is now), without counting one"""
+        now = self.clock()
+        return max([self._retry_after(self._window(key, now), now) for key in keys], default=0.0)
+
+    def reset(self, key: Hashable):
+        """Forget a key's attempts (i.e. after a successful login)"""
+        self._windows.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._windows)
+
+    def _window(self, key: Hashable, now: float) -> _Window:
+        w = self._windows.get(key)
+        if w is None:
+            w = self._windows[key] = _Window(start=now - now % self.window)
+            while len(self._windows) > self.maxsize:
+                self._windows.popitem(last=False)
+        else:
+            self._windows.move_to_end(key)
+            elapsed = int((now - w.start) // self.window)
+            if elapsed >= 1:
+                w.previous = w.current if elapsed == 1 else 0
+                w.current = 0
+                w.start += elapsed * self.window
+        return w
+
+    def _retry_after(self, w: _Window, now: float) -> float:
+        # Allowed when the weighted count plus this attempt stays within `limit`
+        elapsed = now - w.start
+        allowed = self.limit - 1
+        if w.current > allowed:
+            # Wait for the next window, then for enough of this one to slide out
+            return (self.window - elapsed) + max(0.0, self.window * (1 - allowed / w.current))
+        if w.previous * (1 - elapsed / self.window) + w.current <= allowed:
+            return 0.0
+        return self.window * (1 - (allowed - w.current) / w.previous) - elapsed
+
+
+@dataclass
+class RateLimitedAuth(_AuthWrapper):
+    """Reject `get_auth` attempts for a username that is over its limit, before any credential work
+
+    - Every attempt counts; a successful login resets the username's count
+    - Raises `ShinyLiveRateLimited` (module-level, since wrapped implementations do not define it)
+    - **Note**: client addresses are not part of `AuthProtocol`; limit those where the requests arrive
+      (i.e. the auth server routes)
+    """
+    limiter: RateLimiter = field(default_factory=RateLimiter)
+
+    async def get_auth(self, username: str, password: SecretStr) -> str:
+        retry_after = self.limiter.acquire(username)
+        if retry_after > 0:
+            log_auth_event("rate_limited", logging.WARNING, username=username, retry_after=round(retry_after, 1))
+            raise ShinyLiveRateLimited(retry_after)
+        token = await self.auth.get_auth(username, password)
+        self.limiter.reset(username)
+        return token
+
+
+##########################################################################
+##########################################################################
+# Stateless signed tokens (verified locally, no session storage)
+##########################################################################
+##########################################################################
+class InvalidToken(Exception):
+    ...
+
+
+@dataclass
+class TokenSigner:
+    """Issue and verify HMAC-SHA256 signed tokens (JWT compatible, `alg: HS256`)
+
+    - `keys` maps key ids (`kid`) to secrets; new tokens are signed with `active_kid` (defaults to the last key)
+    - **Key rotation**: add a new kid and make it active; keep the old kid until the tokens it signed have expired
+
+    Args:
+        keys (dict): kid -> secret (str or bytes)
+        active_kid (str, optional): kid used to sign new tokens
+    """
+    keys: Dict[str, Union[str, bytes]]
+    active_kid: Optional[str] = None
+
+    def __post_init__(self):
+        if not self.keys:
+            raise ValueError("At least one signing key is required")
+        if self.active_kid is None:
+            self.active_kid = list(self.keys)[-1]
+        if self.active_kid not in self.keys:
+            raise ValueError(f"Active kid '{self.active_kid}' is not in keys")
+        self._secrets = {kid: key.encode() if isinstance(key, str) else key for kid, key in self.keys.items()}
+        # Headers are fixed per kid, so verification matches the encoded header instead of parsing it
+        self._headers = {
+            kid: _b64encode(json.dumps({"alg": "HS256", "typ": "JWT", "kid": kid}, separators=(",", ":")).encode())
+            for kid in self.keys
+        }
+        self._kids = {header: kid for kid, header in self._headers.items()}
+
+    def encode(self, claims: dict) -> str:
+        header = self._headers[self.active_kid]
+        payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+        signing_input = f"{header}.{payload}"
+        signature = hmac.new(self._secrets[self.active_kid], signing_input.encode(), hashlib.sha256).digest()
+        return f"{signing_input}.{_b64encode(signature)}"
+
+    def decode(self, token: str) -> dict:
+        """Verify the signature and return the claims (expiry is not checked here)
+
+        Raises:
+            InvalidToken: malformed token, unknown kid, or bad signature
+        """
+        try:
+            header, payload, signature = token.split(".")
+            kid = self._kids[header]
+            expected = hmac.new(self._secrets[kid], f"{header}.{payload}".encode(), hashlib.sha256).digest()
+            if hmac.compare_digest(expected, _b64decode(signature)) is False:
+                raise InvalidToken("Token signature is invalid")
+            return json.loads(_b64decode(payload))
+        except (ValueError, KeyError, binascii.Error) as e:
+            raise InvalidToken("Token is malformed or signed with an unknown key") from e
+
+
+@dataclass
+class SignedTokenAuth:
+    """`AuthProtocol` implementation that issues signed tokens and verifies them locally
+
+    - Tokens carry the username (`sub`), `groups`, `exp`, `auth_time` and a unique `jti`
+    - `check_auth` needs no I/O or shared session state, so any worker holding the key can verify a token
+    - **Sliding refresh**: when `refresh_within` is set, a token with less than that many seconds left is
+      re-issued by `check_auth`, up to `max_lifetime` seconds after the original login; no token (refreshed or
+      not) expires later than that
+    - **Note**: the signing key must stay server-side; in shinylive apps (Python in the browser) verify tokens
+      on the auth server instead of shipping the key to the client
+
+    Args:
+        signer (TokenSigner): signs/verifies tokens
+        authenticate (callable, optional): `(username, password) -> groups or None`; sync or async.
+            Required only for instances that issue tokens through `get_auth`
+        groups_needed (list or Requirement, optional): groups a user must have to access the app
+        expires_in (float): token lifetime in seconds
+        refresh_within (float, optional): seconds before expiry when `check_auth` re-issues the token
+        max_lifetime (float, optional): seconds after login when the session ends (tokens expire by then)
+        permissions (PermissionIndex): index used to compile `groups_needed` and encode token groups
+        revoked (RevocationFilter, optional): token `jti`s revoked before they expire (i.e. by `end_auth`)
+    """
+    signer: TokenSigner
+    authenticate: Optional[Callable[[str, SecretStr], Union[Optional[List[str]], Awaitable[Optional[List[str]]]]]] = None
+    groups_needed: Union[None, List[str], Requirement] = None
+    expires_in: float = 900
+    refresh_within: Optional[float] = None
+    max_lifetime: Optional[float] = None
+    clock: Callable[[], float] = time.time
+    permissions: PermissionIndex = DEFAULT_PERMISSIONS
+    revoked: Optional["RevocationFilter"] = None
+
+    def __post_init__(self):
+        self._required = self.permissions.compile(self.groups_needed)
+
+    async def get_auth(self, username: str, password: SecretStr) -> str:
+        if self.authenticate is None:
+            raise self.ShinyLiveAuthFailed("This instance only verifies tokens")
+        groups = self.authenticate(username, password)
+        if inspect.isawaitable(groups):
+            groups = await groups
+        if groups is None:
+            raise self.ShinyLiveAuthFailed
+        if self._required.satisfied_by(self.permissions.encode(groups)) is False:
+            raise self.ShinyLivePermissions
+        return self.issue(username, groups)
+
+    async def check_auth(self, token: str) -> str:
+        claims = self.claims(token)
+        if self._required.satisfied_by(self.permissions.encode(claims.get("groups"))) is False:
+            raise self.ShinyLivePermissions
+        now = self.clock()
+        if self.refresh_within is not None and claims["exp"] - now <= self.refresh_within:
+            if self.max_lifetime is None or claims["exp"] < claims["auth_time"] + self.max_lifetime:
+                return self.issue(claims["sub"], claims.get("groups") or [], auth_time=claims["auth_time"])
+        return token
+
+    def token_expires(self, token: str) -> Optional[float]:
+        try:
+            return float(self.claims(token)["exp"])
+        except self.ShinyLiveAuthExpired:
+            return None
+
+    def token_subject(self, token: str) -> Optional[str]:
+        try:
+            return self.claims(token)["sub"]
+        except self.ShinyLiveAuthExpired:
+            return None
+
+    def end_auth(self, token: str):
+        """Revoke `token` (when `revoked` is set); refreshed tokens issued from it have their own `jti`"""
+        if self.revoked is None:
+            return
+        try:
+            claims = self.claims(token)
+        except self.ShinyLiveAuthExpired:
+            return
+        self.revoked.add(claims["jti"], claims["exp"])
+
+    def token_claims(self, token: str) -> Optional[dict]:
+        try:
+            return self.claims(token)
+        except self.ShinyLiveAuthExpired:
+            return None
+
+    def issue(self, username: str, groups: List[str], auth_time: Optional[float] = None) -> str:
+        now = self.clock()
+        auth_time = int(now if auth_time is None else auth_time)
+        expires_at = now + self.expires_in
+        if self.max_lifetime is not None:
+            expires_at = min(expires_at, auth_time + self.max_lifetime)
+        return self.signer.encode({
+            "sub": username,
+            "groups": list(groups),
+            "iat": int(now),
+            "exp": int(expires_at),
+            "auth_time": auth_time,
+            "jti": secrets.token_urlsafe(12),
+        })
+
+    def claims(self, token: str) -> dict:
+        """Verified, unexpired claims for `token`
+
+        Raises:
+            ShinyLiveAuthExpired: token is expired, malformed, or has an invalid signature
+        """
+        try:
+            claims = self.signer.decode(token)
+        except InvalidToken as e:
+            raise self.ShinyLiveAuthExpired(str(e)) from e
+        if claims.get("exp", 0) <= self.clock():
+            raise self.ShinyLiveAuthExpired
+        if self.revoked is not None and self.revoked.is_revoked(claims.get("jti", ""), claims["exp"]):
+            raise self.ShinyLiveAuthExpired("Token was revoked")
+        return claims
+
+    class ShinyLiveAuthFailed(Exception):
+        ...
+
+    class ShinyLiveAuthExpired(Exception):
+        ...
+
+    class ShinyLivePermissions(Exception):
+        ...
+
+
+##########################################################################
+##########################################################################
+# Compact revocation lists for locally verified tokens
+##########################################################################
+##########################################################################
+class _BloomFilter:
+    """Fixed-size Bloom filter over `bits` bits with `hashes` probes (double hashing of one blake2b digest)"""
+    __slots__ = ("bits", "hashes", "data")
+
+    def __init__(self, bits: int, hashes: int, data: Optional[bytearray] = None):
+        self.bits = bits
+        self.hashes = hashes
+        self.data = bytearray((bits + 7) // 8) if data is None else data
+
+    @staticmethod
+    def digest(item: str) -> Tuple[int, int]:
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+    def add(self, h1: int, h2: int):
+        for i in range(self.hashes):
+            position = (h1 + i * h2) % self.bits
+            self.data[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, hashes: Tuple[int, int]) -> bool:
+        h1, h2 = hashes
+        data, bits = self.data, self.bits
+        for i in range(self.hashes):
+            position = (h1 + i * h2) % bits
+            if not data[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+@dataclass
+class RevocationFilter:
+    """Compact revocation list for tokens that are verified locally (i.e. `SignedTokenAuth` token `jti`s)
+
+    - Revoked ids are kept in Bloom filters, one per `span` seconds of token expiry; a filter is dropped once
+      every token it could match has expired, so memory stays bounded by what can still be presented
+    - `is_revoked` is one hash plus `hashes` bit tests in a single filter, however many ids are revoked
+      (~29 bits per id at the default `error_rate`; 100k revoked ids with 15 minute tokens is ~360 KB)
+    - A positive may be a false one (rate `error_rate`). With `confirm`, positives are checked exactly
+      (i.e. against the auth server's database) and ids found not revoked are remembered in a small exact
+      cache; without it, positives are treated as revoked (the user logs in again)
+    - **Delta sync**: every `add` gets a version; `changes(since)` returns the ids added after `since` (or a
+      snapshot when they are no longer kept) and `apply(payload)` loads either into another instance, so
+      workers and clients fetch only what changed (see `sync`)
+    - Versions count this instance's additions only: payloads carry its random `instance` id, and `apply` refuses
+      a delta from another instance (i.e. another worker process), so `sync` falls back to a snapshot
+    - `changes` publishes the ids themselves: add digests (i.e. `_token_key(token)`), never bearer tokens
+
+    Args:
+        capacity (int): revoked ids per filter (per `span`) at which `error_rate` is reached
+        error_rate (float): false-positive rate at `capacity`
+        span (float): seconds of token expiry covered by one filter
+        max_delta (int): most recent additions kept for `changes`
+        confirm (callable, optional): `(token_id) -> bool`, exact check for positives
+        clock (callable): current epoch seconds
+    """
+    capacity: int = 100_000
+    error_rate: float = 1e-6
+    span: float = 3600.0
+    max_delta: int = 10_000
+    confirm: Optional[Callable[[str], bool]] = None
+    clock: Callable[[], float] = time.time
+    version: int = field(default=0, init=False)
+    instance: str = field(default_factory=lambda: secrets.token_hex(8), init=False)
+    _filters: Dict[int, _BloomFilter] = field(default_factory=dict, init=False, repr=False)
+    _log: "deque[Tuple[int, str, float]]" = field(default=None, init=False, repr=False)
+    _not_revoked: "OrderedDict[str, None]" = field(default_factory=OrderedDict, init=False, repr=False)
+    _count: int = field(default=0, init=False, repr=False)
+
+    # Ids a `confirm` call found not revoked
+    NOT_REVOKED_CACHE = 1024
+
+    def __post_init__(self):
+        self.bits = max(8, math.ceil(-self.capacity * math.log(self.error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / self.capacity * math.log(2)))
+        self._log = deque(maxlen=self.max_delta)
+
+    def add(self, token_id: str, expires_at: float):
+        """Revoke `token_id` until `expires_at` (the token's `exp`)"""
+        self._add(token_id, expires_at)
+        self.version += 1
+        self._log.append((self.version, token_id, expires_at))
+        self.prune()
+
+    def is_revoked(self, token_id: str, expires_at: float) -> bool:
+        bloom = self._filters.get(int(expires_at // self.span))
+        if bloom is None or bloom.digest(token_id) not in bloom:
+            return False
+        if self.confirm is None:
+            return True
+        if token_id in self._not_revoked:
+            return False
+        if self.confirm(token_id):
+            return True
+        self._not_revoked[token_id] = None
+        while len(self._not_revoked) > self.NOT_REVOKED_CACHE:
+            self._not_revoked.popitem(last=False)
+        return False
+
+    def prune(self, now: Optional[float] = None) -> int:
+        """Drop filters whose tokens have all expired; returns how many were dropped"""
+        current = int((self.clock() if now is None else now) // self.span)
+        expired = [generation for generation in self._filters if generation < current]
+        for generation in expired:
+            del self._filters[generation]
+        return len(expired)
+
+    def changes(self, since: Optional[int] = None) -> dict:
+        """Ids added after version `since`, or a snapshot when `since` is None or those ids are no longer kept"""
+        if since is not None and since <= self.version:
+            missing = self.version - since
+            if missing == 0:
+                return {"instance": self.instance, "since": since, "version": self.version, "entries": []}
+            if missing <= len(self._log):
+                entries = [[token_id, expires_at] for _, token_id, expires_at in list(self._log)[-missing:]]
+                return {"instance": self.instance, "since": since, "version": self.version, "entries": entries}
+        return self.snapshot()
+
+    def snapshot(self) -> dict:
+        import zlib
+
+        self.prune()
+        return {
+            "instance": self.instance,
+            "version": self.version,
+            "span": self.span,
+            "bits": self.bits,
+            "hashes": self.hashes,
+            "filters": {
+                str(generation): _b64encode(zlib.compress(bytes(bloom.data)))
+                for generation, bloom in self._filters.items()
+            },
+        }
+
+    def apply(self, payload: dict) -> bool:
+        """Load a `changes`/`snapshot` payload; returns False for a delta that doesn't start at `version` of the
+        same `instance`"""
+        if "filters" in payload:
+            import zlib
+
+            if (payload["span"], payload["bits"], payload["hashes"]) != (self.span, self.bits, self.hashes):
+                raise ValueError("Snapshot was made with a different span, capacity or error_rate")
+            self._filters = {
+                int(generation): _BloomFilter(self.bits, self.hashes, bytearray(zlib.decompress(_b64decode(data))))
+                for generation, data in payload["filters"].items()
+            }
+            self._log.clear()
+            self.instance = payload["instance"]
+        elif payload["instance"] == self.instance and payload["since"] == self.version:
+            for version, (token_id, expires_at) in enumerate(payload["entries"], start=self.version + 1):
+                self._add(token_id, expires_at)
+                self._log.append((version, token_id, expires_at))
+        else:
+            return False
+        self.version = payload["version"]
+        self._not_revoked.clear()
+        self.prune()
+        return True
+
+    async def sync(self, fetch: Callable[[Optional[int]], Awaitable[dict]]) -> bool:
+        """Bring this copy up to date with `fetch(since)` (i.e. a GET of the auth server's `changes(since)`)
+
+        Returns:
+            bool: True if anything changed
+        """
+        version = self.version
+        if not self.apply(await fetch(self.version)):
+            self.apply(await fetch(None))
+        return self.version != version
+
+    def __len__(self) -> int:
+        """Ids added to this instance (not counting snapshots loaded, or filters pruned since)"""
+        return self._count
+
+    def _add(self, token_id: str, expires_at: float):
+        generation = int(expires_at // self.span)
+        bloom = self._filters.get(generation)
+        if bloom is None:
+            bloom = self._filters[generation] = _BloomFilter(self.bits, self.hashes)
+        bloom.add(*bloom.digest(token_id))
+        self._count += 1
+
+
+##########################################################################
+##########################################################################
+# Session storage for AuthProtocol implementations that keep server-side sessions
+##########################################################################
+##########################################################################
+class SessionStore(Protocol):
+    def get(self, token: str) -> Optional[Any]:
+        """Session stored for `token`, or None if it is missing or expired"""
+        ...
+
+    def set(self, token: str, value: Any, expires_at: float):
+        """Store `value` for `token` until `expires_at` (unix timestamp)"""
+        ...
+
+    def pop(self, token: str) -> Optional[Any]:
+        """Remove and return the session for `token` (None if missing or expired)"""
+        ...
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Remove every expired session; returns the number removed"""
+        ...
+
+
+@dataclass
+class MemorySessionStore:
+    """In-process `SessionStore` with a heap of expiry times
+
+    - Expired sessions are removed in bulk by `sweep()`, which `set()` runs every `sweep_interval` seconds
+    - When `maxsize` is reached, the session closest to expiry is dropped to make room
+    - Values are stored as-is (no copies)
+    """
+    maxsize: Optional[int] = None
+    sweep_interval: float = 60.0
+    clock: Callable[[], float] = time.time
+    _entries: Dict[str, Tuple[float, Any]] = field(default_factory=dict, init=False, repr=False)
+    _expiry_heap: List[Tuple[float, str]] = field(default_factory=list, init=False, repr=False)
+    _last_sweep: float = field(default=0.0, init=False, repr=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, token: str) -> Optional[Any]:
+        entry = self._entries.get(token)
+        if entry is None:
+            return None
+        if entry[0] <= self.clock():
+            del self._entries[token]
+            return None
+        return entry[1]
+
+    def set(self, token: str, value: Any, expires_at: float):
+        now = self.clock()
+        if now - self._last_sweep >= self.sweep_interval:
+            self.sweep(now)
+        if self.maxsize is not None and token not in self._entries:
+            while len(self._entries) >= self.maxsize:
+                self._evict_next()
+        self._entries[token] = (expires_at, value)
+        heapq.heappush(self._expiry_heap, (expires_at, token))
+        # Overwritten/popped tokens leave stale heap items behind; rebuild once they dominate
+        if len(self._expiry_heap) > 2 * len(self._entries) + 64:
+            self._expiry_heap = [(expires, token) for token, (expires, _) in self._entries.items()]
+            heapq.heapify(self._expiry_heap)
+
+    def pop(self, token: str) -> Optional[Any]:
+        entry = self._entries.pop(token, None)
+        if entry is None or entry[0] <= self.clock():
+            return None
+        return entry[1]
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        now = self.clock() if now is None else now
+        self._last_sweep = now
+        removed = 0
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            expires_at, token = heapq.heappop(self._expiry_heap)
+            entry = self._entries.get(token)
+            if entry is not None and entry[0] == expires_at:
+                del self._entries[token]
+                removed += 1
+        return removed
+
+    def _evict_next(self):
+        while self._expiry_heap:
+            expires_at, token = heapq.heappop(self._expiry_heap)
+            entry = self._entries.get(token)
+            if entry is not None and entry[0] == expires_at:
+                del self._entries[token]
+                return
+
+
+@dataclass
+class SQLiteSessionStore:
+    """`SessionStore` in a SQLite file, shared by every process that opens the same `path`
+
+    - Uses WAL mode so readers in other workers don't block on writers
+    - Tokens are stored as sha256 hashes; `expires_at` is indexed so `sweep()` is a single range delete
+    - `max_rows` bounds the table: `sweep()` drops the sessions closest to expiry beyond that count
+    - Values go through `serialize`/`deserialize` (JSON by default; i.e. pass `Session.to_json`/`Session.from_json`)
+    - Calls do disk I/O and may wait up to `busy_timeout` seconds for another process's write: in async code, make
+      them from a worker thread (i.e. `anyio.to_thread.run_sync`). Calls from several threads are serialized
+    """
+    path: str
+    serialize: Callable[[Any], str] = json.dumps
+    deserialize: Callable[[str], Any] = json.loads
+    max_rows: Optional[int] = None
+    sweep_interval: float = 60.0
+    busy_timeout: float = 5.0
+    clock: Callable[[], float] = time.time
+    _last_sweep: float = field(default=0.0, init=False, repr=False)
+
+    def __post_init__(self):
+        import sqlite3
+
+        # One connection for every thread: the lock keeps statements (and transactions) from interleaving
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, timeout=self.busy_timeout)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (token TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def get(self, token: str) -> Optional[Any]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM sessions WHERE token = ? AND expires_at > ?", (_token_key(token), self.clock())
+            ).fetchone()
+        return None if row is None else self.deserialize(row[0])
+
+    def set(self, token: str, value: Any, expires_at: float):
+        value = self.serialize(value)
+        with self._lock:
+            now = self.clock()
+            if now - self._last_sweep >= self.sweep_interval:
+                self.sweep(now)
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions (token, value, expires_at) VALUES (?, ?, ?)",
+                (_token_key(token), value, expires_at)
+            )
+
+    def pop(self, token: str) -> Optional[Any]:
+        key = _token_key(token)
+        with self._lock, self._transaction():
+            row = self._db.execute(
+                "SELECT value, expires_at FROM sessions WHERE token = ?", (key,)
+            ).fetchone()
+            self._db.execute("DELETE FROM sessions WHERE token = ?", (key,))
+        if row is None or row[1] <= self.clock():
+            return None
+        return self.deserialize(row[0])
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        now = self.clock() if now is None else now
+        with self._lock, self._transaction():
+            self._last_sweep = now
+            removed = self._db.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,)).rowcount
+            if self.max_rows is not None:
+                removed += self._db.execute(
+                    "DELETE FROM sessions WHERE token IN "
+                    "(SELECT token FROM sessions ORDER BY expires_at LIMIT MAX(0, (SELECT COUNT(*) FROM sessions) - ?))",
+                    (self.max_rows,)
+                ).rowcount
+        return removed
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    @contextmanager
+    def _transaction(self):
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+
+
+@dataclass
+class RotationGrace:
+    """Keep answering for a rotated-out token for `grace` seconds, with the token that replaced it
+
+    - For `AuthProtocol` implementations that issue a new token on every `check_auth` (i.e. `SimpleAuth`):
+      record each rotation with `rotated(old, new)`, and when a checked token is missing, answer with
+      `successor(token)` (after checking that session) instead of raising `ShinyLiveAuthExpired`
+    - Tabs and apps that checked the same token at once (i.e. loaded together) then all end up with the same
+      new token, instead of all but one holding a dead session
+    - Follows chains (a replacement rotated again within the window); tokens are kept as digests, and at most
+      `maxsize` rotations are remembered
+
+    Args:
+        grace (float): seconds a rotated-out token is still answered for
+        maxsize (int): max number of rotations remembered
+    """
+    grace: float = 10.0
+    maxsize: int = 10_000
+    clock: Callable[[], float] = time.monotonic
+    _successors: "OrderedDict[str, Tuple[str, float]]" = field(default_factory=OrderedDict, init=False, repr=False)
+
+    # Longest chain of rotations followed by `successor`
+    MAX_HOPS = 8
+
+    def rotated(self, old: str, new: str):
+        now, key = self.clock(), _token_key(old)
+        self._successors[key] = (new, now + self.grace)
+        self._successors.move_to_end(key)
+        # Oldest first, so expired rotations are all at the front
+        while self._successors and (
+            len(self._successors) > self.maxsize or next(iter(self._successors.values()))[1] <= now
+        ):
+            self._successors.popitem(last=False)
+
+    def successor(self, token: str) -> Optional[str]:
+        """The latest token that replaced `token` within the grace window, or None"""
+        now, latest = self.clock(), None
+        for _ in range(self.MAX_HOPS):
+            entry = self._successors.get(_token_key(token))
+            if entry is None or entry[1] <= now:
+                break
+            latest = token = entry[0]
+        return latest
+
+
+##########################################################################
+##########################################################################
+# Password hashing kept off the event loop
+##########################################################################
+##########################################################################
+@dataclass
+class PasswordHasher:
+    """Hash and verify passwords without blocking the event loop
+
+    - PBKDF2-SHA256 from `hashlib` (no extra dependencies; also available in pyodide)
+    - Hashes carry their own parameters (`pbkdf2_sha256$<iterations>$<salt>$<hash>`), so `iterations` can be
+      raised later without invalidating stored hashes
+    - `verify` runs on a bounded thread pool (or `executor`, i.e. a `ProcessPoolExecutor`), and at most
+      `max_concurrent` verifications run at once; extra logins wait their turn instead of starving other sessions
+    - Comparisons are constant-time, and `verify(password, None)` does the same work as a real check (for
+      unknown usernames)
+    - **Note**: pyodide has no threads, so verification runs inline there
+
+    Args:
+        iterations (int): PBKDF2 iterations for new hashes
+        max_workers (int): size of the default thread pool
+        max_concurrent (int): max verifications in flight
+        executor (concurrent.futures.Executor, optional): run hashing here instead of the default pool
+    """
+    iterations: int = 600_000
+    max_workers: int = 2
+    max_concurrent: int = 4
+    executor: Optional[Any] = None
+    _semaphore: Optional[asyncio.Semaphore] = field(default=None, init=False, repr=False)
+    _dummy_hash: Optional[str] = field(default=None, init=False, repr=False)
+
+    def hash(self, password: Union[SecretStr, str]) -> str:
+        salt = secrets.token_bytes(16)
+        digest = _pbkdf2(_secret_value(password), salt, self.iterations)
+        return f"pbkdf2_sha256${self.iterations}${_b64encode(salt)}${_b64encode(digest)}"
+
+    async def verify(self, password: Union[SecretStr, str], encoded: Optional[str]) -> bool:
+        if encoded is None:
+            if self._dummy_hash is None:
+                # As slow as a real hash: made on the pool too, not on the event loop
+                self._dummy_hash = await self._run(self.hash, secrets.token_urlsafe(16))
+            await self._run(_verify_password, _secret_value(password), self._dummy_hash)
+            return False
+        return await self._run(_verify_password, _secret_value(password), encoded)
+
+    async def _run(self, fn: Callable[..., T], *args) -> T:
+        if "pyodide" in sys.modules:
+            return fn(*args)
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        if self.executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="shinylive-auth-hash")
+        async with self._semaphore:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+
+def _secret_value(password: Union[SecretStr, str]) -> str:
+    return password if isinstance(password, str) else password.get_secret_value()
+
+
+def _pbkdf2(password: str, salt: bytes, iterations: int) -> bytes:
+    return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+
+
+def _verify_password(password: str, encoded: str) -> bool:
+    try:
+        algorithm, iterations, salt, digest = encoded.split("$")
+        if algorithm != "pbkdf2_sha256":
+            return False
+        return hmac.compare_digest(_pbkdf2(password, _b64decode(salt), int(iterations)), _b64decode(digest))
+    except (ValueError, binascii.Error):
+        return False
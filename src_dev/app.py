@@ -6,9 +6,22 @@ from shiny import App, Inputs, Outputs, Session, reactive, render, ui
 from simple_security.auth import SimpleAuth as SampleAuth
 
 APP_GROUPS_REQUIRED = ["group1"]
+# Shared by every session, so reloads and extra tabs reuse recent `check_auth` results, and login
+# attempts per username are limited across sessions
+APP_AUTH = auth.RateLimitedAuth(auth.CachedAuth(SampleAuth(groups_needed=APP_GROUPS_REQUIRED), ttl=30))
+# Sessions in this process are logged out as soon as their token or user is revoked; the cache drops revoked tokens
+REVOCATIONS = auth.RevocationFeed()
+REVOCATIONS.subscribe(APP_AUTH.revoke)
+# With `RestAPIAuth`, revocations made on the auth server reach the browser over server-sent events
+REVOCATIONS_URL = None  # i.e. "http://localhost:8000/auth/revocations"
+# Apps served from the same origin (i.e. under `/apps`) reuse each other's recent validations of the token and
+# follow each other's refreshes and logouts
+# - Only in shinylive (pyodide): records come from the browser, so server-side Shiny doesn't use them
+SHARED_SESSION = auth.SharedSession(groups_needed=APP_GROUPS_REQUIRED) if auth.SharedSession.trusted() else None
+auth.configure_auth_logging()
 
 app_ui = ui.page_fluid(
-    auth.view(auth.DEFAULT_AUTH_MODULE_ID),  # <---- AUTH SETUP HERE (creates a logout button here)
+    auth.view(auth.DEFAULT_AUTH_MODULE_ID, revocations_url=REVOCATIONS_URL, shared=SHARED_SESSION),  # <---- AUTH SETUP HERE (creates a logout button here)
     ui.output_ui("init_main_view"),
     # shinyswatch.theme.minty(),
     title="Test Auth Page",
@@ -29,10 +42,15 @@ def server(input: Inputs, output: Outputs, session: Session):
     #################################################################################################
     # AUTH SETUP HERE
     session_auth = auth.AuthReactiveValues()
-    auth.server(auth.DEFAULT_AUTH_MODULE_ID, session_auth, app_auth=SampleAuth(groups_needed=APP_GROUPS_REQUIRED))
+    # Refresh the token in the background shortly before the session expires
+    auth.server(
+        auth.DEFAULT_AUTH_MODULE_ID, session_auth, app_auth=APP_AUTH, refresh=auth.RefreshSchedule(coordinate=True),
+        revocations=REVOCATIONS, shared=SHARED_SESSION
+    )
     
     @render.ui
     def init_main_view():
+        # Only reruns on login/logout, not when the token is refreshed or an optimistic session is confirmed
         if session_auth.hide_app.get() is True:
             return
         return app_view()
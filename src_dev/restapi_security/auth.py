@@ -1,16 +1,14 @@
-import json
-import sys
-from dataclasses import dataclass
-from typing import Optional
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional, Union
 
-from pydantic import SecretStr
+from shinylive_auth import MicroBatcher, SecretStr, ShinyLiveAuthUnavailable, ShinyLiveRateLimited, log_auth_event
 
-# from .shiny_api_calls import get_url
+from .transport import Transport, TransportError, TransportResponse, default_transport
 
-if "pyodide" in sys.modules:
-    from pyodide import http
-else:
-    from pyfetch_mimic import http
+# from .shiny_api_calls import get_url
 
 
 class GeneralAuthException(Exception):
@@ -21,42 +19,107 @@ class GeneralAuthException(Exception):
 class RestAPIAuth:
     groups_needed: Optional[list] = None
     base_url: str = "http://localhost:8000"
-    
+    transport: Transport = field(default_factory=default_transport)
+    # Seconds to collect `check_auth` calls into one `/auth/check/batch` request (None sends each on its own)
+    batch_window: Optional[float] = None
+
+    # Most tokens per `/auth/check/batch` request (the test webserver's `MAX_BATCH`); larger checks are split
+    BATCH_SIZE = 100
+
+    # Claims of the most recent tokens returned by `/auth/token` and `/auth/check`, for `token_claims`
+    CLAIMS_KEPT = 64
+
+    def __post_init__(self):
+        self._batcher = None if self.batch_window is None else MicroBatcher(
+            self.check_auth_many, window=self.batch_window, max_batch=self.BATCH_SIZE
+        )
+        self._claims: "OrderedDict[str, dict]" = OrderedDict()
+
     async def get_auth(self, username: str, password: SecretStr) -> str:
-        response = await http.pyfetch(
-            url=f"{self.base_url}/auth/token",
-            headers={"Content-Type": "application/json"},
-            body=json.dumps({"username": username, "password": password.get_secret_value(), "groups_needed": self.groups_needed}),
-            method="POST"
+        response = await self._post(
+            "/auth/token",
+            {"username": username, "password": password.get_secret_value(), "groups_needed": self.groups_needed}
         )
-        status = int(response.status)
+        status = response.status
+        # 401 (204 from servers that predate the 401 contract)
         if status in (401, 204,):
             raise self.ShinyLiveAuthFailed
         if status in (403,):
             raise self.ShinyLivePermissions
+        if status in (429,):
+            raise ShinyLiveRateLimited(response.retry_after or 0.0)
+        if status >= 500:
+            log_auth_event("auth_server_error", logging.WARNING, call="get_auth", status=status)
+            raise ShinyLiveAuthUnavailable(f"Auth server error. Status code: {status}")
         if status not in (200,):
-            print(status)
+            log_auth_event("auth_server_error", logging.WARNING, call="get_auth", status=status)
             raise self.ShinyLiveAuthExpired(f"Login for {username} failed due to an unknown reason. Status code: {status}")
-        data = await response.json()
-        return data["token"]
+        return self._remember(response.data)
 
     async def check_auth(self, token: str) -> str:
-        response = await http.pyfetch(
-            url=f"{self.base_url}/auth/check",
-            headers={"Content-Type": "application/json"},
-            body=json.dumps({"token": token, "groups_needed": self.groups_needed}),
-            method="POST"
-        )
-        status = int(response.status)
-        if status in (204, 401,):
+        if self._batcher is not None:
+            return await self._batcher.submit(token)
+        response = await self._post("/auth/check", {"token": token, "groups_needed": self.groups_needed})
+        status = response.status
+        # 401 (204 from servers that predate the 401 contract)
+        if status in (401, 204,):
             raise self.ShinyLiveAuthExpired
         if status in (403,):
             raise self.ShinyLivePermissions
+        if status >= 500:
+            log_auth_event("auth_server_error", logging.WARNING, call="check_auth", status=status)
+            raise ShinyLiveAuthUnavailable(f"Auth server error. Status code: {status}")
         if status not in (200,):
-            print(status)
+            log_auth_event("auth_server_error", logging.WARNING, call="check_auth", status=status)
             raise self.ShinyLiveAuthExpired(f"Authentication check failed due to an unknown reason. Status code: {status}")
-        data = await response.json()
-        return data["token"]
+        return self._remember(response.data)
+
+    def token_claims(self, token: str) -> Optional[dict]:
+        return self._claims.get(token)
+
+    async def end_auth(self, token: str):
+        # The server drops the session and publishes its revocation; any status is fine, the browser has logged out
+        await self._post("/auth/logout", {"token": token})
+
+    async def check_auth_many(self, tokens: List[str]) -> List[Union[str, Exception]]:
+        if len(tokens) > self.BATCH_SIZE:
+            size = self.BATCH_SIZE
+            chunks = await asyncio.gather(
+                *[self.check_auth_many(tokens[i:i + size]) for i in range(0, len(tokens), size)]
+            )
+            return [result for chunk in chunks for result in chunk]
+        response = await self._post("/auth/check/batch", {"tokens": tokens, "groups_needed": self.groups_needed})
+        if response.status >= 500:
+            log_auth_event("auth_server_error", logging.WARNING, call="check_auth_many", status=response.status)
+            raise ShinyLiveAuthUnavailable(f"Auth server error. Status code: {response.status}")
+        if response.status not in (200,):
+            log_auth_event("auth_server_error", logging.WARNING, call="check_auth_many", status=response.status)
+            error = self.ShinyLiveAuthExpired(f"Batch authentication check failed. Status code: {response.status}")
+            return [error] * len(tokens)
+        return [self._check_result(result["status"], result.get("token")) for result in response.data["results"]]
+
+    def _remember(self, data: dict) -> str:
+        token = data["token"]
+        if data.get("claims") is not None:
+            self._claims[token] = data["claims"]
+            self._claims.move_to_end(token)
+            while len(self._claims) > self.CLAIMS_KEPT:
+                self._claims.popitem(last=False)
+        return token
+
+    def _check_result(self, status: int, token: Optional[str]) -> Union[str, Exception]:
+        if status == 200:
+            return token
+        if status in (403,):
+            return self.ShinyLivePermissions()
+        return self.ShinyLiveAuthExpired()
+
+    async def _post(self, path: str, payload: dict) -> TransportResponse:
+        try:
+            return await self.transport.post_json(f"{self.base_url}{path}", payload)
+        except TransportError as e:
+            # Timeouts, connection errors and an open circuit: the session may well be valid, so not "expired"
+            raise ShinyLiveAuthUnavailable(f"Auth server unavailable: {e}") from e
 
     class ShinyLiveAuthFailed(Exception):
         ...
@@ -65,4 +128,4 @@ class RestAPIAuth:
         ...
 
     class ShinyLivePermissions(Exception):
-        ...
\ No newline at end of file
+        ...
@@ -0,0 +1,179 @@
+import asyncio
+import json
+import random
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Optional, Protocol
+
+
+class TransportError(Exception):
+    ...
+
+
+class CircuitOpen(TransportError):
+    ...
+
+
+@dataclass
+class TransportResponse:
+    status: int
+    data: Optional[dict] = None
+    retry_after: Optional[float] = None  # `Retry-After` header (seconds), i.e. on 429
+
+
+def _retry_after(headers) -> Optional[float]:
+    if not headers:
+        return None
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class Transport(Protocol):
+    async def post_json(self, url: str, payload: dict, timeout: Optional[float] = None) -> TransportResponse:
+        """POST `payload` as JSON and return the status (and decoded body when the status is 200)
+
+        Raises:
+            TransportError: the request could not be completed (connection error, timeout, etc.)
+        """
+        ...
+
+
+@dataclass
+class PyfetchTransport:
+    """`pyodide.http.pyfetch` in the browser; `pyfetch_mimic` (same API, backed by httpx) elsewhere"""
+
+    async def post_json(self, url: str, payload: dict, timeout: Optional[float] = None) -> TransportResponse:
+        if "pyodide" in sys.modules:
+            from pyodide import http
+
+            errors = (OSError,)
+        else:
+            import httpx
+            from pyfetch_mimic import http
+
+            # `pyfetch_mimic` lets httpx's exceptions through (i.e. `httpx.ConnectError`)
+            errors = (OSError, httpx.TransportError)
+
+        try:
+            response = await asyncio.wait_for(
+                http.pyfetch(
+                    url=url,
+                    headers={"Content-Type": "application/json"},
+                    body=json.dumps(payload, separators=(",", ":")),
+                    method="POST"
+                ),
+                timeout=timeout
+            )
+            status = int(response.status)
+            data = await response.json() if status == 200 else None
+        except asyncio.TimeoutError as e:
+            raise TransportError(f"Request to {url} timed out after {timeout}s") from e
+        except errors as e:
+            raise TransportError(f"Request to {url} failed: {e}") from e
+        return TransportResponse(status=status, data=data, retry_after=_retry_after(getattr(response, "headers", None)))
+
+
+@dataclass
+class HTTPXTransport:
+    """Pooled, keep-alive `httpx.AsyncClient` for server-side Shiny (one client shared by every call)"""
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    client: Optional["httpx.AsyncClient"] = None  # noqa: F821
+
+    async def post_json(self, url: str, payload: dict, timeout: Optional[float] = None) -> TransportResponse:
+        import httpx
+
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections
+                )
+            )
+        try:
+            response = await self.client.post(url, json=payload, timeout=timeout)
+        except httpx.TimeoutException as e:
+            raise TransportError(f"Request to {url} timed out after {timeout}s") from e
+        except httpx.TransportError as e:
+            raise TransportError(f"Request to {url} failed: {e}") from e
+        data = response.json() if response.status_code == 200 else None
+        return TransportResponse(status=response.status_code, data=data, retry_after=_retry_after(response.headers))
+
+    async def aclose(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+
+@dataclass
+class CircuitBreaker:
+    """Fail fast while the auth server is down
+
+    - Opens after `failure_threshold` consecutive failed calls
+    - While open, calls raise `CircuitOpen` immediately instead of waiting on timeouts
+    - After `reset_after` seconds one trial call is let through; success closes the circuit again
+    """
+    failure_threshold: int = 5
+    reset_after: float = 30.0
+    clock: Callable[[], float] = time.monotonic
+    _failures: int = field(default=0, init=False)
+    _opened_at: Optional[float] = field(default=None, init=False)
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None and self.clock() - self._opened_at < self.reset_after
+
+    def before_call(self):
+        if self.is_open:
+            raise CircuitOpen("Auth server marked unavailable; not sending request")
+        if self._opened_at is not None:
+            # Half-open: let this call through, re-open straight away if it fails
+            self._failures = self.failure_threshold - 1
+            self._opened_at = None
+
+    def record_success(self):
+        self._failures = 0
+        self._opened_at = None
+
+    def record_failure(self):
+        self._failures += 1
+        if self._failures >= self.failure_threshold:
+            self._opened_at = self.clock()
+
+
+@dataclass
+class ResilientTransport:
+    """Add per-call timeouts, bounded retries (with full jitter) on 5xx/connection errors, and a circuit breaker"""
+    transport: Transport
+    timeout: float = 5.0
+    retries: int = 2
+    backoff: float = 0.1
+    breaker: CircuitBreaker = field(default_factory=CircuitBreaker)
+
+    async def post_json(self, url: str, payload: dict, timeout: Optional[float] = None) -> TransportResponse:
+        self.breaker.before_call()
+        for attempt in range(self.retries + 1):
+            try:
+                response = await self.transport.post_json(url, payload, timeout=timeout or self.timeout)
+            except TransportError as e:
+                error = e
+            else:
+                if response.status < 500:
+                    self.breaker.record_success()
+                    return response
+                error = TransportError(f"Request to {url} failed. Status code: {response.status}")
+            if attempt < self.retries:
+                await asyncio.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+        self.breaker.record_failure()
+        raise error
+
+
+def default_transport() -> Transport:
+    """pyfetch inside pyodide; a pooled httpx client when running server-side"""
+    if "pyodide" in sys.modules:
+        return ResilientTransport(PyfetchTransport())
+    return ResilientTransport(HTTPXTransport())
@@ -1,36 +1,46 @@
 from dataclasses import dataclass
-from typing import List
+from typing import List, Optional, Union
 
-from pydantic import SecretStr
+from shinylive_auth import Requirement, SecretStr
 
-from .models import Session
-from .storage import sessions, users
+from .models import Session, passwords, permissions
+from .storage import rotations, sessions, users
 
 SESSIONS_EXPIRE_MIN = 2
 
 
 @dataclass
 class SimpleAuth:
-    groups_needed: List[str] = None
-    
+    groups_needed: Union[List[str], Requirement] = None
+
+    def __post_init__(self):
+        # Compiled once; per-request checks are a bitmask comparison
+        self._required = permissions.compile(self.groups_needed)
+
     async def get_auth(self, username: str, password: SecretStr) -> str:
         user = users.get(username)
-        # Does user exist?
+        # Does user exist? (still hash the password, so unknown usernames take as long as wrong passwords)
         if user is None:
+            await passwords.verify(password, None)
             raise self.ShinyLiveAuthFailed
         # Does password match?
-        if user.is_valid(password) is False:
+        if await user.is_valid(password) is False:
             raise self.ShinyLiveAuthFailed
         # Does user have sufficient permissions?
-        if user.sufficient_permissions(self.groups_needed) is False:
+        if user.sufficient_permissions(self._required) is False:
             raise self.ShinyLivePermissions
         # Create token
         session_id = Session.create_id()
-        sessions[session_id] = Session(username=username, groups=user.groups)
+        session = Session(username=username, groups=user.groups)
+        sessions.set(session_id, session, session.expires.timestamp())
         return session_id
 
     async def check_auth(self, token: str) -> str:
         session = sessions.get(token)
+        # Rotated out moments ago (i.e. by another tab checking it at the same time)? Answer with its replacement
+        successor = rotations.successor(token) if session is None else None
+        if successor is not None:
+            session = sessions.get(successor)
         # Does session exist?
         if session is None:
             raise self.ShinyLiveAuthExpired
@@ -38,16 +48,40 @@ class SimpleAuth:
         if session.is_valid() is False:
             raise self.ShinyLiveAuthExpired
         # Does user have sufficient permissions?
-        if session.sufficient_permissions() is False:
+        if session.sufficient_permissions(self._required) is False:
             raise self.ShinyLivePermissions
+        if successor is not None:
+            return successor
+        # Remove old session
+        sessions.pop(token)
         # Refresh token
         session.refresh()
         session_id = Session.create_id()
-        sessions[session_id] = session.copy(deep=True)
-        sessions.pop(token)
-        # Remove old session
+        sessions.set(session_id, session, session.expires.timestamp())
+        rotations.rotated(token, session_id)
         return session_id
 
+    def token_expires(self, token: str) -> Optional[float]:
+        session = sessions.get(token)
+        return None if session is None else session.expires.timestamp()
+
+    def token_subject(self, token: str) -> Optional[str]:
+        session = sessions.get(token)
+        return None if session is None else session.username
+
+    def token_claims(self, token: str) -> Optional[dict]:
+        session = sessions.get(token)
+        if session is None:
+            return None
+        return {"sub": session.username, "groups": session.groups, "exp": session.expires.timestamp()}
+
+    def end_auth(self, token: str):
+        sessions.pop(token)
+        # A tab logging out with a token rotated moments ago ends the session that replaced it, too
+        successor = rotations.successor(token)
+        if successor is not None:
+            sessions.pop(successor)
+
     class ShinyLiveAuthFailed(Exception):
         ...
 
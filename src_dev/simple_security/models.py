@@ -1,38 +1,61 @@
+import logging
 import secrets
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-from typing import List
+from typing import List, Optional
 
-from pydantic import BaseModel, SecretStr
+from shinylive_auth import PasswordHasher, PermissionIndex, Requirement, SecretStr, log_auth_event
 
 SESSIONS_EXPIRE_MIN = 1
 
+# This sample also runs in the browser, where pyodide has no threads and hashing blocks the page: 600k
+# iterations take several seconds there. The hashes ship to the browser with the app anyway, so client-side
+# checks are a demo, not a security boundary; keep the default where hashing runs server-side (see `app_security`)
+passwords = PasswordHasher(iterations=20_000)
+permissions = PermissionIndex()
 
-class User(BaseModel):
+
+def _expires() -> datetime:
+    return datetime.now() + timedelta(minutes=SESSIONS_EXPIRE_MIN)
+
+
+@dataclass(slots=True)
+class User:
     username: str
-    password: SecretStr
-    groups: List[str] = None
+    password_hash: str
+    groups: Optional[List[str]] = None
+    group_mask: int = field(default=0, init=False)
 
-    def is_valid(self, password: SecretStr) -> bool:
-        if self.password.get_secret_value() != password.get_secret_value():
-            print(f"Login attempted: {self.username} | Login status: FAILED | Action: NOT ACCESS")
+    def __post_init__(self):
+        # Computed from `groups` (never passed in), so masks stay valid when sessions are loaded from storage
+        self.group_mask = permissions.encode(self.groups)
+
+    async def is_valid(self, password: SecretStr) -> bool:
+        if await passwords.verify(password, self.password_hash) is False:
+            log_auth_event("login", logging.WARNING, username=self.username, status="FAILED")
             return False
-        print(f"Login attempted: {self.username} | Login status: SUCCESS | Action: ALLOWED")
+        log_auth_event("login", username=self.username, status="SUCCESS")
         return True
     
-    def sufficient_permissions(self, required_groups: list = None) -> bool:
-        return _sufficient_permissions(self.username, required_groups, self.groups)
+    def sufficient_permissions(self, required: Requirement) -> bool:
+        return _sufficient_permissions(self.username, required, self.group_mask)
 
 
-class Session(BaseModel):
+@dataclass(slots=True)
+class Session:
     username: str
-    groups: List[str] = None
-    expires: datetime = datetime.now() + timedelta(minutes=SESSIONS_EXPIRE_MIN)
+    groups: Optional[List[str]] = None
+    expires: datetime = field(default_factory=_expires)
+    group_mask: int = field(default=0, init=False)
+
+    def __post_init__(self):
+        self.group_mask = permissions.encode(self.groups)
 
     def is_valid(self) -> bool:
         if self.expires < datetime.now():
-            print(f"Session loaded: {self.username} | Session status: EXPIRED | Action: NOT ACCESS")
+            log_auth_event("session_check", username=self.username, status="EXPIRED")
             return False
-        print(f"Session loaded: {self.username} | Session status: VALID | Action: ALLOWED")
+        log_auth_event("session_check", username=self.username, status="VALID")
         return True
     
     @staticmethod
@@ -40,16 +63,16 @@ class Session(BaseModel):
         return secrets.token_urlsafe(16)
     
     def refresh(self):
-        self.expires = datetime.now() + timedelta(minutes=SESSIONS_EXPIRE_MIN)
-        print(f"Session update: {self.username} | Action: Refreshed")
+        self.expires = _expires()
+        log_auth_event("session_refresh", username=self.username)
 
-    def sufficient_permissions(self, required_groups: list = None) -> bool:
-        return _sufficient_permissions(self.username, required_groups, self.groups)
+    def sufficient_permissions(self, required: Requirement) -> bool:
+        return _sufficient_permissions(self.username, required, self.group_mask)
 
 
-def _sufficient_permissions(username: str, required_groups: list = None, user_groups: list = None) -> bool:
-    if required_groups is not None and set(required_groups).issubset(user_groups) is False:
-        print(f"User loaded: {username} | Permissions status: INVALID | Action: NOT ALLOWED")
+def _sufficient_permissions(username: str, required: Requirement, group_mask: int) -> bool:
+    if required.satisfied_by(group_mask) is False:
+        log_auth_event("permissions", logging.WARNING, username=username, status="INVALID")
         return False
-    print(f"User loaded: {username} | Permissions status: VALID | Action: ALLOWED")
+    log_auth_event("permissions", username=username, status="VALID")
     return True
\ No newline at end of file
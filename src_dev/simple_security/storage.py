@@ -1,13 +1,26 @@
 from datetime import datetime
 
-from pydantic import SecretStr
+from shinylive_auth import MemorySessionStore, RotationGrace
 
 from .models import Session, User
 
+# Hashes created with `passwords.hash(...)`; sample passwords are "password" and "password2"
 users = {
-    "username": User(username="username", password=SecretStr(value="password"), groups=["app1", "group1"]),
-    "username2": User(username="username2", password=SecretStr(value="password2"), groups=["app2"]),
+    "username": User(
+        username="username",
+        password_hash="pbkdf2_sha256$20000$MNOh-H1ohOsnlWDetKu3sg$NlaGOSF-wDNr7gVqjmI5cHSa6pJo1nZODEtrkvQ9XgI",
+        groups=["app1", "group1"]
+    ),
+    "username2": User(
+        username="username2",
+        password_hash="pbkdf2_sha256$20000$Ga_Mhb_Q-yzR_NTxs06PyQ$bgoybPeW5NwF5xXKApMaokjlLQzKjKRLWWPp5meZXEs",
+        groups=["app2"]
+    ),
 }
 
 
-sessions = {"example_token": Session(username="example", expires=datetime.now())}
\ No newline at end of file
+sessions = MemorySessionStore()
+# Tokens rotated out by `SimpleAuth.check_auth` are still answered for (with their replacement) for a few
+# seconds, so tabs and apps that check the same token at once don't end up with a dead session
+rotations = RotationGrace(grace=10)
+sessions.set("example_token", Session(username="example", expires=datetime.now()), datetime.now().timestamp())
\ No newline at end of file
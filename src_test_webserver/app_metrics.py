@@ -0,0 +1,56 @@
+import time
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from shinylive_auth import AuthMetrics, PrometheusExporter
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+router = APIRouter()
+
+route_metrics = AuthMetrics()
+exporter = PrometheusExporter(prefix="auth_server")
+
+# (route path, status code) -> outcome; anything else is an error
+ROUTE_CALLS = {"/auth/token": "get_auth", "/auth/check": "check_auth", "/auth/check/batch": "check_auth_many"}
+OUTCOMES = {
+    ("get_auth", 200): "success",
+    ("get_auth", 401): "failed",
+    ("get_auth", 403): "permissions",
+    ("get_auth", 429): "rate_limited",
+    ("check_auth", 200): "success",
+    ("check_auth_many", 200): "success",
+    ("check_auth", 401): "expired",
+    ("check_auth", 403): "permissions",
+}
+
+
+class AuthMetricsMiddleware:
+    """Records outcome and latency of the auth routes
+
+    - Plain ASGI (not `BaseHTTPMiddleware`), so it adds no task or stream per request
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        call = ROUTE_CALLS.get(scope["path"]) if scope["type"] == "http" else None
+        if call is None:
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_status(message: Message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            outcome = OUTCOMES.get((call, status["code"]), "error")
+            route_metrics.observe(call, outcome, time.perf_counter() - start)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return exporter.export(route_metrics)
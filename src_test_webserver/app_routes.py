@@ -1,61 +1,303 @@
+"""Auth routes used by `RestAPIAuth`
+
+Status contract (`/token`, `/check`, and each result of `/check/batch`):
+- 200: `{"token": ..., "claims": {"sub": str, "groups": [str], "exp": float}}` (no claims in `/check/batch` results)
+- 401: invalid credentials (`/token`) or missing/expired session (`/check`)
+- 403: insufficient permissions
+- 422: malformed request body (or more than `MAX_BATCH` tokens in `/check/batch`)
+- 429: too many login attempts (`Retry-After` header, `/token` only)
+
+Revocation: `/logout` ends one session, `/revoke` (admin) ends sessions by token or username, and
+`/revocations` streams each revocation to browsers as server-sent events (`Revocation.to_dict()`: digests only).
+Revoked tokens are also kept in a `RevocationFilter` (as `_token_key` digests: the route is unauthenticated), served
+incrementally by `/revocations/filter?since=<version>`. The filter and its versions are per worker process: with
+`AUTH_WORKERS` > 1 it holds only the revocations that worker handled, and a client whose requests reach another
+worker is sent a snapshot (`RevocationFilter.apply` refuses that worker's deltas) rather than skipping changes.
+
+Bodies are parsed once with orjson (when installed) and responses are built directly, so a check is one parse,
+one session lookup and one serialization. With SQLite session storage (`AUTH_SESSION_DB`), session lookups and
+changes run on a worker thread (see `_store_call`).
+"""
+import asyncio
+import hmac
+import json
+import math
+import time
 import uuid
-from typing import List, Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, TypeVar
 
-from app_security import Session, sessions, users
-from fastapi import APIRouter, HTTPException, Request
+import anyio
+import app_security
+from app_security import (
+    Session, address_limiter, passwords, permissions, revocations, revoked_tokens, sessions, user_limiter, users
+)
+from fastapi import APIRouter, Request, Response
+from fastapi.responses import StreamingResponse
 from loguru import logger
-from pydantic import BaseModel, SecretStr
+from pydantic import BaseModel
+from shinylive_auth import Requirement, Revocation, SecretStr, _token_key
+
+try:
+    import orjson
+except ImportError:  # optional; falls back to the standard library
+    orjson = None
 
 router = APIRouter()
 
+INVALID_TOKEN = {"WWW-Authenticate": 'Bearer error="invalid_token"'}
+# Server-sent events: a comment line keeps idle connections open through proxies; events a slow client has
+# not read yet are dropped beyond the queue size (its sessions are still rejected by `/check`)
+SSE_HEARTBEAT = 15.0
+SSE_QUEUE_SIZE = 256
+# SQLite calls do disk I/O and may wait on another worker's write lock, so they run on a worker thread instead of
+# blocking the event loop; in-memory storage is faster called inline
+STORE_OFF_LOOP = bool(app_security.SESSION_DB)
 
-class AuthCheck(BaseModel):
-    token: str
-    groups_needed: Optional[List[str]] = None
+T = TypeVar("T")
 
 
 class AuthResponse(BaseModel):
     token: str
+    claims: Optional[Dict[str, Any]] = None
 
 
-@router.post("/check", response_model=AuthResponse)
-async def auth_check(request: Request, check: AuthCheck):
-    print(await request.json())
-    print(request.headers)
-    # print(sessions)
-    session = sessions.get(check.token)
+class AuthCheckResult(BaseModel):
+    status: int
+    token: Optional[str] = None
+
+
+class AuthCheckBatchResponse(BaseModel):
+    results: List[AuthCheckResult]
+
+
+def _json_response(content: Any, status_code: int = 200, headers: Optional[Dict[str, str]] = None) -> Response:
+    body = orjson.dumps(content) if orjson is not None else json.dumps(content, separators=(",", ":")).encode()
+    return Response(body, status_code=status_code, headers=headers, media_type="application/json")
+
+
+def _error(status_code: int, detail: str, headers: Optional[Dict[str, str]] = None) -> Response:
+    return _json_response({"detail": detail}, status_code, headers)
+
+
+def _is_strings(value: Any) -> bool:
+    return isinstance(value, list) and all(isinstance(item, str) for item in value)
+
+
+async def _read_body(request: Request, strings: Iterable[str] = (), lists: Iterable[str] = ()) -> Optional[dict]:
+    """The JSON object body, or None if it isn't one or a field has the wrong type
+
+    - `strings`: required string fields; `lists`: required lists of strings
+    - `groups_needed` is always optional (null or a list of strings)
+    """
+    raw = await request.body()
+    try:
+        body = orjson.loads(raw) if orjson is not None else json.loads(raw)
+    except ValueError:  # includes orjson.JSONDecodeError
+        return None
+    if not isinstance(body, dict):
+        return None
+    if not all(isinstance(body.get(name), str) for name in strings):
+        return None
+    if not all(_is_strings(body.get(name)) for name in lists):
+        return None
+    groups_needed = body.get("groups_needed")
+    if groups_needed is not None and not _is_strings(groups_needed):
+        return None
+    return body
+
+
+async def _store_call(fn: Callable[..., T], *args) -> T:
+    """`fn(*args)` for anything that reads or changes session storage (`sessions`, `revoked_users`)"""
+    if STORE_OFF_LOOP:
+        return await anyio.to_thread.run_sync(fn, *args)
+    return fn(*args)
+
+
+def _claims(session: Session) -> dict:
+    """What the token grants, so apps sharing it can check their own groups (`shinylive_auth.token_claims`)"""
+    return {"sub": session.username, "groups": session.groups or [], "exp": session.expires.timestamp()}
+
+
+def _check_session(token: str, required: Requirement) -> Tuple[int, Optional[Session]]:
+    """Status code for an existing session (200 valid, 401 missing/expired, 403 insufficient permissions), and the
+    session if valid"""
+    session = sessions.get(token)
     if session is None:
         logger.info("Existing session load failed | No session found")
-        raise HTTPException(status_code=204)
+        return 401, None
     if session.is_valid() is not True:
-        logger.info(f"Existing session load by '{sessions[check.token].username}' failed | Session expired")
-        raise HTTPException(status_code=204)
-    if session.sufficient_permissions(check.groups_needed) is not True:
-        logger.info(f"Existing session load by '{sessions[check.token].username}' failed | insufficient permissions")
-        raise HTTPException(status_code=403, detail="Insufficient permissions.")
-    logger.info(f"Existing session load by {sessions[check.token].username} successful.")
-    return AuthResponse(token=check.token)
+        logger.info(f"Existing session load by '{session.username}' failed | Session expired or revoked")
+        return 401, None
+    if session.sufficient_permissions(required) is not True:
+        logger.info(f"Existing session load by '{session.username}' failed | insufficient permissions")
+        return 403, None
+    logger.info(f"Existing session load by {session.username} successful.")
+    return 200, session
+
 
+@router.post("/check", response_model=AuthResponse)
+async def auth_check(request: Request):
+    """Check an existing session: `{"token": str, "groups_needed": [str] | null}`"""
+    check = await _read_body(request, strings=("token",))
+    if check is None:
+        return _error(422, "Expected {'token': str, 'groups_needed': [str] | null}")
+    required = permissions.require(check.get("groups_needed"), known_only=True)
+    status, session = await _store_call(_check_session, check["token"], required)
+    if status == 401:
+        return _error(401, "Session is missing or expired.", INVALID_TOKEN)
+    if status == 403:
+        return _error(403, "Insufficient permissions.")
+    return _json_response({"token": check["token"], "claims": _claims(session)})
+
+
+# Most tokens per `/check/batch` request (`MicroBatcher.max_batch`), so one request can't hold the store for long
+MAX_BATCH = 100
+
+
+@router.post("/check/batch", response_model=AuthCheckBatchResponse)
+async def auth_check_batch(request: Request):
+    """Check many tokens in one request; one result per token (same order), with the status `/check` would return
+
+    - Body: `{"tokens": [str], "groups_needed": [str] | null}`, at most `MAX_BATCH` tokens
+    """
+    check = await _read_body(request, lists=("tokens",))
+    if check is None:
+        return _error(422, "Expected {'tokens': [str], 'groups_needed': [str] | null}")
+    if len(check["tokens"]) > MAX_BATCH:
+        return _error(422, f"At most {MAX_BATCH} tokens per batch.")
+    required = permissions.require(check.get("groups_needed"), known_only=True)
+    return _json_response({"results": await _store_call(_check_sessions, check["tokens"], required)})
 
-class AuthRequest(BaseModel):
-    username: str
-    password: SecretStr
-    groups_needed: Optional[List[str]] = None
+
+def _check_sessions(tokens: List[str], required: Requirement) -> List[dict]:
+    results = []
+    for token in tokens:
+        status, _ = _check_session(token, required)
+        results.append({"status": status, "token": token if status == 200 else None})
+    return results
+
+
+def _rate_limit(request: Request, username: str) -> Optional[Response]:
+    client = request.client.host if request.client else "unknown"
+    # Both checked before either counts, so attempts from a blocked address don't use up the user's budget
+    retry_after = max(user_limiter.retry_after(username), address_limiter.retry_after(client))
+    if retry_after == 0:
+        retry_after = user_limiter.acquire(username) or address_limiter.acquire(client)
+    if retry_after > 0:
+        logger.info(f"Login attempt by '{username}' from {client} rejected | rate limited")
+        return _error(429, "Too many login attempts.", {"Retry-After": str(math.ceil(retry_after))})
+    return None
 
 
 @router.post("/token", response_model=AuthResponse)
-async def auth_token(auth: AuthRequest):
-    user = users.get(auth.username)
+async def auth_token(request: Request):
+    """Log in: `{"username": str, "password": str, "groups_needed": [str] | null}`"""
+    auth = await _read_body(request, strings=("username", "password"))
+    if auth is None:
+        return _error(422, "Expected {'username': str, 'password': str, 'groups_needed': [str] | null}")
+    username, password = auth["username"], SecretStr(auth["password"])
+    limited = _rate_limit(request, username)
+    if limited is not None:
+        return limited
+    user = users.get(username)
     if user is None:
-        logger.info(f"Login attempt by '{auth.username}' failed | user doesn't exist")
-        raise HTTPException(status_code=204, detail="Username or password is invalid")
-    if user.is_valid(auth.password) is not True:
-        logger.info(f"Login attempt by '{auth.username}' failed | invalid username or password")
-        raise HTTPException(status_code=401, detail="Username or password is invalid")
-    if user.sufficient_permissions(auth.groups_needed) is not True:
-        logger.info(f"Login attempt by '{auth.username}' failed | Insufficient permissions")
-        raise HTTPException(status_code=403, detail="Insufficient permissions.")
+        await passwords.verify(password, None)
+        logger.info(f"Login attempt by '{username}' failed | user doesn't exist")
+        return _error(401, "Username or password is invalid")
+    if await user.is_valid(password) is not True:
+        logger.info(f"Login attempt by '{username}' failed | invalid username or password")
+        return _error(401, "Username or password is invalid")
+    if user.sufficient_permissions(permissions.require(auth.get("groups_needed"), known_only=True)) is not True:
+        logger.info(f"Login attempt by '{username}' failed | Insufficient permissions")
+        return _error(403, "Insufficient permissions.")
     session_id = str(uuid.uuid4())
-    sessions[session_id] = Session(username=auth.username, groups=user.groups)
-    logger.info(f"Login attempt by '{sessions[session_id].username}' successful.")
-    return AuthResponse(token=session_id)
\ No newline at end of file
+    session = Session(username=username, groups=user.groups)
+    await _store_call(sessions.set, session_id, session, session.expires.timestamp())
+    user_limiter.reset(username)
+    logger.info(f"Login attempt by '{session.username}' successful.")
+    return _json_response({"token": session_id, "claims": _claims(session)})
+
+
+@router.post("/logout", status_code=204)
+async def auth_logout(request: Request):
+    """End a session: `{"token": str}`; other tabs/apps holding the token are notified through `/revocations`"""
+    body = await _read_body(request, strings=("token",))
+    if body is None:
+        return _error(422, "Expected {'token': str}")
+    session = await _store_call(sessions.pop, body["token"])
+    if session is not None:
+        revoked_tokens.add(_token_key(body["token"]), session.expires.timestamp())
+        revocations.revoke(tokens=[body["token"]])
+        logger.info(f"Logout by '{session.username}' successful.")
+    return Response(status_code=204)
+
+
+@router.post("/revoke")
+async def auth_revoke(request: Request):
+    """End sessions in bulk (requires `X-Admin-Key`): `{"tokens": [str], "usernames": [str]}`
+
+    - Revoking a username ends every session it created until now; the user can log in again
+    """
+    admin_key = request.headers.get("x-admin-key", "")
+    if app_security.ADMIN_KEY is None or not hmac.compare_digest(admin_key.encode(), app_security.ADMIN_KEY.encode()):
+        return _error(403, "Admin key required.")
+    body = await _read_body(request)
+    tokens, usernames = (None, None) if body is None else (body.get("tokens") or [], body.get("usernames") or [])
+    if not (_is_strings(tokens) and _is_strings(usernames)):
+        return _error(422, "Expected {'tokens': [str], 'usernames': [str]}")
+    # Added here, on the event loop, where the filter is read
+    for token, expires_at in await _store_call(_revoke, tokens, usernames):
+        revoked_tokens.add(_token_key(token), expires_at)
+    notified = revocations.revoke(tokens=tokens, subjects=usernames)
+    logger.info(f"Revoked {len(tokens)} tokens and {len(usernames)} users")
+    return _json_response({"tokens": len(tokens), "usernames": len(usernames), "notified": notified})
+
+
+def _revoke(tokens: List[str], usernames: List[str]) -> List[Tuple[str, float]]:
+    """Revoke `usernames` and end the sessions of `tokens`; returns `(token, expires_at)` of each session ended"""
+    revoked_at = time.time()
+    for username in usernames:
+        app_security.revoked_users.revoke(username, revoked_at)
+    ended = []
+    for token in tokens:
+        session = sessions.pop(token)
+        if session is not None:
+            ended.append((token, session.expires.timestamp()))
+    return ended
+
+
+@router.get("/revocations/filter")
+async def auth_revocations_filter(since: Optional[int] = None):
+    """Digests of the tokens revoked after version `since` (`{"instance", "since", "version", "entries"}`), or a
+    full snapshot of the filter when `since` is missing or too old; see `RevocationFilter.sync`"""
+    return _json_response(revoked_tokens.changes(since))
+
+
+@router.get("/revocations")
+async def auth_revocations():
+    """Server-sent events stream: `event: revocation` with `Revocation.to_dict()` as data"""
+    queue: "asyncio.Queue[Revocation]" = asyncio.Queue(maxsize=SSE_QUEUE_SIZE)
+
+    def forward(revocation: Revocation):
+        if not queue.full():
+            queue.put_nowait(revocation)
+
+    unsubscribe = revocations.subscribe(forward)
+
+    async def events():
+        try:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    revocation = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+                    continue
+                data = orjson.dumps(revocation.to_dict()).decode() if orjson is not None else json.dumps(revocation.to_dict())
+                yield f"event: revocation\ndata: {data}\n\n"
+        finally:
+            unsubscribe()
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
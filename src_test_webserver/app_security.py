@@ -1,35 +1,77 @@
+import json
+import os
 import secrets
+import threading
+import time
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-from typing import List
+from typing import Dict, List, Optional
 
 from loguru import logger
-from pydantic import BaseModel, SecretStr
+from shinylive_auth import (
+    MemorySessionStore, PasswordHasher, PermissionIndex, RateLimiter, Requirement, RevocationFeed, RevocationFilter,
+    SecretStr, SQLiteSessionStore
+)
 
 SESSIONS_EXPIRE_MIN = 2
 
+passwords = PasswordHasher()
+permissions = PermissionIndex()
+# Login attempts allowed per username and per client address, checked before any password hashing
+# - Counted per worker process (with `AUTH_WORKERS` > 1 the effective limit is up to limit x workers)
+user_limiter = RateLimiter(limit=int(os.environ.get("AUTH_USER_LOGIN_LIMIT", 5)), window=60)
+address_limiter = RateLimiter(limit=int(os.environ.get("AUTH_ADDRESS_LOGIN_LIMIT", 30)), window=60)
 
-class User(BaseModel):
+# Revoked sessions are published here (streamed to browsers by `/auth/revocations`)
+# - Per worker process: with `AUTH_WORKERS` > 1, a revocation only reaches that worker's clients (the revoked
+#   sessions themselves are rejected by every worker, see `revoked_users`)
+revocations = RevocationFeed()
+# Revoked tokens (until their session would have expired), for verifiers that check tokens without calling
+# `/auth/check`; they sync it incrementally from `/auth/revocations/filter` (revoked usernames aren't included)
+# - Holds `_token_key` digests, and per worker process like `revocations`
+revoked_tokens = RevocationFilter(span=SESSIONS_EXPIRE_MIN * 60)
+# `/auth/revoke` requires this key in the `X-Admin-Key` header (disabled when unset)
+ADMIN_KEY = os.environ.get("AUTH_ADMIN_KEY")
+
+
+def _expires() -> datetime:
+    return datetime.now() + timedelta(minutes=SESSIONS_EXPIRE_MIN)
+
+
+@dataclass(slots=True)
+class User:
     username: str
-    password: SecretStr
-    groups: List[str] = None
+    password_hash: str
+    groups: Optional[List[str]] = None
+    group_mask: int = field(default=0, init=False)
 
-    def is_valid(self, password: SecretStr) -> bool:
-        if self.password.get_secret_value() != password.get_secret_value():
-            return False
-        return True
+    def __post_init__(self):
+        # Computed from `groups` (never passed in), so masks stay valid when sessions are loaded from storage
+        self.group_mask = permissions.encode(self.groups)
+
+    async def is_valid(self, password: SecretStr) -> bool:
+        return await passwords.verify(password, self.password_hash)
     
-    def sufficient_permissions(self, required_groups: list = None) -> bool:
-        return _sufficient_permissions(required_groups, self.groups)
+    def sufficient_permissions(self, required: Requirement) -> bool:
+        return required.satisfied_by(self.group_mask)
 
 
-class Session(BaseModel):
+@dataclass(slots=True)
+class Session:
     username: str
-    groups: List[str] = None
-    expires: datetime = datetime.now() + timedelta(minutes=SESSIONS_EXPIRE_MIN)
+    groups: Optional[List[str]] = None
+    expires: datetime = field(default_factory=_expires)
+    created: float = field(default_factory=time.time)
+    group_mask: int = field(default=0, init=False)
+
+    def __post_init__(self):
+        self.group_mask = permissions.encode(self.groups)
 
     def is_valid(self) -> bool:
         if self.expires < datetime.now():
             return False
+        if self.created < revoked_users.revoked_at(self.username):
+            return False
         return True
     
     @staticmethod
@@ -37,22 +79,84 @@ class Session(BaseModel):
         return secrets.token_urlsafe(16)
     
     def refresh(self):
-        self.expires = datetime.now() + timedelta(minutes=SESSIONS_EXPIRE_MIN)
+        self.expires = _expires()
         logger.info(f"Session update: {self.username} | Action: Refreshed")
 
-    def sufficient_permissions(self, required_groups: list = None) -> bool:
-        return _sufficient_permissions(required_groups, self.groups)
+    def sufficient_permissions(self, required: Requirement) -> bool:
+        return required.satisfied_by(self.group_mask)
 
+    def to_json(self) -> str:
+        return json.dumps({
+            "username": self.username, "groups": self.groups, "expires": self.expires.isoformat(), "created": self.created
+        })
 
-def _sufficient_permissions(required_groups: list = None, user_groups: list = None) -> bool:
-    if required_groups is not None and set(required_groups).issubset(user_groups) is False:
-        return False
-    return True
+    @classmethod
+    def from_json(cls, data: str) -> "Session":
+        values = json.loads(data)
+        return cls(values["username"], values["groups"], datetime.fromisoformat(values["expires"]), values["created"])
 
+
+# Hashes created with `passwords.hash(...)`; sample passwords are "password" and "password2"
 users = {
-    "username": User(username="username", password=SecretStr(value="password"), groups=["group1"]),
-    "username2": User(username="username2", password=SecretStr(value="password2"), groups=["app2"]),
+    "username": User(
+        username="username",
+        password_hash="pbkdf2_sha256$600000$eqU-J6UOlB02asiWJRE-UA$75ItZZNvP7XJMFXGVUV1zwJQfdAlxMBy3RQFaQSNmds",
+        groups=["group1"]
+    ),
+    "username2": User(
+        username="username2",
+        password_hash="pbkdf2_sha256$600000$smzyuTJoEaR9P4MdxKNqcg$HIvS118ni-9cLLp9sYLoK0KEwIyxU3uYfb60waKWsdA",
+        groups=["app2"]
+    ),
 }
 
 
-sessions = {"example_token": Session(username="example", expires=datetime.now())}
\ No newline at end of file
+@dataclass
+class RevokedUsers:
+    """When each revoked user was revoked; their sessions created before then are invalid
+
+    - With `path`, kept in that SQLite file (the session database), so every worker rejects the sessions;
+      otherwise in this process
+    - Like `SQLiteSessionStore`, the SQLite calls belong on a worker thread in async code (see `app_routes`)
+    """
+    path: Optional[str] = None
+
+    def __post_init__(self):
+        self._revoked: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._db = None
+        if self.path:
+            import sqlite3
+
+            self._db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, timeout=5.0)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS revoked_users (username TEXT PRIMARY KEY, revoked_at REAL NOT NULL)")
+
+    def revoke(self, username: str, revoked_at: float):
+        if self._db is None:
+            self._revoked[username] = revoked_at
+            return
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO revoked_users (username, revoked_at) VALUES (?, ?) "
+                "ON CONFLICT (username) DO UPDATE SET revoked_at = MAX(revoked_at, excluded.revoked_at)",
+                (username, revoked_at)
+            )
+
+    def revoked_at(self, username: str) -> float:
+        """Sessions of `username` created before this time are revoked (0.0 if never revoked)"""
+        if self._db is None:
+            return self._revoked.get(username, 0.0)
+        with self._lock:
+            row = self._db.execute("SELECT revoked_at FROM revoked_users WHERE username = ?", (username,)).fetchone()
+        return 0.0 if row is None else row[0]
+
+
+# Set `AUTH_SESSION_DB` to a file path to share sessions between worker processes (see `main.py`)
+SESSION_DB = os.environ.get("AUTH_SESSION_DB")
+if SESSION_DB:
+    sessions = SQLiteSessionStore(SESSION_DB, serialize=Session.to_json, deserialize=Session.from_json)
+else:
+    sessions = MemorySessionStore()
+revoked_users = RevokedUsers(SESSION_DB)
+sessions.set("example_token", Session(username="example", expires=datetime.now()), datetime.now().timestamp())
\ No newline at end of file
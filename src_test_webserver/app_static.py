@@ -0,0 +1,231 @@
+"""Static file serving for shinylive app bundles
+
+- `PrecompressedStaticFiles` serves `<file>.<sha>.br` / `<file>.<sha>.gz` variants (written at deploy time by
+  `precompress`) when the browser accepts them, with strong ETags, long-lived caching for content-hashed files and
+  range requests
+- Variants are named after the content hash of the file they were made from, so a variant is never served for
+  other content, whatever the file times say (i.e. files hard-linked by `tools/deploy.py` keep the mtime of the
+  first deploy of that content)
+- Precompress a bundle after exporting it: `python src_test_webserver/app_static.py src_test_webserver/shinyapps`
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import sys
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # optional; gzip variants are still written/served
+    brotli = None
+
+# Encodings in order of preference, with the suffix of their precompressed variant
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+# Types that are already compressed (zip-based wheels, images, fonts, ...)
+SKIP_SUFFIXES = {".br", ".gz", ".zip", ".whl", ".png", ".jpg", ".jpeg", ".gif", ".webp", ".woff", ".woff2"}
+# i.e. `app.3f9a2c1d.js` or `chunk-3f9a2c1d8e.css`: the name changes whenever the content does
+CONTENT_HASHED = re.compile(r"[.-][0-9a-f]{8,}\.[^/]+$")
+# `<file>.<sha>.<gz|br>`: a variant of `<file>`, made from content with hash `<sha>`
+VARIANT = re.compile(r"^(?P<name>.+)\.(?P<digest>[0-9a-f]{32})(?P<suffix>\.br|\.gz)$")
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Object store `tools/deploy.py` keeps in the deploy target (served files are links into it)
+OBJECTS = ".objects"
+REVALIDATE = "no-cache"
+CHUNK_SIZE = 64 * 1024
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """`StaticFiles` that serves precompressed variants, strong ETags, cache headers and byte ranges
+
+    - `Accept-Encoding: br/gzip` is answered with `<file>.<sha>.br` / `<file>.<sha>.gz` when the variant for the
+      file's current content exists
+    - ETags are sha256 content hashes (computed once per file version, off the event loop)
+    - Content-hashed file names get `immutable` caching; everything else is revalidated with its ETag
+    - `Range: bytes=...` (single range) is served from the uncompressed file
+    """
+    def __init__(self, *args, etag_cache_size: int = 4096, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.etag_cache_size = etag_cache_size
+        self._etags: "OrderedDict[Tuple[str, int, int, int], str]" = OrderedDict()
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        return _AssetResponse(self, str(full_path), stat_result, status_code)
+
+    def content_hash(self, path: str, stat_result: os.stat_result) -> str:
+        key = (path, stat_result.st_ino, stat_result.st_mtime_ns, stat_result.st_size)
+        digest = self._etags.get(key)
+        if digest is None:
+            digest = self._etags[key] = file_digest(path)
+            while len(self._etags) > self.etag_cache_size:
+                self._etags.popitem(last=False)
+        self._etags.move_to_end(key)
+        return digest
+
+
+def file_digest(path: str) -> str:
+    """Content hash used for ETags and variant names"""
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(chunk)
+    return sha.hexdigest()[:32]
+
+
+def variant_path(path: str, digest: str, suffix: str) -> str:
+    return f"{path}.{digest}{suffix}"
+
+
+class _AssetResponse(Response):
+    """Decides encoding/range/304 per request (needs the request headers, so it runs at send time)"""
+    def __init__(self, files: PrecompressedStaticFiles, path: str, stat_result: os.stat_result, status_code: int):
+        self.files = files
+        self.path = path
+        self.stat_result = stat_result
+        self.status_code = status_code
+        self.background = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        request_headers = Headers(scope=scope)
+        digest = await anyio.to_thread.run_sync(self.files.content_hash, self.path, self.stat_result)
+        media_type = mimetypes.guess_type(self.path)[0] or "text/plain"
+        headers = {
+            "cache-control": IMMUTABLE if CONTENT_HASHED.search(os.path.basename(self.path)) else REVALIDATE,
+            "vary": "Accept-Encoding",
+            "accept-ranges": "bytes",
+        }
+
+        range_header = request_headers.get("range")
+        if_range = request_headers.get("if-range")
+        if range_header and self.status_code == 200 and (if_range is None or if_range == f'"{digest}"'):
+            headers["etag"] = f'"{digest}"'
+            response = await self._range_response(range_header, media_type, headers, scope["method"])
+            if response is not None:
+                return await response(scope, receive, send)
+
+        path, stat_result, etag = self.path, self.stat_result, f'"{digest}"'
+        encoding = await anyio.to_thread.run_sync(self._variant, request_headers.get("accept-encoding", ""), digest)
+        if encoding is not None:
+            name, suffix, stat_result = encoding
+            path = variant_path(self.path, digest, suffix)
+            etag = f'"{digest}-{suffix[1:]}"'
+            headers["content-encoding"] = name
+        headers["etag"] = etag
+
+        if self.status_code == 200 and etag in _etag_list(request_headers.get("if-none-match", "")):
+            return await Response(status_code=304, headers=headers)(scope, receive, send)
+        response = FileResponse(
+            path, status_code=self.status_code, headers=headers, media_type=media_type,
+            method=scope["method"], stat_result=stat_result
+        )
+        # `FileResponse` sets a weak mtime/size ETag; the content hash replaces it
+        response.headers["etag"] = etag
+        await response(scope, receive, send)
+
+    def _variant(self, accept_encoding: str, digest: str) -> Optional[Tuple[str, str, os.stat_result]]:
+        accepted = {part.split(";")[0].strip() for part in accept_encoding.lower().split(",")}
+        for name, suffix in ENCODINGS:
+            if name not in accepted:
+                continue
+            try:
+                return name, suffix, os.stat(variant_path(self.path, digest, suffix))
+            except OSError:
+                continue
+        return None
+
+    async def _range_response(self, range_header: str, media_type: str, headers: dict, method: str) -> Optional[Response]:
+        size = self.stat_result.st_size
+        match = re.fullmatch(r"bytes=(\d*)-(\d*)", range_header.strip())
+        if match is None or match.group(1) == match.group(2) == "":
+            return None  # multiple or malformed ranges: serve the whole file
+        start, end = match.groups()
+        if start == "":
+            start, end = max(0, size - int(end)), size - 1
+        else:
+            start, end = int(start), min(int(end), size - 1) if end else size - 1
+        if start >= size or start > end:
+            return Response(status_code=416, headers={**headers, "content-range": f"bytes */{size}"})
+        headers.update({"content-range": f"bytes {start}-{end}/{size}", "content-length": str(end - start + 1)})
+        if method == "HEAD":
+            return Response(status_code=206, headers=headers, media_type=media_type)
+        return _StreamRange(self.path, start, end - start + 1, headers, media_type)
+
+
+class _StreamRange(Response):
+    def __init__(self, path: str, start: int, length: int, headers: dict, media_type: str):
+        super().__init__(status_code=206, headers=headers, media_type=media_type)
+        self.path, self.start, self.length = path, start, length
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        remaining = self.length
+        async with await anyio.open_file(self.path, mode="rb") as f:
+            await f.seek(self.start)
+            while remaining > 0:
+                chunk = await f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        if remaining > 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def _etag_list(header: str) -> set:
+    return {re.sub(r"^W/", "", tag.strip()) for tag in header.split(",") if tag.strip()}
+
+
+def precompress(directory: str, min_size: int = 1024, min_saving: float = 0.1) -> int:
+    """Write `.gz` (and `.br`, if `brotli` is installed) variants of every compressible file under `directory`
+
+    - Skips files smaller than `min_size` bytes, already-compressed types, and variants that save less than
+      `min_saving` of the original size
+    - Variants already written for a file's current content are kept; variants of its older content are removed
+    - Skips the deploy object store (`OBJECTS`): its files are the served files under another name
+
+    Returns:
+        int: number of variants written
+    """
+    written = 0
+    root = Path(directory)
+    files = [path for path in root.rglob("*") if path.is_file() and OBJECTS not in path.relative_to(root).parts]
+    current = set()
+    for path in files:
+        if path.suffix.lower() in SKIP_SUFFIXES or path.stat().st_size < min_size:
+            continue
+        digest = file_digest(str(path))
+        data = None
+        for name, suffix in ENCODINGS:
+            if name == "br" and brotli is None:
+                continue
+            variant = Path(variant_path(str(path), digest, suffix))
+            current.add(variant)
+            if variant.exists():
+                continue
+            data = path.read_bytes() if data is None else data
+            compressed = brotli.compress(data) if name == "br" else gzip.compress(data, compresslevel=9, mtime=0)
+            if len(compressed) > len(data) * (1 - min_saving):
+                continue
+            tmp = variant.with_name(f".{variant.name}.tmp")
+            tmp.write_bytes(compressed)
+            os.replace(tmp, variant)
+            written += 1
+    for path in files:
+        match = VARIANT.match(path.name)
+        if match and path not in current and path.with_name(match["name"]).is_file():
+            path.unlink()
+    return written
+
+
+if __name__ == "__main__":
+    for directory in sys.argv[1:] or [str(Path(__file__).resolve().parent / "shinyapps")]:
+        print(f"{directory}: {precompress(directory)} precompressed files written")
@@ -1,11 +1,28 @@
+import os
+import sys
 from pathlib import Path
 
 import uvicorn
+from app_metrics import AuthMetricsMiddleware
+from app_metrics import router as metrics_router
 from app_routes import router as auth_router
+from app_static import PrecompressedStaticFiles
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
+from loguru import logger
 from starlette.middleware.cors import CORSMiddleware
 
+# JSON lines, written from a background thread so logging never blocks a request
+logger.remove()
+logger.add(sys.stderr, serialize=True, enqueue=True)
+
+# Serve Prometheus text metrics for the auth routes at `/metrics` (per worker process)
+EXPOSE_METRICS = True
+
+# Worker processes; with more than one, sessions are kept in a SQLite file (`AUTH_SESSION_DB`) all workers share
+# - i.e. `AUTH_WORKERS=4 python main.py`
+WORKERS = int(os.environ.get("AUTH_WORKERS", 1))
+PORT = int(os.environ.get("AUTH_PORT", 8000))
+
 app = FastAPI(
     title='Sample Webserver and Auth Endpoint',
     redoc_url=None,
@@ -17,7 +34,19 @@ app.include_router(
     tags=["admin"]
 )
 
-app.mount("/apps", StaticFiles(directory=Path(__file__).resolve().parent / "shinyapps", html=True), name="shinylive")
+if EXPOSE_METRICS:
+    app.add_middleware(AuthMetricsMiddleware)
+    app.include_router(metrics_router, tags=["admin"])
+
+# Serves `.br`/`.gz` variants written by `python app_static.py` after each export or deploy (see `app_static.py`)
+# - `follow_symlink`: files deployed by `tools/deploy.py` may be links into its shared object store
+app.mount(
+    "/apps",
+    PrecompressedStaticFiles(
+        directory=Path(__file__).resolve().parent / "shinyapps", html=True, check_dir=False, follow_symlink=True
+    ),
+    name="shinylive"
+)
 
 app.add_middleware(
         CORSMiddleware, 
@@ -27,4 +56,10 @@ app.add_middleware(
         allow_headers=["*"],
     )
 
-uvicorn.run(app=app, port=8000)
\ No newline at end of file
+if __name__ == "__main__":
+    if WORKERS > 1:
+        # Set before the workers start, so each one opens the same session database
+        os.environ.setdefault("AUTH_SESSION_DB", str(Path(__file__).resolve().parent / "sessions.db"))
+        uvicorn.run("main:app", port=PORT, workers=WORKERS, app_dir=str(Path(__file__).resolve().parent))
+    else:
+        uvicorn.run(app=app, port=PORT)
\ No newline at end of file
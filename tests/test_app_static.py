@@ -0,0 +1,120 @@
+import asyncio
+import gzip
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.routing import Mount
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT / "src_test_webserver"), str(ROOT / "tools")]
+
+import app_static  # noqa: E402
+import deploy  # noqa: E402
+
+BODY = b"0123456789" * 200
+
+
+@pytest.fixture
+def apps(tmp_path):
+    directory = tmp_path / "apps"
+    directory.mkdir()
+    (directory / "app.js").write_bytes(BODY)
+    return directory
+
+
+def get(directory: Path, path: str, **headers) -> httpx.Response:
+    app = Starlette(routes=[Mount("/apps", app_static.PrecompressedStaticFiles(directory=str(directory)))])
+
+    async def request():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.get(path, headers=headers)
+    return asyncio.run(request())
+
+
+def test_range_requests(apps):
+    response = get(apps, "/apps/app.js", range="bytes=10-19")
+    assert response.status_code == 206
+    assert response.content == BODY[10:20]
+    assert response.headers["content-range"] == f"bytes 10-19/{len(BODY)}"
+
+    response = get(apps, "/apps/app.js", range="bytes=-5")
+    assert (response.status_code, response.content) == (206, BODY[-5:])
+
+    response = get(apps, "/apps/app.js", range=f"bytes={len(BODY)}-")
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(BODY)}"
+
+
+def test_if_range(apps):
+    etag = get(apps, "/apps/app.js").headers["etag"]
+    response = get(apps, "/apps/app.js", range="bytes=0-9", **{"if-range": etag})
+    assert (response.status_code, response.content) == (206, BODY[:10])
+    # The file changed since the client's copy: send all of it
+    response = get(apps, "/apps/app.js", range="bytes=0-9", **{"if-range": '"stale"'})
+    assert (response.status_code, response.content) == (200, BODY)
+
+
+def test_not_modified(apps):
+    response = get(apps, "/apps/app.js")
+    assert response.headers["cache-control"] == app_static.REVALIDATE
+    assert get(apps, "/apps/app.js", **{"if-none-match": response.headers["etag"]}).status_code == 304
+    assert get(apps, "/apps/app.js", **{"if-none-match": '"other"'}).status_code == 200
+
+
+def test_variant_selection(apps):
+    assert app_static.precompress(str(apps)) == (2 if app_static.brotli else 1)
+    digest = app_static.file_digest(str(apps / "app.js"))
+    # Stand-in for a brotli variant, so the preference order is tested without `brotli` installed
+    Path(app_static.variant_path(str(apps / "app.js"), digest, ".br")).write_bytes(b"br-variant")
+
+    response = get(apps, "/apps/app.js", **{"accept-encoding": "gzip, br"})
+    assert response.headers["content-encoding"] == "br"
+    assert response.headers["etag"] == f'"{digest}-br"'
+    assert response.headers["vary"] == "Accept-Encoding"
+
+    response = get(apps, "/apps/app.js", **{"accept-encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.content == BODY  # decoded by httpx
+
+    response = get(apps, "/apps/app.js", **{"accept-encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"] == f'"{digest}"'
+
+
+def test_variants_follow_content_across_redeploys(tmp_path):
+    # Deployed files are hard links into the object store and keep the mtime of the object, so a file that goes
+    # back to earlier content can look older than the variants written for the content in between
+    source = tmp_path / "staging" / "app1"
+    source.mkdir(parents=True)
+    target = deploy.LocalTarget(tmp_path / "shinyapps")
+    versions = [b"version A " * 200, b"version B " * 200, b"version A " * 200]
+    for content in versions:
+        (source / "app.js").write_bytes(content)
+        deploy.deploy(source, "app1", target)
+        app_static.precompress(str(tmp_path / "shinyapps" / "app1"))
+
+    response = get(tmp_path / "shinyapps", "/apps/app1/app.js", **{"accept-encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.content == versions[-1]
+    # Only the variant for the current content is left
+    assert [path.name for path in (tmp_path / "shinyapps" / "app1").glob("app.js.*.gz")] == [
+        f"app.js.{app_static.file_digest(str(source / 'app.js'))}.gz"
+    ]
+    # The deploy target's object store isn't compressed a second time
+    app_static.precompress(str(tmp_path / "shinyapps"))
+    assert sorted(path.name for path in (tmp_path / "shinyapps").rglob("*.gz")) == [
+        f"app.js.{app_static.file_digest(str(source / 'app.js'))}.gz"
+    ]
+
+
+def test_precompress_keeps_current_variants(apps):
+    assert app_static.precompress(str(apps)) >= 1
+    assert app_static.precompress(str(apps)) == 0
+    (apps / "small.js").write_bytes(b"x")
+    (apps / "image.png").write_bytes(BODY)
+    app_static.precompress(str(apps))
+    assert not list(apps.glob("small.js.*")) and not list(apps.glob("image.png.*"))
+    assert gzip.decompress(next(apps.glob("app.js.*.gz")).read_bytes()) == BODY
@@ -0,0 +1,38 @@
+import io
+import json
+import logging
+
+import shinylive_auth as auth
+
+
+def test_events_written_as_json_lines():
+    stream = io.StringIO()
+    auth.configure_auth_logging(stream=stream)
+    auth.log_auth_event("login", username="username", status="SUCCESS")
+    auth.log_auth_event("login", logging.WARNING, username="username", status="FAILED")
+    auth.stop_auth_logging()
+    events = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [(e["event"], e["level"], e["status"]) for e in events] == [
+        ("login", "INFO", "SUCCESS"),
+        ("login", "WARNING", "FAILED"),
+    ]
+    assert events[0]["username"] == "username"
+
+
+def test_level_filters_events():
+    stream = io.StringIO()
+    auth.configure_auth_logging(stream=stream, level=logging.WARNING)
+    auth.log_auth_event("session_check", status="VALID")
+    auth.stop_auth_logging()
+    assert stream.getvalue() == ""
+
+
+def test_sampling_keeps_warnings():
+    stream = io.StringIO()
+    auth.configure_auth_logging(stream=stream, sample_rate=0.0)
+    for _ in range(10):
+        auth.log_auth_event("session_check", status="VALID")
+    auth.log_auth_event("permissions", logging.WARNING, status="INVALID")
+    auth.stop_auth_logging()
+    events = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [e["event"] for e in events] == ["permissions"]
@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+import shinylive_auth as auth
+from test_auth_wrappers import FakeAuth
+
+
+def test_timed_records_outcomes():
+    async def run():
+        metrics = auth.AuthMetrics()
+        backend = FakeAuth()
+        assert await metrics.timed("check_auth", backend, backend.check_auth("token1")) == "token1"
+        with pytest.raises(backend.ShinyLiveAuthExpired):
+            await metrics.timed("check_auth", backend, backend.check_auth("missing"))
+        with pytest.raises(ValueError):
+            await metrics.timed("get_auth", backend, _raise(ValueError()))
+        assert metrics.calls == {
+            ("check_auth", "success"): 1,
+            ("check_auth", "expired"): 1,
+            ("get_auth", "error"): 1,
+        }
+        assert metrics.latency["check_auth"].count == 2
+    asyncio.run(run())
+
+
+async def _raise(error: Exception):
+    raise error
+
+
+def test_histogram_buckets():
+    histogram = auth.Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 5.0):
+        histogram.observe(value)
+    assert histogram.counts == [2, 1, 1]
+    assert histogram.count == 4
+
+
+def test_prometheus_export():
+    metrics = auth.AuthMetrics(buckets=(0.1, 1.0))
+    metrics.observe("check_auth", "success", 0.05)
+    metrics.observe("check_auth", "expired", 0.5)
+    metrics.active_sessions = 3
+    text = auth.PrometheusExporter().export(metrics)
+    assert 'shinylive_auth_call_duration_seconds_bucket{call="check_auth",le="0.1"} 1' in text
+    assert 'shinylive_auth_call_duration_seconds_bucket{call="check_auth",le="+Inf"} 2' in text
+    assert 'shinylive_auth_calls_total{call="check_auth",outcome="expired"} 1' in text
+    assert "shinylive_auth_active_sessions 3" in text
+    assert text.endswith("\n")
@@ -0,0 +1,266 @@
+import asyncio
+import json
+import sys
+import threading
+from pathlib import Path
+
+import httpx
+import pytest
+import shinylive_auth as auth
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT / "src_dev"), str(ROOT / "src_test_webserver")]
+
+import app_metrics  # noqa: E402
+import app_routes  # noqa: E402
+import app_security  # noqa: E402
+from main import app  # noqa: E402
+from restapi_security.auth import RestAPIAuth  # noqa: E402
+from restapi_security.transport import HTTPXTransport  # noqa: E402
+from simple_security import storage as simple_storage  # noqa: E402
+from simple_security.auth import SimpleAuth  # noqa: E402
+from simple_security.models import Session as SimpleSession  # noqa: E402
+
+LOGIN = {"username": "username", "password": "password", "groups_needed": ["group1"]}
+
+
+@pytest.fixture(autouse=True)
+def fast_hashing(monkeypatch):
+    # Sample users are hashed with 600k iterations; rehash them cheaply for tests
+    hasher = auth.PasswordHasher(iterations=1_000)
+    monkeypatch.setattr(app_security, "passwords", hasher)
+    monkeypatch.setattr("app_routes.passwords", hasher)
+    for user in app_security.users.values():
+        monkeypatch.setattr(user, "password_hash", hasher.hash("password" if user.username == "username" else "password2"))
+    app_security.user_limiter.reset("username")
+
+
+def run(fn):
+    async def wrapped():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await fn(client)
+    return asyncio.run(wrapped())
+
+
+def test_blocked_address_does_not_use_up_user_attempts(monkeypatch):
+    monkeypatch.setattr("app_routes.address_limiter", auth.RateLimiter(limit=1, window=60))
+    wrong = {**LOGIN, "password": "wrong"}
+
+    async def calls(client):
+        statuses = [(await client.post("/auth/token", json=wrong)).status_code for _ in range(4)]
+        assert statuses == [401, 429, 429, 429]
+    run(calls)
+    # Only the attempt the address limit allowed was counted against the user
+    assert app_security.user_limiter.retry_after("username") == 0.0
+    assert app_security.user_limiter._windows["username"].current == 1
+
+
+def test_token_and_check():
+    async def calls(client):
+        response = await client.post("/auth/token", json=LOGIN)
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/json"
+        token = response.json()["token"]
+        response = await client.post("/auth/check", json={"token": token, "groups_needed": ["group1"]})
+        assert response.status_code == 200
+        body = response.json()
+        assert body["token"] == token
+        assert body["claims"]["sub"] == "username" and "group1" in body["claims"]["groups"]
+        response = await client.post("/auth/check", json={"token": token, "groups_needed": ["app2"]})
+        assert response.status_code == 403
+    run(calls)
+
+
+def test_invalid_credentials_and_sessions_are_401():
+    async def calls(client):
+        for body in ({**LOGIN, "password": "wrong"}, {**LOGIN, "username": "nobody"}):
+            response = await client.post("/auth/token", json=body)
+            assert response.status_code == 401
+            assert response.json() == {"detail": "Username or password is invalid"}
+        response = await client.post("/auth/check", json={"token": "missing"})
+        assert response.status_code == 401
+        assert response.headers["www-authenticate"] == 'Bearer error="invalid_token"'
+        response = await client.post("/auth/check", json={"token": "example_token"})  # expired sample session
+        assert response.status_code == 401
+    run(calls)
+
+
+@pytest.mark.parametrize("body", [b"not json", b"[]", b'{"token": 1}', b'{"token": "t", "groups_needed": "group1"}'])
+def test_malformed_body_is_422(body):
+    async def calls(client):
+        response = await client.post("/auth/check", content=body)
+        assert response.status_code == 422
+        assert "detail" in response.json()
+    run(calls)
+
+
+def test_batch_check():
+    async def calls(client):
+        token = (await client.post("/auth/token", json=LOGIN)).json()["token"]
+        response = await client.post("/auth/check/batch", json={"tokens": [token, "missing"], "groups_needed": ["group1"]})
+        assert response.json() == {"results": [{"status": 200, "token": token}, {"status": 401, "token": None}]}
+        response = await client.post("/auth/check/batch", json={"tokens": "missing"})
+        assert response.status_code == 422
+        response = await client.post("/auth/check/batch", json={"tokens": ["missing"] * (app_routes.MAX_BATCH + 1)})
+        assert response.status_code == 422
+    run(calls)
+
+
+def test_metrics_middleware_records_outcomes():
+    calls = app_metrics.route_metrics.calls
+    before = dict(calls)
+
+    async def requests(client):
+        await client.post("/auth/check", json={"token": "missing"})
+        await client.post("/auth/check", content=b"not json")
+    run(requests)
+    for outcome in ("expired", "error"):
+        assert calls[("check_auth", outcome)] == before.get(("check_auth", outcome), 0) + 1
+
+
+def test_restapi_auth_follows_status_contract():
+    async def calls(client):
+        app_auth = RestAPIAuth(groups_needed=["group1"], base_url="http://test", transport=HTTPXTransport(client=client))
+        token = await app_auth.get_auth("username", auth.SecretStr("password"))
+        assert await app_auth.check_auth(token) == token
+        assert (await auth.token_claims(app_auth, token))["sub"] == "username"
+        with pytest.raises(app_auth.ShinyLiveAuthFailed):
+            await app_auth.get_auth("username", auth.SecretStr("wrong"))
+        with pytest.raises(app_auth.ShinyLiveAuthExpired):
+            await app_auth.check_auth("missing")
+        with pytest.raises(app_auth.ShinyLivePermissions):
+            await RestAPIAuth(groups_needed=["app2"], base_url="http://test", transport=app_auth.transport).check_auth(token)
+    run(calls)
+
+
+def test_logout_ends_session_and_publishes_revocation():
+    received = []
+    unsubscribe = app_security.revocations.subscribe(received.append)
+
+    async def calls(client):
+        token = (await client.post("/auth/token", json=LOGIN)).json()["token"]
+        assert (await client.post("/auth/logout", json={"token": token})).status_code == 204
+        assert (await client.post("/auth/check", json={"token": token})).status_code == 401
+        return token
+    try:
+        token = run(calls)
+    finally:
+        unsubscribe()
+    assert received == [auth.Revocation.of(tokens=[token])]
+
+
+def test_revoke_requires_admin_key_and_ends_user_sessions(monkeypatch):
+    monkeypatch.setattr(app_security, "ADMIN_KEY", "admin-key")
+    monkeypatch.setattr(app_security, "revoked_users", app_security.RevokedUsers())
+
+    async def calls(client):
+        token = (await client.post("/auth/token", json=LOGIN)).json()["token"]
+        body = {"usernames": ["username"]}
+        assert (await client.post("/auth/revoke", json=body)).status_code == 403
+        assert (await client.post("/auth/revoke", json=body, headers={"X-Admin-Key": "wrong"})).status_code == 403
+        response = await client.post("/auth/revoke", json=body, headers={"X-Admin-Key": "admin-key"})
+        assert response.json() == {"tokens": 0, "usernames": 1, "notified": 0}
+        assert (await client.post("/auth/check", json={"token": token})).status_code == 401
+        # Logging in again works
+        token = (await client.post("/auth/token", json=LOGIN)).json()["token"]
+        assert (await client.post("/auth/check", json={"token": token})).status_code == 200
+    run(calls)
+
+
+def test_revoked_users_shared_between_workers(tmp_path, monkeypatch):
+    # Two workers opening the same session database
+    path = str(tmp_path / "sessions.db")
+    Session = app_security.Session
+    sessions = [auth.SQLiteSessionStore(path, serialize=Session.to_json, deserialize=Session.from_json) for _ in range(2)]
+    workers = [app_security.RevokedUsers(path) for _ in range(2)]
+    sessions[0].set("token1", Session("username", ["group1"], created=1_000.0), 4_000_000_000)
+    workers[0].revoke("username", 2_000.0)
+    # The session is still stored, but the other worker rejects it
+    monkeypatch.setattr(app_security, "revoked_users", workers[1])
+    assert sessions[1].get("token1").is_valid() is False
+    assert workers[1].revoked_at("username2") == 0.0
+    # An older revocation doesn't move the cutoff back
+    workers[1].revoke("username", 500.0)
+    assert workers[0].revoked_at("username") == 2_000.0
+
+
+def test_sqlite_storage_runs_off_the_event_loop(tmp_path, monkeypatch):
+    path = str(tmp_path / "sessions.db")
+    Session = app_security.Session
+    store = auth.SQLiteSessionStore(path, serialize=Session.to_json, deserialize=Session.from_json)
+    threads = []
+    for name in ("get", "set", "pop"):
+        def recording(*args, call=getattr(store, name)):
+            threads.append(threading.current_thread())
+            return call(*args)
+        monkeypatch.setattr(store, name, recording)
+    monkeypatch.setattr("app_routes.sessions", store)
+    monkeypatch.setattr("app_routes.STORE_OFF_LOOP", True)
+    monkeypatch.setattr(app_security, "revoked_users", app_security.RevokedUsers(path))
+
+    async def requests(client):
+        token = (await client.post("/auth/token", json=LOGIN)).json()["token"]
+        assert (await client.post("/auth/check", json={"token": token})).status_code == 200
+        batch = await client.post("/auth/check/batch", json={"tokens": [token, "missing"]})
+        assert [result["status"] for result in batch.json()["results"]] == [200, 401]
+        assert (await client.post("/auth/logout", json={"token": token})).status_code == 204
+        assert (await client.post("/auth/check", json={"token": token})).status_code == 401
+    run(requests)
+    assert len(threads) == 6 and threading.main_thread() not in threads
+
+
+def test_revocations_stream():
+    from app_routes import auth_revocations
+
+    async def stream():
+        response = await auth_revocations()
+        events = response.body_iterator
+        assert await events.__anext__() == ": connected\n\n"
+        app_security.revocations.revoke(tokens=["token1"])
+        event = await events.__anext__()
+        await events.aclose()
+        return response, event
+
+    response, event = asyncio.run(stream())
+    assert response.media_type == "text/event-stream"
+    assert event.startswith("event: revocation\ndata: ")
+    data = json.loads(event.split("data: ", 1)[1])
+    assert auth.Revocation.from_dict(data) == auth.Revocation.of(tokens=["token1"])
+    assert app_security.revocations._subscribers == {}
+
+
+def test_revocations_filter_syncs_logged_out_tokens():
+    replica = auth.RevocationFilter(span=app_security.revoked_tokens.span)
+
+    async def calls(client):
+        async def fetch(since):
+            response = await client.get("/auth/revocations/filter", params={} if since is None else {"since": since})
+            return response.json()
+
+        await replica.sync(fetch)
+        token = (await client.post("/auth/token", json=LOGIN)).json()["token"]
+        expires = app_security.sessions.get(token).expires.timestamp()
+        await client.post("/auth/logout", json={"token": token})
+        assert await replica.sync(fetch) is True
+        return token, expires
+    token, expires = run(calls)
+    assert replica.is_revoked(auth._token_key(token), expires)
+    assert not replica.is_revoked(token, expires)  # only digests are published
+    assert replica.version == app_security.revoked_tokens.version
+
+
+def test_simple_auth_answers_for_rotated_token_within_grace():
+    async def run():
+        app_auth = SimpleAuth(groups_needed=["group1"])
+        simple_storage.sessions.set("grace_token", SimpleSession("username", ["group1"]), 4_000_000_000)
+        # Two tabs check the same token at once: both end up with the same replacement
+        first = await app_auth.check_auth("grace_token")
+        assert first != "grace_token"
+        assert await app_auth.check_auth("grace_token") == first
+        with pytest.raises(app_auth.ShinyLivePermissions):
+            await SimpleAuth(groups_needed=["app2"]).check_auth("grace_token")
+        # Logging out with the old token ends the replacement too
+        app_auth.end_auth("grace_token")
+        with pytest.raises(app_auth.ShinyLiveAuthExpired):
+            await app_auth.check_auth(first)
+    asyncio.run(run())
@@ -0,0 +1,293 @@
+import asyncio
+from dataclasses import dataclass, field
+
+import pytest
+import shinylive_auth as auth
+
+
+@dataclass
+class FakeClock:
+    now: float = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@dataclass
+class FakeAuth:
+    valid_tokens: set = field(default_factory=lambda: {"token1"})
+    rotate: bool = False
+    check_calls: int = 0
+
+    async def get_auth(self, username, password) -> str:
+        self.valid_tokens.add(f"{username}-token")
+        return f"{username}-token"
+
+    async def check_auth(self, token: str) -> str:
+        self.check_calls += 1
+        await asyncio.sleep(0)
+        if token not in self.valid_tokens:
+            raise self.ShinyLiveAuthExpired
+        if self.rotate:
+            self.valid_tokens.remove(token)
+            token = f"{token}+"
+            self.valid_tokens.add(token)
+        return token
+
+    class ShinyLiveAuthFailed(Exception):
+        ...
+
+    class ShinyLiveAuthExpired(Exception):
+        ...
+
+    class ShinyLivePermissions(Exception):
+        ...
+
+
+def test_cached_auth_exceptions_resolve_to_wrapped():
+    backend = FakeAuth()
+    cached = auth.CachedAuth(backend)
+    assert cached.ShinyLiveAuthExpired is backend.ShinyLiveAuthExpired
+    assert cached.ShinyLivePermissions is backend.ShinyLivePermissions
+
+
+def test_cached_auth_hit_skips_backend():
+    async def run():
+        backend = FakeAuth()
+        cached = auth.CachedAuth(backend, clock=FakeClock())
+        assert await cached.check_auth("token1") == "token1"
+        assert await cached.check_auth("token1") == "token1"
+        assert backend.check_calls == 1
+    asyncio.run(run())
+
+
+def test_cached_auth_ttl_expires():
+    async def run():
+        clock = FakeClock()
+        backend = FakeAuth()
+        cached = auth.CachedAuth(backend, ttl=10, clock=clock)
+        await cached.check_auth("token1")
+        clock.now = 10
+        await cached.check_auth("token1")
+        assert backend.check_calls == 2
+    asyncio.run(run())
+
+
+def test_cached_auth_negative_cache():
+    async def run():
+        clock = FakeClock()
+        backend = FakeAuth()
+        cached = auth.CachedAuth(backend, negative_ttl=5, clock=clock)
+        for _ in range(3):
+            with pytest.raises(cached.ShinyLiveAuthExpired):
+                await cached.check_auth("missing")
+        assert backend.check_calls == 1
+        clock.now = 5
+        with pytest.raises(cached.ShinyLiveAuthExpired):
+            await cached.check_auth("missing")
+        assert backend.check_calls == 2
+    asyncio.run(run())
+
+
+def test_cached_auth_rotated_token_is_cached():
+    async def run():
+        backend = FakeAuth(rotate=True)
+        cached = auth.CachedAuth(backend, clock=FakeClock())
+        new_token = await cached.check_auth("token1")
+        assert new_token == "token1+"
+        assert await cached.check_auth(new_token) == new_token
+        assert await cached.check_auth("token1") == new_token
+        assert backend.check_calls == 1
+    asyncio.run(run())
+
+
+def test_cached_auth_ending_rotated_token_expires_earlier_tokens():
+    async def run():
+        backend = FakeAuth(rotate=True)
+        cached = auth.CachedAuth(backend, clock=FakeClock())
+        assert await cached.check_auth("token1") == "token1+"
+        assert await cached.check_auth("token1+") == "token1+"
+        await cached.end_auth("token1+")
+        for token in ("token1", "token1+"):
+            with pytest.raises(cached.ShinyLiveAuthExpired):
+                await cached.check_auth(token)
+
+        # Through a chain of refreshes, and by revocation
+        cached = auth.CachedAuth(FakeAuth(valid_tokens={"a"}, rotate=True), clock=FakeClock())
+        assert await cached.check_auth("a") == "a+"
+        cached._entries.pop(auth._token_key("a+"))  # i.e. evicted, so the next check refreshes again
+        assert await cached.check_auth("a+") == "a++"
+        cached.revoke(auth.Revocation.of(tokens=["a++"]))
+        for token in ("a", "a+", "a++"):
+            with pytest.raises(cached.ShinyLiveAuthExpired):
+                await cached.check_auth(token)
+        assert cached._aliases == {}
+    asyncio.run(run())
+
+
+def test_cached_auth_login_token_is_cached():
+    async def run():
+        backend = FakeAuth()
+        cached = auth.CachedAuth(backend, clock=FakeClock())
+        token = await cached.get_auth("username", "password")
+        assert await cached.check_auth(token) == token
+        assert backend.check_calls == 0
+    asyncio.run(run())
+
+
+def test_cached_auth_revalidates_in_background():
+    async def run():
+        clock = FakeClock()
+        backend = FakeAuth()
+        cached = auth.CachedAuth(backend, ttl=60, revalidate_after=10, clock=clock)
+        await cached.check_auth("token1")
+        clock.now = 15
+        backend.valid_tokens.clear()
+        # Stale hit is still served while the re-check runs
+        assert await cached.check_auth("token1") == "token1"
+        await asyncio.sleep(0.01)
+        assert backend.check_calls == 2
+        with pytest.raises(cached.ShinyLiveAuthExpired):
+            await cached.check_auth("token1")
+    asyncio.run(run())
+
+
+def test_cached_auth_maxsize():
+    async def run():
+        backend = FakeAuth(valid_tokens={"a", "b", "c"})
+        cached = auth.CachedAuth(backend, maxsize=2, clock=FakeClock())
+        for token in ("a", "b", "c"):
+            await cached.check_auth(token)
+        await cached.check_auth("a")
+        assert backend.check_calls == 4
+    asyncio.run(run())
+
+
+def test_cached_auth_invalidate():
+    async def run():
+        backend = FakeAuth()
+        cached = auth.CachedAuth(backend, clock=FakeClock())
+        await cached.check_auth("token1")
+        cached.invalidate("token1")
+        await cached.check_auth("token1")
+        assert backend.check_calls == 2
+    asyncio.run(run())
+
+
+def test_single_flight_merges_concurrent_calls():
+    async def run():
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "result"
+
+        flight = auth.SingleFlight()
+        results = await asyncio.gather(*[flight.do("key", work) for _ in range(5)])
+        assert results == ["result"] * 5
+        assert len(calls) == 1
+        assert flight.in_flight("key") is False
+        await flight.do("key", work)
+        assert len(calls) == 2
+    asyncio.run(run())
+
+
+def test_single_flight_shares_exceptions():
+    async def run():
+        async def work():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        flight = auth.SingleFlight()
+        results = await asyncio.gather(*[flight.do("key", work) for _ in range(3)], return_exceptions=True)
+        assert all(isinstance(r, ValueError) for r in results)
+    asyncio.run(run())
+
+
+def test_coalesced_auth_fixes_rotation_race():
+    async def run():
+        backend = FakeAuth(rotate=True)
+        coalesced = auth.CoalescedAuth(backend)
+        results = await asyncio.gather(*[coalesced.check_auth("token1") for _ in range(5)])
+        assert results == ["token1+"] * 5
+        assert backend.check_calls == 1
+    asyncio.run(run())
+
+
+def test_cached_auth_coalesces_misses():
+    async def run():
+        backend = FakeAuth(rotate=True)
+        cached = auth.CachedAuth(backend, clock=FakeClock())
+        results = await asyncio.gather(*[cached.check_auth("token1") for _ in range(5)])
+        assert results == ["token1+"] * 5
+        assert backend.check_calls == 1
+    asyncio.run(run())
+
+
+def test_check_auth_many_falls_back_to_check_auth():
+    async def run():
+        backend = FakeAuth()
+        results = await auth.check_auth_many(backend, ["token1", "missing"])
+        assert results[0] == "token1"
+        assert isinstance(results[1], backend.ShinyLiveAuthExpired)
+        results = await auth.check_auth_many(auth.CachedAuth(backend), ["token1", "token1"])
+        assert results == ["token1", "token1"]
+    asyncio.run(run())
+
+
+def test_micro_batcher_merges_calls():
+    async def run():
+        batches = []
+
+        async def batch_fn(items):
+            batches.append(items)
+            return [ValueError(item) if item == "bad" else item.upper() for item in items]
+
+        batcher = auth.MicroBatcher(batch_fn, window=0.01)
+        results = await asyncio.gather(
+            batcher.submit("a"), batcher.submit("bad"), batcher.submit("b"), return_exceptions=True
+        )
+        assert results[0] == "A" and results[2] == "B"
+        assert isinstance(results[1], ValueError)
+        assert batches == [["a", "bad", "b"]]
+    asyncio.run(run())
+
+
+def test_micro_batcher_max_batch_and_errors():
+    async def run():
+        batches = []
+
+        async def batch_fn(items):
+            batches.append(items)
+            if "boom" in items:
+                raise RuntimeError("auth server down")
+            return items
+
+        batcher = auth.MicroBatcher(batch_fn, window=10, max_batch=2)
+        assert await asyncio.gather(batcher.submit(1), batcher.submit(2)) == [1, 2]
+        batcher.max_batch = 1
+        with pytest.raises(RuntimeError):
+            await batcher.submit("boom")
+        assert batches == [[1, 2], ["boom"]]
+    asyncio.run(run())
+
+
+def test_micro_batcher_keeps_batches_in_flight():
+    async def run():
+        release = asyncio.Event()
+
+        async def batch_fn(items):
+            await release.wait()
+            return items
+
+        batcher = auth.MicroBatcher(batch_fn, window=10, max_batch=1)
+        submitted = asyncio.ensure_future(batcher.submit("a"))
+        await asyncio.sleep(0)
+        # Referenced until sent, so the loop can't garbage-collect a batch its callers are waiting on
+        assert len(batcher._tasks) == 1
+        release.set()
+        assert await submitted == "a"
+        await asyncio.sleep(0)
+        assert batcher._tasks == set()
+    asyncio.run(run())
@@ -0,0 +1,68 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "tools"))
+import deploy  # noqa: E402
+
+
+@pytest.fixture
+def bundle(tmp_path):
+    source = tmp_path / "staging" / "app1"
+    (source / "shinylive").mkdir(parents=True)
+    (source / "index.html").write_text("<html>app1</html>")
+    (source / "app.json").write_text('{"name": "app1"}')
+    (source / "shinylive" / "shinylive_auth.whl").write_bytes(b"wheel" * 1000)
+    return source
+
+
+def copy_bundle(source: Path, destination: Path) -> Path:
+    for path in source.rglob("*"):
+        if path.is_file() and path.name != deploy.HASH_CACHE:
+            target = destination / path.relative_to(source)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_bytes(path.read_bytes())
+    return destination
+
+
+def test_first_deploy_uploads_everything(bundle, tmp_path):
+    target = deploy.LocalTarget(tmp_path / "shinyapps")
+    result = deploy.deploy(bundle, "app1", target)
+    assert (result.uploaded, result.linked, result.unchanged) == (3, 3, 0)
+    assert (tmp_path / "shinyapps" / "app1" / "index.html").read_text() == "<html>app1</html>"
+    assert target.read_manifest("app1") == deploy.scan(bundle)
+
+
+def test_redeploy_only_sends_changes(bundle, tmp_path):
+    target = deploy.LocalTarget(tmp_path / "shinyapps")
+    deploy.deploy(bundle, "app1", target)
+    assert deploy.deploy(bundle, "app1", target).linked == 0
+
+    (bundle / "app.json").write_text('{"name": "app1", "version": 2}')
+    (bundle / "index.html").unlink()
+    result = deploy.deploy(bundle, "app1", target)
+    assert (result.uploaded, result.linked, result.removed, result.unchanged) == (1, 1, 1, 1)
+    assert not (tmp_path / "shinyapps" / "app1" / "index.html").exists()
+    assert "version" in (tmp_path / "shinyapps" / "app1" / "app.json").read_text()
+
+
+def test_apps_share_objects(bundle, tmp_path):
+    target = deploy.LocalTarget(tmp_path / "shinyapps")
+    deploy.deploy(bundle, "app1", target)
+    app2 = copy_bundle(bundle, tmp_path / "staging" / "app2")
+    (app2 / "index.html").write_text("<html>app2</html>")
+    result = deploy.deploy(app2, "app2", target)
+    # Only the file that differs is uploaded; the wheel is stored once for both apps
+    assert (result.uploaded, result.linked) == (1, 3)
+    wheels = [tmp_path / "shinyapps" / app / "shinylive" / "shinylive_auth.whl" for app in ("app1", "app2")]
+    assert wheels[0].stat().st_ino == wheels[1].stat().st_ino
+
+
+def test_dry_run_changes_nothing(bundle, tmp_path):
+    target = deploy.LocalTarget(tmp_path / "shinyapps")
+    result = deploy.deploy(bundle, "app1", target, dry_run=True)
+    assert result.uploaded == 3
+    assert target.read_manifest("app1") == {}
+    assert target.objects() == set()
+    assert not (bundle / deploy.HASH_CACHE).exists()
@@ -0,0 +1,29 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def run(code: str) -> str:
+    return subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True,
+        env={**os.environ, "PYTHONPATH": os.pathsep.join([str(ROOT / "src"), str(ROOT / "src_dev")])},
+    ).stdout.strip()
+
+
+def test_backend_is_imported_on_first_use():
+    out = run(
+        "import sys, shinylive_auth as auth, restapi_security.auth\n"
+        "print('shinylive_auth.backend' in sys.modules)\n"
+        "print(auth.PasswordHasher.__module__, 'shinylive_auth.backend' in sys.modules)\n"
+        "from shinylive_auth import SQLiteSessionStore\n"
+        "print(SQLiteSessionStore is auth.backend.SQLiteSessionStore, 'RevocationFilter' in dir(auth))\n"
+    )
+    assert out.splitlines() == ["False", "shinylive_auth.backend True", "True True"]
+
+
+def test_unknown_attribute():
+    out = run("import shinylive_auth as auth\nprint(hasattr(auth, 'NotAName'))")
+    assert out == "False"
@@ -0,0 +1,78 @@
+import asyncio
+import threading
+
+import shinylive_auth as auth
+from pydantic import SecretStr
+
+
+def test_hash_and_verify():
+    async def run():
+        hasher = auth.PasswordHasher(iterations=1_000)
+        encoded = hasher.hash(SecretStr("password"))
+        assert encoded.startswith("pbkdf2_sha256$1000$")
+        assert await hasher.verify(SecretStr("password"), encoded) is True
+        assert await hasher.verify("password", encoded) is True
+        assert await hasher.verify(SecretStr("wrong"), encoded) is False
+    asyncio.run(run())
+
+
+def test_secret_str_hides_value():
+    secret = auth.SecretStr("password")
+    assert secret.get_secret_value() == "password"
+    assert "password" not in repr(secret) and "password" not in str(secret)
+    assert secret == auth.SecretStr("password") and secret != auth.SecretStr("wrong")
+    assert len(secret) == 8
+    assert not auth.SecretStr("")
+
+
+def test_hash_and_verify_accept_library_secret_str():
+    async def run():
+        hasher = auth.PasswordHasher(iterations=1_000)
+        encoded = hasher.hash(auth.SecretStr("password"))
+        assert await hasher.verify(auth.SecretStr("password"), encoded) is True
+        assert await hasher.verify(SecretStr("password"), encoded) is True
+    asyncio.run(run())
+
+
+def test_hash_keeps_own_iterations():
+    async def run():
+        encoded = auth.PasswordHasher(iterations=1_000).hash("password")
+        assert await auth.PasswordHasher(iterations=2_000).verify("password", encoded) is True
+    asyncio.run(run())
+
+
+def test_verify_unknown_user_and_malformed_hash():
+    async def run():
+        hasher = auth.PasswordHasher(iterations=1_000)
+        assert await hasher.verify("password", None) is False
+        assert await hasher.verify("password", "not-a-hash") is False
+        assert await hasher.verify("password", "md5$1$abc$def") is False
+    asyncio.run(run())
+
+
+def test_verify_concurrency_is_bounded():
+    async def run():
+        hasher = auth.PasswordHasher(iterations=1_000, max_concurrent=2)
+        encoded = hasher.hash("password")
+        results = await asyncio.gather(*[hasher.verify("password", encoded) for _ in range(10)])
+        assert all(results)
+        assert hasher._semaphore._value == 2
+    asyncio.run(run())
+
+
+def test_unknown_user_hashing_stays_off_the_event_loop(monkeypatch):
+    threads = []
+    hash_password = auth.PasswordHasher.hash
+
+    def recording_hash(self, password):
+        threads.append(threading.current_thread())
+        return hash_password(self, password)
+    monkeypatch.setattr(auth.PasswordHasher, "hash", recording_hash)
+
+    async def run():
+        hasher = auth.PasswordHasher(iterations=1_000)
+        assert await hasher.verify("password", None) is False
+        assert await hasher.verify("password", None) is False
+    asyncio.run(run())
+    # The dummy hash is made once, on the hashing pool
+    assert len(threads) == 1 and threads[0] is not threading.main_thread()
@@ -0,0 +1,87 @@
+import shinylive_auth as auth
+
+
+def test_all_of():
+    index = auth.PermissionIndex()
+    required = index.require(all_of=["group1", "app1"])
+    assert required.satisfied_by(index.encode(["app1", "group1", "app2"])) is True
+    assert required.satisfied_by(index.encode(["group1"])) is False
+
+
+def test_any_of():
+    index = auth.PermissionIndex()
+    required = index.require(any_of=["app1", "app2"])
+    assert required.satisfied_by(index.encode(["app2"])) is True
+    assert required.satisfied_by(index.encode(["group1"])) is False
+
+
+def test_all_of_and_any_of():
+    index = auth.PermissionIndex()
+    required = index.require(all_of=["group1"], any_of=["app1", "app2"])
+    assert required.satisfied_by(index.encode(["group1", "app2"])) is True
+    assert required.satisfied_by(index.encode(["group1"])) is False
+    assert required.satisfied_by(index.encode(["app2"])) is False
+
+
+def test_no_requirement():
+    index = auth.PermissionIndex()
+    assert index.compile(None).satisfied_by(index.encode(None)) is True
+    assert index.compile([]).satisfied_by(0) is True
+
+
+def test_compile_accepts_requirement():
+    index = auth.PermissionIndex()
+    required = index.require(any_of=["app1"])
+    assert index.compile(required) is required
+    assert index.compile(["app1"]) == index.require(all_of=["app1"])
+
+
+def test_hierarchy_is_transitive():
+    index = auth.PermissionIndex(hierarchy={"admin": ["manager"], "manager": ["group1", "app1"]})
+    admin = index.encode(["admin"])
+    assert index.require(all_of=["group1", "app1"]).satisfied_by(admin) is True
+    assert index.require(all_of=["admin"]).satisfied_by(index.encode(["manager"])) is False
+
+
+def test_hierarchy_cycle():
+    index = auth.PermissionIndex(hierarchy={"a": ["b"], "b": ["a"]})
+    assert index.require(all_of=["a", "b"]).satisfied_by(index.encode(["a"])) is True
+
+
+def test_hierarchy_diamond():
+    index = auth.PermissionIndex(
+        hierarchy={"admin": ["editor", "auditor"], "editor": ["viewer"], "auditor": ["viewer"]}
+    )
+    index.encode(["admin"])
+    viewer = index.require(all_of=["viewer"])
+    assert viewer.satisfied_by(index.encode(["auditor"])) is True
+    assert viewer.satisfied_by(index.encode(["editor"])) is True
+
+
+def test_hierarchy_cycle_reached_from_outside():
+    index = auth.PermissionIndex(hierarchy={"a": ["b"], "b": ["c", "a"], "c": []})
+    index.encode(["a"])
+    # `b` was expanded while the cycle through `a` was cut; its own mask must still include `a`
+    assert index.require(all_of=["a", "c"]).satisfied_by(index.encode(["b"])) is True
+
+
+def test_unknown_groups_are_never_met():
+    index = auth.PermissionIndex()
+    admin = index.encode(["admin", "group1"])
+    assert index.require(all_of=["group1", "nobody-has-this"], known_only=True).satisfied_by(admin) is False
+    assert index.require(any_of=["nobody-has-this"], known_only=True).satisfied_by(admin) is False
+    assert index.require(any_of=["nobody-has-this", "admin"], known_only=True).satisfied_by(admin) is True
+    for n in range(5000):
+        index.require(all_of=[f"group{n}"], known_only=True)
+    assert len(index._bits) == 2 and len(index._required) <= index._CACHE_SIZE
+    # A group seen later gets a bit; requirements on it are compiled again
+    app1 = index.encode(["app1"])
+    assert index.require(all_of=["app1"], known_only=True).satisfied_by(app1) is True
+
+
+def test_encode_known_only_ignores_unknown_groups():
+    index = auth.PermissionIndex(hierarchy={"admin": ["group1"]})
+    group1 = index.encode(["group1"])
+    assert index.encode(["group1", "made-up"], known_only=True) == group1
+    assert index.encode(["admin"], known_only=True) & group1
+    assert "made-up" not in index._bits
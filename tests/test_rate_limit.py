@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+import shinylive_auth as auth
+
+from test_auth_wrappers import FakeAuth, FakeClock
+
+
+def test_limiter_allows_up_to_limit():
+    clock = FakeClock()
+    limiter = auth.RateLimiter(limit=3, window=60, clock=clock)
+    assert [limiter.acquire("username") for _ in range(3)] == [0.0, 0.0, 0.0]
+    retry_after = limiter.acquire("username")
+    assert 0 < retry_after <= 120
+    # Other keys are counted separately
+    assert limiter.acquire("username2") == 0.0
+
+
+def test_limiter_window_slides():
+    clock = FakeClock()
+    limiter = auth.RateLimiter(limit=4, window=60, clock=clock)
+    for _ in range(4):
+        limiter.acquire("username")
+    clock.now = 60
+    # Just after the window rolls over, the previous window still counts almost fully
+    assert limiter.acquire("username") > 0
+    clock.now = 90
+    # Half of the previous window has slid out: 4 * 0.5 = 2 attempts left
+    assert limiter.acquire("username") == 0.0
+    assert limiter.acquire("username") == 0.0
+    assert limiter.acquire("username") > 0
+    clock.now = 180
+    assert limiter.acquire("username") == 0.0
+
+
+def test_limiter_retry_after_is_accurate():
+    clock = FakeClock()
+    limiter = auth.RateLimiter(limit=2, window=60, clock=clock)
+    limiter.acquire("username")
+    limiter.acquire("username")
+    retry_after = limiter.acquire("username")
+    clock.now += retry_after - 0.5
+    assert limiter.acquire("username") > 0
+    clock.now += 0.5
+    assert limiter.acquire("username") == 0.0
+
+
+def test_limiter_rejection_does_not_count():
+    clock = FakeClock()
+    limiter = auth.RateLimiter(limit=1, window=60, clock=clock)
+    limiter.acquire("username")
+    assert limiter.acquire("username", "127.0.0.1") > 0
+    assert limiter.acquire("127.0.0.1") == 0.0
+
+
+def test_limiter_retry_after_does_not_count():
+    limiter = auth.RateLimiter(limit=1, window=60, clock=FakeClock())
+    assert [limiter.retry_after("username") for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.acquire("username") == 0.0
+    assert limiter.retry_after("username") > 0 and limiter.retry_after("username2") == 0.0
+
+
+def test_limiter_bounded_keys_and_reset():
+    limiter = auth.RateLimiter(limit=1, maxsize=3, clock=FakeClock())
+    for i in range(10):
+        limiter.acquire(f"user{i}")
+    assert len(limiter) == 3
+    assert limiter.acquire("user9") > 0
+    limiter.reset("user9")
+    assert limiter.acquire("user9") == 0.0
+
+
+def test_rate_limited_auth_rejects_before_credential_work():
+    async def run():
+        backend = FakeAuth()
+        calls = []
+        original = backend.get_auth
+
+        async def get_auth(username, password):
+            calls.append(username)
+            return await original(username, password)
+
+        backend.get_auth = get_auth
+        limited = auth.RateLimitedAuth(backend, limiter=auth.RateLimiter(limit=2, clock=FakeClock()))
+        await limited.get_auth("username", auth.SecretStr("password"))
+        # A successful login resets the count
+        await limited.get_auth("username", auth.SecretStr("password"))
+        await limited.get_auth("username", auth.SecretStr("password"))
+        limited.limiter.acquire("username")
+        limited.limiter.acquire("username")
+        with pytest.raises(auth.ShinyLiveRateLimited) as e:
+            await limited.get_auth("username", auth.SecretStr("password"))
+        assert e.value.retry_after > 0
+        assert len(calls) == 3
+        assert limited.ShinyLiveAuthExpired is backend.ShinyLiveAuthExpired
+    asyncio.run(run())
@@ -0,0 +1,51 @@
+import shinylive_auth as auth
+from shiny import reactive
+
+
+def test_reactive_values_not_shared_between_sessions():
+    first, second = auth.AuthReactiveValues(), auth.AuthReactiveValues()
+    assert first.token is not second.token
+    first.set_token("token1")
+    with reactive.isolate():
+        assert second.token.is_set() is False
+        assert second.hide_app.get() is True
+
+
+def test_set_token_only_changes_on_new_value():
+    values = auth.AuthReactiveValues()
+    assert values.set_token("token1") is True
+    # An equal (but not identical) string is not a change
+    assert values.set_token("".join(["token", "1"])) is False
+    assert values.set_token("token2") is True
+    with reactive.isolate():
+        assert values.token.get() == "token2"
+
+
+def test_set_state_keeps_hide_app_in_sync():
+    values = auth.AuthReactiveValues()
+    with reactive.isolate():
+        assert values.auth_state.get() == auth.AUTH_PENDING
+        values.set_state(auth.AUTH_AUTHENTICATED)
+        assert values.hide_app.get() is False
+        values.set_state(auth.AUTH_LOGGED_OUT)
+        assert values.auth_state.get() == auth.AUTH_LOGGED_OUT
+        assert values.hide_app.get() is True
+
+
+def test_view_reads_token_through_input_binding():
+    html = str(auth.view(auth.DEFAULT_AUTH_MODULE_ID))
+    assert f'id="{auth.DEFAULT_AUTH_MODULE_ID}-token" class="shinylive-auth-token"' in html
+    assert 'data-storage-key="x-auth-token"' in html
+    assert f"Shiny.addCustomMessageHandler('{auth.DEFAULT_AUTH_MODULE_ID}-token'" in html
+    assert "token_hidden" not in html
+
+
+def test_optimistic_state_shows_app():
+    values = auth.AuthReactiveValues()
+    with reactive.isolate():
+        values.set_state(auth.AUTH_OPTIMISTIC)
+        assert values.hide_app.get() is False
+        # Confirming the session leaves hide_app unchanged, so views built from it are not rebuilt
+        assert values.hide_app.set(False) is False
+        values.set_state(auth.AUTH_PENDING)
+        assert values.hide_app.get() is True
@@ -0,0 +1,41 @@
+import asyncio
+
+import shinylive_auth as auth
+from test_auth_wrappers import FakeAuth
+from test_signed_token import FakeClock, make_auth
+
+
+def test_next_delay_before_expiry():
+    schedule = auth.RefreshSchedule(lead=30, jitter=0)
+    assert schedule.next_delay(1_000 + 120, now=1_000) == 90
+
+
+def test_next_delay_jitter_only_shortens():
+    schedule = auth.RefreshSchedule(lead=30, jitter=0.5)
+    delays = [schedule.next_delay(1_000 + 130, now=1_000) for _ in range(200)]
+    assert all(50 <= delay <= 100 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_next_delay_interval_and_min_delay():
+    schedule = auth.RefreshSchedule(interval=60, jitter=0, min_delay=5)
+    assert schedule.next_delay(None) == 60
+    # Already inside the lead window (or expired): refresh soon, but not in a tight loop
+    assert schedule.next_delay(1_000 + 10, now=1_000) == 5
+
+
+def test_token_expires_hook():
+    async def run():
+        clock = FakeClock()
+        app_auth = make_auth(clock=clock, expires_in=60)
+        token = app_auth.issue("username", ["group1"])
+        assert await auth.token_expires(app_auth, token) == int(clock.now + 60)
+        assert await auth.token_expires(app_auth, "garbage") is None
+        # Wrappers pass the hook through; implementations without it return None
+        assert await auth.token_expires(auth.CachedAuth(app_auth), token) == int(clock.now + 60)
+        assert await auth.token_expires(FakeAuth(), "token1") is None
+    asyncio.run(run())
+
+
+def test_coordination_is_opt_in():
+    assert auth.RefreshSchedule().coordinate is False
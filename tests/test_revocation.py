@@ -0,0 +1,179 @@
+import asyncio
+import json
+
+import pytest
+import shinylive_auth as auth
+
+from test_auth_wrappers import FakeAuth, FakeClock
+
+
+def test_revocation_holds_digests_only():
+    revocation = auth.Revocation.of(tokens=["token1"], subjects=["username"])
+    data = revocation.to_dict()
+    assert "token1" not in str(data) and "username" not in str(data)
+    assert auth.Revocation.from_dict(data) == revocation
+    assert revocation.matches("token1")
+    assert revocation.matches("token2", subject="username")
+    assert not revocation.matches("token2", subject="username2")
+    assert not revocation.matches("token2")
+
+
+def test_feed_notifies_watches_by_token_and_subject():
+    feed = auth.RevocationFeed()
+    calls = []
+    feed.watch("session1", "token1", "username", lambda r: calls.append("session1"))
+    feed.watch("session2", "token2", "username", lambda r: calls.append("session2"))
+    feed.watch("session3", "token3", "username2", lambda r: calls.append("session3"))
+    assert feed.revoke(tokens=["token1"]) == 1
+    assert calls == ["session1"]
+    # Each watch fires once
+    assert feed.revoke(tokens=["token1"]) == 0
+    assert feed.revoke(subjects=["username"]) == 1
+    assert calls == ["session1", "session2"]
+    assert len(feed) == 1
+
+
+def test_feed_watch_replaces_and_unwatch():
+    feed = auth.RevocationFeed()
+    calls = []
+    feed.watch("session1", "token1", None, lambda r: calls.append("old"))
+    feed.watch("session1", "token2", None, lambda r: calls.append("new"))
+    assert feed.revoke(tokens=["token1"]) == 0
+    feed.unwatch("session1")
+    assert feed.revoke(tokens=["token2"]) == 0
+    assert calls == []
+    assert feed._by_token == {} and feed._by_subject == {}
+
+
+def test_feed_subscribers_get_every_revocation():
+    feed = auth.RevocationFeed()
+    received = []
+    unsubscribe = feed.subscribe(received.append)
+    feed.subscribe(lambda r: 1 / 0)  # a failing subscriber doesn't stop the others
+    feed.revoke(tokens=["token1", "token2"])
+    unsubscribe()
+    feed.revoke(tokens=["token3"])
+    assert received == [auth.Revocation.of(tokens=["token1", "token2"])]
+
+
+def test_token_subject_hook_and_jwt_fallback():
+    class WithHook(FakeAuth):
+        async def token_subject(self, token):
+            return "username"
+
+    signer = auth.TokenSigner(keys={"k1": "secret"})
+    token = auth.SignedTokenAuth(signer=signer).issue("username2", [])
+    assert asyncio.run(auth.token_subject(WithHook(), "token1")) == "username"
+    assert asyncio.run(auth.token_subject(FakeAuth(), token)) == "username2"
+    assert asyncio.run(auth.token_subject(FakeAuth(), "opaque")) is None
+
+
+def test_end_auth_hook_errors_are_not_raised():
+    class Ends(FakeAuth):
+        def end_auth(self, token):
+            raise RuntimeError("auth server down")
+
+    asyncio.run(auth.end_auth(Ends(), "token1"))
+    asyncio.run(auth.end_auth(FakeAuth(), "token1"))
+
+
+def test_cached_auth_drops_revoked_and_ended_tokens():
+    async def run():
+        inner = FakeAuth(valid_tokens={"token1", "token2", "token3"})
+        cached = auth.CachedAuth(inner, ttl=60, clock=FakeClock())
+        for token in ("token1", "token2", "token3"):
+            await cached.check_auth(token)
+        cached.revoke(auth.Revocation.of(tokens=["token1"]))
+        with pytest.raises(FakeAuth.ShinyLiveAuthExpired):
+            await cached.check_auth("token1")
+        await cached.end_auth("token2")
+        with pytest.raises(FakeAuth.ShinyLiveAuthExpired):
+            await cached.check_auth("token2")
+        # Subjects can't be matched to cached tokens, so the whole cache is dropped
+        cached.revoke(auth.Revocation.of(subjects=["username"]))
+        assert len(cached._entries) == 0
+        assert await cached.check_auth("token3") == "token3"
+        assert inner.check_calls == 4
+    asyncio.run(run())
+
+
+def test_revocation_filter_matches_until_expiry():
+    clock = FakeClock(now=1_000)
+    revoked = auth.RevocationFilter(capacity=1_000, span=60, clock=clock)
+    revoked.add("jti1", 1_100)
+    assert revoked.is_revoked("jti1", 1_100)
+    assert not revoked.is_revoked("jti2", 1_100)
+    assert not revoked.is_revoked("jti1", 5_000)  # other expiry window
+    clock.now = 1_200
+    assert revoked.prune() == 1
+    assert not revoked.is_revoked("jti1", 1_100)
+
+
+def test_revocation_filter_false_positive_rate_and_confirm():
+    revoked = auth.RevocationFilter(capacity=20_000, error_rate=1e-3, span=1e9, clock=lambda: 0)
+    for i in range(20_000):
+        revoked.add(f"revoked{i}", 100)
+    assert all(revoked.is_revoked(f"revoked{i}", 100) for i in range(0, 20_000, 97))
+    positives = [f"other{i}" for i in range(20_000) if revoked.is_revoked(f"other{i}", 100)]
+    assert len(positives) < 60
+    # With an exact check, false positives are confirmed once and then remembered
+    confirms = []
+    revoked.confirm = lambda token_id: confirms.append(token_id) or token_id.startswith("revoked")
+    assert revoked.is_revoked("revoked1", 100)
+    assert all(not revoked.is_revoked(token_id, 100) for token_id in positives * 2)
+    assert confirms == ["revoked1"] + positives
+
+
+def test_revocation_filter_delta_and_snapshot_sync():
+    clock = FakeClock(now=0)
+    server = auth.RevocationFilter(capacity=1_000, span=60, max_delta=2, clock=clock)
+    replica = auth.RevocationFilter(capacity=1_000, span=60, clock=clock)
+
+    async def fetch(since):
+        fetched.append(since)
+        return json.loads(json.dumps(server.changes(since)))
+
+    fetched = []
+    server.add("jti1", 100)
+    assert asyncio.run(replica.sync(fetch)) is True
+    # The first delta is from another instance: refused, then loaded from a snapshot
+    assert fetched == [0, None] and replica.is_revoked("jti1", 100)
+    server.add("jti2", 100)
+    fetched = []
+    assert asyncio.run(replica.sync(fetch)) is True
+    assert fetched == [1] and replica.is_revoked("jti2", 100) and replica.version == 2
+    assert asyncio.run(replica.sync(fetch)) is False
+    # More changes than the server keeps: it answers with a snapshot
+    for i in range(3, 6):
+        server.add(f"jti{i}", 100)
+    fetched = []
+    asyncio.run(replica.sync(fetch))
+    assert fetched == [2] and replica.is_revoked("jti5", 100) and replica.version == 5
+    with pytest.raises(ValueError):
+        auth.RevocationFilter(capacity=10).apply(server.snapshot())
+
+
+def test_revocation_filter_refuses_deltas_from_another_instance():
+    # i.e. two workers behind one address: their version numbers are unrelated
+    clock = FakeClock(now=0)
+    worker1, worker2, replica = (auth.RevocationFilter(span=60, clock=clock) for _ in range(3))
+    worker1.add("jti1", 100)
+    for i in range(2, 5):
+        worker2.add(f"jti{i}", 100)
+    assert replica.apply(worker1.snapshot()) and replica.version == 1
+    # worker2's delta from version 1 would skip jti2
+    assert replica.apply(worker2.changes(1)) is False
+    assert replica.apply(worker2.changes(None))
+    assert all(replica.is_revoked(f"jti{i}", 100) for i in range(2, 5)) and replica.instance == worker2.instance
+
+
+def test_signed_token_auth_end_auth_revokes_token():
+    clock = FakeClock(now=1_000)
+    app_auth = auth.SignedTokenAuth(
+        signer=auth.TokenSigner(keys={"k1": "secret"}), clock=clock, revoked=auth.RevocationFilter(clock=clock)
+    )
+    token, other = app_auth.issue("username", []), app_auth.issue("username", [])
+    app_auth.end_auth(token)
+    with pytest.raises(app_auth.ShinyLiveAuthExpired):
+        asyncio.run(app_auth.check_auth(token))
+    assert asyncio.run(app_auth.check_auth(other)) == other
@@ -0,0 +1,268 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+import shinylive_auth as auth
+import uvicorn
+import websockets
+from shiny import App, render, ui
+
+ID = auth.DEFAULT_AUTH_MODULE_ID
+
+
+class FakeAuth:
+    """`check_auth` answers from `valid` (token -> token it returns); raises `unavailable` instead when set"""
+    def __init__(self, valid=None):
+        self.valid = dict(valid or {})
+        self.unavailable = False
+        self.checks = []
+        self.ended = []
+
+    async def get_auth(self, username, password):
+        raise self.ShinyLiveAuthFailed
+
+    async def check_auth(self, token):
+        self.checks.append(token)
+        if self.unavailable:
+            raise auth.ShinyLiveAuthUnavailable("auth server down")
+        if token not in self.valid:
+            raise self.ShinyLiveAuthExpired
+        return self.valid[token]
+
+    def token_claims(self, token):
+        return {"sub": "username", "groups": ["group1"], "exp": None}
+
+    def end_auth(self, token):
+        self.ended.append(token)
+
+    class ShinyLiveAuthFailed(Exception):
+        ...
+
+    class ShinyLiveAuthExpired(Exception):
+        ...
+
+    class ShinyLivePermissions(Exception):
+        ...
+
+
+def make_app(app_auth, shared=None, **server_args) -> App:
+    app_ui = ui.page_fluid(auth.view(ID, shared=shared), ui.output_text("auth_state"), ui.output_text("token"))
+
+    def server(input, output, session):
+        session_auth = auth.AuthReactiveValues()
+        auth.server(ID, session_auth, app_auth=app_auth, metrics=auth.AuthMetrics(), shared=shared, **server_args)
+
+        @render.text
+        def auth_state():
+            return session_auth.auth_state.get()
+
+        @render.text
+        def token():
+            return session_auth.token.get() if session_auth.token.is_set() else ""
+    return App(app_ui, server)
+
+
+@pytest.fixture(scope="module")
+def loop():
+    # One event loop for every app in this module: Shiny's reactive lock is bound to the first loop that waits on it
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield loop
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(10)
+
+
+@pytest.fixture
+def serve(loop):
+    """Run a Shiny app on a free port (on the background `loop`); returns its websocket URL"""
+    servers = []
+
+    def start(app: App) -> str:
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning"))
+        servers.append((server, asyncio.run_coroutine_threadsafe(server.serve(), loop)))
+        deadline = time.monotonic() + 10
+        while not server.started:
+            assert time.monotonic() < deadline, "server did not start"
+            time.sleep(0.01)
+        port = server.servers[0].sockets[0].getsockname()[1]
+        return f"ws://127.0.0.1:{port}/websocket/"
+    yield start
+    for server, serving in servers:
+        server.should_exit = True
+        serving.result(10)
+
+
+class Browser:
+    """Speaks Shiny's websocket protocol in place of the browser"""
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.outputs = {}
+        self.stored = []  # messages writing the token to localStorage
+        self.texts = []
+
+    @classmethod
+    async def open(cls, url: str, token: str = "", record: dict = None) -> "Browser":
+        browser = cls(await websockets.connect(url))
+        await browser.websocket.send(json.dumps({"method": "init", "data": {
+            f"{ID}-token": token,
+            f"{ID}-shared_session": record,
+            ".clientdata_output_auth_state_hidden": False,
+            ".clientdata_output_token_hidden": False,
+        }}))
+        return browser
+
+    async def update(self, **inputs):
+        await self.websocket.send(json.dumps({"method": "update", "data": {f"{ID}-{k}": v for k, v in inputs.items()}}))
+
+    async def until(self, condition, timeout: float = 5.0):
+        """Receive messages until `condition()` holds"""
+        deadline = time.monotonic() + timeout
+        while not condition():
+            remaining = deadline - time.monotonic()
+            assert remaining > 0, f"timed out; outputs={self.outputs} stored={self.stored}"
+            try:
+                raw = await asyncio.wait_for(self.websocket.recv(), remaining)
+            except asyncio.TimeoutError:
+                raise AssertionError(f"timed out; outputs={self.outputs} stored={self.stored}") from None
+            self.receive(raw)
+
+    def receive(self, raw: str):
+        self.texts.append(raw)
+        message = json.loads(raw)
+        self.outputs.update(message.get("values") or {})
+        custom = (message.get("custom") or {}).get(f"{ID}-token")
+        if custom is not None:
+            self.stored.append(custom["token"])
+
+    def shown(self, text: str) -> bool:
+        return any(text in raw for raw in self.texts)
+
+    async def close(self):
+        await self.websocket.close()
+
+
+def session_test(serve, app: App, test):
+    url = serve(app)
+
+    async def run():
+        browser = None
+        try:
+            browser = await test(url)
+        finally:
+            if browser is not None:
+                await browser.close()
+    asyncio.run(run())
+
+
+def test_background_refresh_rotates_token(serve):
+    app_auth = FakeAuth({"t1": "t1"})
+    schedule = auth.RefreshSchedule(interval=0.3, min_delay=0.3, jitter=0)
+
+    async def test(url):
+        browser = await Browser.open(url, "t1")
+        await browser.until(lambda: browser.outputs.get("auth_state") == auth.AUTH_AUTHENTICATED)
+        app_auth.valid = {"t1": "t2", "t2": "t2"}
+        await browser.until(lambda: browser.stored[-1:] == ["t2"])
+        await browser.until(lambda: browser.outputs.get("token") == "t2")
+        # The next refresh checks the new token
+        await browser.until(lambda: app_auth.checks.count("t2") >= 1)
+        assert browser.outputs["auth_state"] == auth.AUTH_AUTHENTICATED
+        return browser
+    session_test(serve, make_app(app_auth, refresh=schedule), test)
+
+
+def test_background_refresh_keeps_session_while_auth_unavailable(serve):
+    app_auth = FakeAuth({"t1": "t1"})
+    schedule = auth.RefreshSchedule(interval=0.2, min_delay=0.2, jitter=0)
+
+    async def test(url):
+        browser = await Browser.open(url, "t1")
+        await browser.until(lambda: browser.outputs.get("auth_state") == auth.AUTH_AUTHENTICATED)
+        app_auth.unavailable = True
+        checks = len(app_auth.checks)
+        await browser.until(lambda: len(app_auth.checks) >= checks + 2)
+        assert None not in browser.stored
+        assert browser.outputs["auth_state"] == auth.AUTH_AUTHENTICATED
+        app_auth.unavailable = False
+        app_auth.valid = {"t1": "t2", "t2": "t2"}
+        await browser.until(lambda: browser.stored[-1:] == ["t2"])
+        return browser
+    session_test(serve, make_app(app_auth, refresh=schedule), test)
+
+
+def test_optimistic_view_withdrawn_when_check_fails(serve):
+    token = auth.TokenSigner(keys={"k1": "secret"}).encode({"sub": "username", "exp": time.time() + 60})
+    app_auth = FakeAuth()
+
+    async def test(url):
+        browser = await Browser.open(url, token)
+        states = []
+
+        def withdrawn():
+            state = browser.outputs.get("auth_state")
+            if not states or states[-1] != state:
+                states.append(state)
+            return state == auth.AUTH_PENDING and auth.AUTH_OPTIMISTIC in states
+        await browser.until(withdrawn)
+        await browser.until(lambda: browser.shown("Session expired"))
+        assert app_auth.checks == [token]
+        return browser
+    session_test(serve, make_app(app_auth, optimistic=True), test)
+
+
+def test_revocation_logs_out(serve):
+    app_auth = FakeAuth({"t1": "t1"})
+    feed = auth.RevocationFeed()
+
+    async def test(url):
+        browser = await Browser.open(url, "t1")
+        await browser.until(lambda: browser.outputs.get("auth_state") == auth.AUTH_AUTHENTICATED)
+        await browser.update(revoked=auth.Revocation.of(tokens=["t1"]).to_dict())
+        await browser.until(lambda: browser.outputs.get("auth_state") == auth.AUTH_LOGGED_OUT)
+        assert browser.stored[-1:] == [None]
+        assert browser.shown("Your session was ended")
+        # Ended by the revocation already: not ended (or published) again
+        assert app_auth.ended == []
+        return browser
+    session_test(serve, make_app(app_auth, revocations=feed), test)
+
+
+def shared_record(token):
+    return {"token": token, "sub": "username", "groups": ["group1"], "exp": None, "checked": time.time()}
+
+
+def test_ignores_shared_session_records_server_side(serve):
+    # Anyone can write a record into their own localStorage: outside pyodide it never replaces `check_auth`
+    app_auth = FakeAuth()
+    shared = auth.SharedSession(groups_needed=["group1"])
+
+    async def test(url):
+        browser = await Browser.open(url, "forged", shared_record("forged"))
+        await browser.until(lambda: browser.shown("Session expired"))
+        assert app_auth.checks == ["forged"]
+        assert browser.outputs.get("auth_state") != auth.AUTH_AUTHENTICATED
+        return browser
+    session_test(serve, make_app(app_auth, shared=shared), test)
+
+
+def test_adopts_shared_session(serve, monkeypatch):
+    # As in a shinylive app, where the browser is the trust boundary
+    monkeypatch.setattr(auth.SharedSession, "trusted", staticmethod(lambda: True))
+    app_auth = FakeAuth()
+    shared = auth.SharedSession(groups_needed=["group1"])
+
+    async def test(url):
+        browser = await Browser.open(url, "t1", shared_record("t1"))
+        await browser.until(lambda: browser.outputs.get("auth_state") == auth.AUTH_AUTHENTICATED)
+        # Another app of the origin refreshed the token and announced it
+        await browser.update(shared_session=shared_record("t2"))
+        await browser.until(lambda: browser.outputs.get("token") == "t2")
+        # Another app logged out
+        await browser.update(shared_session=None)
+        await browser.until(lambda: browser.outputs.get("auth_state") == auth.AUTH_LOGGED_OUT)
+        assert app_auth.checks == [] and app_auth.ended == []
+        return browser
+    session_test(serve, make_app(app_auth, shared=shared), test)
@@ -0,0 +1,134 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import pytest
+import shinylive_auth as auth
+
+
+@dataclass
+class FakeClock:
+    now: float = 1_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path):
+    def make(**kwargs):
+        if request.param == "memory":
+            return auth.MemorySessionStore(**kwargs)
+        if "maxsize" in kwargs:
+            kwargs["max_rows"] = kwargs.pop("maxsize")
+        return auth.SQLiteSessionStore(str(tmp_path / "sessions.db"), **kwargs)
+    return make
+
+
+def test_store_get_set_pop(make_store):
+    clock = FakeClock()
+    store = make_store(clock=clock)
+    store.set("token1", {"username": "username"}, clock.now + 60)
+    assert store.get("token1") == {"username": "username"}
+    assert store.pop("token1") == {"username": "username"}
+    assert store.get("token1") is None
+    assert store.pop("token1") is None
+
+
+def test_store_expired_entries_are_hidden(make_store):
+    clock = FakeClock()
+    store = make_store(clock=clock)
+    store.set("token1", {"username": "username"}, clock.now + 60)
+    clock.now += 60
+    assert store.get("token1") is None
+    assert store.pop("token1") is None
+
+
+def test_store_sweep(make_store):
+    clock = FakeClock()
+    store = make_store(clock=clock)
+    for i in range(10):
+        store.set(f"token{i}", {"i": i}, clock.now + i + 1)
+    assert store.sweep(clock.now + 5) == 5
+    assert len(store) == 5
+    assert store.get("token9") == {"i": 9}
+
+
+def test_store_set_sweeps_periodically(make_store):
+    clock = FakeClock()
+    store = make_store(clock=clock, sweep_interval=30)
+    store.set("token1", {}, clock.now + 10)
+    clock.now += 30
+    store.set("token2", {}, clock.now + 10)
+    assert len(store) == 1
+
+
+def test_store_bounded_size(make_store):
+    clock = FakeClock()
+    store = make_store(clock=clock, maxsize=3)
+    for i in range(5):
+        store.set(f"token{i}", {"i": i}, clock.now + 100 + i)
+    store.sweep()
+    assert len(store) == 3
+    # Sessions closest to expiry are dropped first
+    assert store.get("token0") is None
+    assert store.get("token4") == {"i": 4}
+
+
+def test_memory_store_overwrite_keeps_latest_expiry():
+    clock = FakeClock()
+    store = auth.MemorySessionStore(clock=clock)
+    store.set("token1", "old", clock.now + 10)
+    store.set("token1", "new", clock.now + 100)
+    assert store.sweep(clock.now + 50) == 0
+    assert store.get("token1") == "new"
+
+
+def test_sqlite_store_shared_between_connections(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    writer = auth.SQLiteSessionStore(path)
+    reader = auth.SQLiteSessionStore(path)
+    writer.set("token1", {"username": "username"}, 4_000_000_000)
+    assert reader.get("token1") == {"username": "username"}
+    assert reader.pop("token1") == {"username": "username"}
+    assert writer.get("token1") is None
+
+
+def test_sqlite_store_shared_between_threads(tmp_path):
+    store = auth.SQLiteSessionStore(str(tmp_path / "sessions.db"), sweep_interval=0)
+
+    def work(n):
+        for i in range(50):
+            token = f"{n}-{i}"
+            store.set(token, {"n": n}, 4_000_000_000)
+            assert store.pop(token) == {"n": n}
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(work, range(4)))
+    assert len(store) == 0
+
+
+def test_rotation_grace_follows_replacements_within_window():
+    clock = FakeClock()
+    grace = auth.RotationGrace(grace=10, clock=clock)
+    grace.rotated("token1", "token2")
+    assert grace.successor("token1") == "token2"
+    assert grace.successor("token2") is None
+    clock.now += 5
+    grace.rotated("token2", "token3")
+    assert grace.successor("token1") == "token3"
+    clock.now += 6
+    # token1's window is over; token2's isn't
+    assert grace.successor("token1") is None
+    assert grace.successor("token2") == "token3"
+    assert "token1" not in str(grace._successors)
+
+
+def test_rotation_grace_bounded():
+    clock = FakeClock()
+    grace = auth.RotationGrace(grace=10, maxsize=2, clock=clock)
+    for i in range(3):
+        grace.rotated(f"token{i}", f"token{i}b")
+    assert grace.successor("token0") is None
+    assert grace.successor("token2") == "token2b"
+    clock.now += 10
+    grace.rotated("token3", "token3b")
+    assert len(grace._successors) == 1
@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+import shinylive_auth as auth
+from test_auth_wrappers import FakeAuth, FakeClock
+from test_signed_token import make_auth
+
+
+def make_shared(clock, groups_needed=("group1",)):
+    return auth.SharedSession(groups_needed=list(groups_needed), max_age=60, clock=clock)
+
+
+@pytest.fixture
+def pyodide(monkeypatch):
+    """Records are only trusted in shinylive apps"""
+    monkeypatch.setattr(auth.SharedSession, "trusted", staticmethod(lambda: True))
+
+
+def test_records_ignored_outside_pyodide():
+    clock = FakeClock(now=1_000)
+    shared = make_shared(clock)
+    record = shared.record("token1", {"sub": "username", "groups": ["group1"], "exp": 1_500})
+    assert shared.trusted() is False
+    assert shared.accepts(record, "token1") is None
+    assert not shared.checked_since(record, "token1", 999)
+
+
+def test_record_groups_do_not_grow_the_index(pyodide):
+    clock = FakeClock(now=1_000)
+    shared = auth.SharedSession(groups_needed=["group1"], clock=clock, permissions=auth.PermissionIndex())
+    bits = len(shared.permissions._bits)
+    record = shared.record("token1", {"sub": "username", "groups": [f"made-up{i}" for i in range(2_000)], "exp": None})
+    assert shared.accepts(record, "token1") is False
+    assert shared.accepts({**record, "groups": record["groups"] + ["group1"]}, "token1") is True
+    assert len(shared.permissions._bits) == bits
+
+
+def test_record_accepted_while_fresh(pyodide):
+    clock = FakeClock(now=1_000)
+    shared = make_shared(clock)
+    record = shared.record("token1", {"sub": "username", "groups": ["group1"], "exp": 1_500})
+    assert shared.accepts(record, "token1") is True
+    # Shiny delivers input arrays as tuples
+    assert shared.accepts({**record, "groups": ("group1",)}, "token1") is True
+    assert shared.accepts(record, "token2") is None
+    assert shared.accepts(None, "token1") is None
+    clock.now = 1_060
+    assert shared.accepts(record, "token1") is None
+
+
+def test_record_expired_or_insufficient_permissions(pyodide):
+    clock = FakeClock(now=1_000)
+    shared = make_shared(clock)
+    expired = shared.record("token1", {"sub": "username", "groups": ["group1"], "exp": 1_000})
+    assert shared.accepts(expired, "token1") is None
+    # Each app checks its own groups against the same record
+    record = shared.record("token1", {"sub": "username", "groups": ["app2"], "exp": None})
+    assert shared.accepts(record, "token1") is False
+    assert make_shared(clock, groups_needed=["app2"]).accepts(record, "token1") is True
+
+
+def test_checked_since(pyodide):
+    clock = FakeClock(now=1_000)
+    shared = make_shared(clock)
+    record = shared.record("token1", {"sub": "username", "groups": [], "exp": None})
+    assert shared.checked_since(record, "token1", 999)
+    assert not shared.checked_since(record, "token1", 1_000)
+    assert not shared.checked_since(record, "token2", 0)
+
+
+def test_token_claims_hook_and_jwt_fallback():
+    class WithHook(FakeAuth):
+        async def token_claims(self, token):
+            return {"sub": "username", "groups": ("group1",), "exp": 1_500}
+
+    class Failing(FakeAuth):
+        def token_claims(self, token):
+            raise RuntimeError("auth server down")
+
+    async def run():
+        app_auth = make_auth()
+        token = app_auth.issue("username2", ["app2"])
+        claims = await auth.token_claims(app_auth, token)
+        assert claims["sub"] == "username2" and claims["groups"] == ["app2"]
+        assert await auth.token_claims(FakeAuth(), token) == claims
+        assert await auth.token_claims(WithHook(), "token1") == {"sub": "username", "groups": ["group1"], "exp": 1_500}
+        assert await auth.token_claims(FakeAuth(), "opaque") is None
+        assert await auth.token_claims(Failing(), token) is None
+        assert await auth.token_claims(app_auth, "garbage") is None
+    asyncio.run(run())
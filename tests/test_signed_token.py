@@ -0,0 +1,153 @@
+import asyncio
+from dataclasses import dataclass
+
+import pytest
+import shinylive_auth as auth
+
+USERS = {"username": ("password", ["app1", "group1"]), "username2": ("password2", ["app2"])}
+
+
+@dataclass
+class FakeClock:
+    now: float = 1_700_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def authenticate(username: str, password: auth.SecretStr):
+    user = USERS.get(username)
+    if user is None or user[0] != password.get_secret_value():
+        return None
+    return user[1]
+
+
+async def authenticate_async(username: str, password: auth.SecretStr):
+    return authenticate(username, password)
+
+
+def make_auth(**kwargs) -> auth.SignedTokenAuth:
+    kwargs.setdefault("signer", auth.TokenSigner(keys={"k1": "secret1"}))
+    kwargs.setdefault("clock", FakeClock())
+    return auth.SignedTokenAuth(authenticate=authenticate, **kwargs)
+
+
+def test_signer_round_trip():
+    signer = auth.TokenSigner(keys={"k1": "secret1"})
+    token = signer.encode({"sub": "username"})
+    assert signer.decode(token) == {"sub": "username"}
+
+
+def test_signer_rejects_tampering():
+    signer = auth.TokenSigner(keys={"k1": "secret1"})
+    header, payload, signature = signer.encode({"sub": "username"}).split(".")
+    forged = auth.TokenSigner(keys={"k1": "secret1"}).encode({"sub": "admin"}).split(".")[1]
+    with pytest.raises(auth.InvalidToken):
+        signer.decode(f"{header}.{forged}.{signature}")
+    with pytest.raises(auth.InvalidToken):
+        signer.decode("not-a-token")
+    with pytest.raises(auth.InvalidToken):
+        auth.TokenSigner(keys={"k1": "other"}).decode(f"{header}.{payload}.{signature}")
+
+
+def test_signer_key_rotation():
+    old = auth.TokenSigner(keys={"k1": "secret1"})
+    rotated = auth.TokenSigner(keys={"k1": "secret1", "k2": "secret2"}, active_kid="k2")
+    old_token = old.encode({"sub": "username"})
+    new_token = rotated.encode({"sub": "username"})
+    assert rotated.decode(old_token) == {"sub": "username"}
+    with pytest.raises(auth.InvalidToken):
+        old.decode(new_token)
+
+
+def test_signed_auth_login_and_check():
+    async def run():
+        app_auth = make_auth(groups_needed=["group1"])
+        token = await app_auth.get_auth("username", auth.SecretStr("password"))
+        assert await app_auth.check_auth(token) == token
+        assert app_auth.claims(token)["groups"] == ["app1", "group1"]
+    asyncio.run(run())
+
+
+def test_signed_auth_async_authenticate():
+    async def run():
+        app_auth = make_auth()
+        app_auth.authenticate = authenticate_async
+        assert await app_auth.get_auth("username", auth.SecretStr("password"))
+    asyncio.run(run())
+
+
+def test_signed_auth_failures():
+    async def run():
+        app_auth = make_auth(groups_needed=["group1"])
+        with pytest.raises(app_auth.ShinyLiveAuthFailed):
+            await app_auth.get_auth("username", auth.SecretStr("wrong"))
+        with pytest.raises(app_auth.ShinyLivePermissions):
+            await app_auth.get_auth("username2", auth.SecretStr("password2"))
+        with pytest.raises(app_auth.ShinyLiveAuthExpired):
+            await app_auth.check_auth("garbage")
+    asyncio.run(run())
+
+
+def test_signed_auth_permissions_checked_per_app():
+    async def run():
+        signer = auth.TokenSigner(keys={"k1": "secret1"})
+        token = await make_auth(signer=signer).get_auth("username2", auth.SecretStr("password2"))
+        with pytest.raises(auth.SignedTokenAuth.ShinyLivePermissions):
+            await make_auth(signer=signer, groups_needed=["group1"]).check_auth(token)
+    asyncio.run(run())
+
+
+def test_signed_auth_expiry():
+    async def run():
+        clock = FakeClock()
+        app_auth = make_auth(clock=clock, expires_in=60)
+        token = await app_auth.get_auth("username", auth.SecretStr("password"))
+        clock.now += 60
+        with pytest.raises(app_auth.ShinyLiveAuthExpired):
+            await app_auth.check_auth(token)
+    asyncio.run(run())
+
+
+def test_signed_auth_sliding_refresh():
+    async def run():
+        clock = FakeClock()
+        app_auth = make_auth(clock=clock, expires_in=60, refresh_within=20, max_lifetime=1_000)
+        token = await app_auth.get_auth("username", auth.SecretStr("password"))
+        clock.now += 30
+        assert await app_auth.check_auth(token) == token
+        clock.now += 15
+        refreshed = await app_auth.check_auth(token)
+        assert refreshed != token
+        # Not past `max_lifetime`: a full `expires_in` more
+        assert app_auth.claims(refreshed)["exp"] == int(clock.now + 60)
+    asyncio.run(run())
+
+
+def test_signed_auth_refresh_capped_by_max_lifetime():
+    async def run():
+        clock = FakeClock()
+        app_auth = make_auth(clock=clock, expires_in=60, refresh_within=20, max_lifetime=120)
+        login = clock.now
+        token = await app_auth.get_auth("username", auth.SecretStr("password"))
+        clock.now += 45
+        token = await app_auth.check_auth(token)
+        clock.now += 40
+        # Refreshed just before `max_lifetime`: only up to it, not `expires_in` past it
+        refreshed = await app_auth.check_auth(token)
+        assert app_auth.claims(refreshed)["exp"] == login + 120
+        clock.now += 20
+        assert await app_auth.check_auth(refreshed) == refreshed
+        clock.now += 15
+        with pytest.raises(app_auth.ShinyLiveAuthExpired):
+            await app_auth.check_auth(refreshed)
+    asyncio.run(run())
+
+
+def test_peek_claims_reads_without_verifying():
+    token = auth.TokenSigner(keys={"k1": "secret1"}).encode({"sub": "username", "exp": 1})
+    assert auth.peek_claims(token) == {"sub": "username", "exp": 1}
+    header, payload, _ = token.split(".")
+    assert auth.peek_claims(f"{header}.{payload}.forged") == {"sub": "username", "exp": 1}
+    assert auth.peek_claims("opaque-session-id") is None
+    assert auth.peek_claims("a.!!!.c") is None
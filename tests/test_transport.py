@@ -0,0 +1,155 @@
+import asyncio
+import socket
+import sys
+from pathlib import Path
+
+import pytest
+import shinylive_auth as auth
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src_dev"))
+
+from restapi_security import transport as transport_module  # noqa: E402
+from restapi_security.auth import RestAPIAuth  # noqa: E402
+from restapi_security.transport import (  # noqa: E402
+    CircuitBreaker, CircuitOpen, PyfetchTransport, ResilientTransport, TransportError, TransportResponse
+)
+
+
+class FakeTransport:
+    """Answers each call with the next item of `outcomes` (a status, or an exception to raise)"""
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    async def post_json(self, url, payload, timeout=None):
+        self.calls.append(timeout)
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return TransportResponse(status=outcome, data={"token": "token"} if outcome == 200 else None)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+
+    async def sleep(delay):
+        delays.append(delay)
+    monkeypatch.setattr(transport_module.asyncio, "sleep", sleep)
+    # Full jitter draws from [0, cap); take the cap so the backoff is visible
+    monkeypatch.setattr(transport_module.random, "uniform", lambda low, high: high)
+    return delays
+
+
+def test_retries_with_backoff(sleeps):
+    fake = FakeTransport(TransportError("reset"), 503, 200)
+    resilient = ResilientTransport(fake, retries=2, backoff=0.1)
+    assert asyncio.run(resilient.post_json("http://test/auth/check", {})).status == 200
+    assert len(fake.calls) == 3
+    assert sleeps == [0.1, 0.2]
+
+
+def test_gives_up_after_retries(sleeps):
+    fake = FakeTransport(503, 503, 503)
+    with pytest.raises(TransportError, match="503"):
+        asyncio.run(ResilientTransport(fake, retries=2).post_json("http://test/auth/check", {}))
+    assert len(fake.calls) == 3 and len(sleeps) == 2
+
+
+def test_client_errors_are_not_retried(sleeps):
+    fake = FakeTransport(401)
+    assert asyncio.run(ResilientTransport(fake).post_json("http://test/auth/check", {})).status == 401
+    assert len(fake.calls) == 1 and sleeps == []
+
+
+def test_timeouts(sleeps):
+    fake = FakeTransport(200, 200)
+    resilient = ResilientTransport(fake, timeout=5.0)
+    asyncio.run(resilient.post_json("http://test/auth/check", {}))
+    asyncio.run(resilient.post_json("http://test/auth/check", {}, timeout=1.0))
+    assert fake.calls == [5.0, 1.0]
+
+
+def test_circuit_breaker_opens_and_recovers():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_after=30, clock=clock)
+    breaker.before_call()
+    breaker.record_failure()
+    assert not breaker.is_open
+    breaker.record_failure()
+    assert breaker.is_open
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+
+    # Half-open after `reset_after`: one trial call; a failure opens the circuit again straight away
+    clock.now = 30
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.is_open
+
+    clock.now = 60
+    breaker.before_call()
+    breaker.record_success()
+    assert not breaker.is_open
+    breaker.record_failure()
+    assert not breaker.is_open
+
+
+def test_open_circuit_fails_fast(sleeps):
+    breaker = CircuitBreaker(failure_threshold=1, clock=Clock())
+    fake = FakeTransport(TransportError("timed out"))
+    resilient = ResilientTransport(fake, retries=0, breaker=breaker)
+    with pytest.raises(TransportError):
+        asyncio.run(resilient.post_json("http://test/auth/check", {}))
+    with pytest.raises(CircuitOpen):
+        asyncio.run(resilient.post_json("http://test/auth/check", {}))
+    assert len(fake.calls) == 1
+
+
+def test_large_batch_checks_are_split():
+    class BatchTransport:
+        def __init__(self):
+            self.sizes = []
+
+        async def post_json(self, url, payload, timeout=None):
+            self.sizes.append(len(payload["tokens"]))
+            results = [{"status": 200, "token": token} for token in payload["tokens"]]
+            return TransportResponse(status=200, data={"results": results})
+
+    batch = BatchTransport()
+    tokens = [f"token{i}" for i in range(RestAPIAuth.BATCH_SIZE * 2 + 1)]
+    assert asyncio.run(RestAPIAuth(base_url="http://test", transport=batch).check_auth_many(tokens)) == tokens
+    assert batch.sizes == [RestAPIAuth.BATCH_SIZE, RestAPIAuth.BATCH_SIZE, 1]
+
+
+def test_unreachable_server_is_not_an_expired_session(sleeps):
+    app_auth = RestAPIAuth(
+        base_url="http://test", transport=ResilientTransport(FakeTransport(*[TransportError("refused")] * 3))
+    )
+    with pytest.raises(auth.ShinyLiveAuthUnavailable):
+        asyncio.run(app_auth.check_auth("token"))
+    for status in (500, 502):
+        with pytest.raises(auth.ShinyLiveAuthUnavailable):
+            asyncio.run(RestAPIAuth(base_url="http://test", transport=FakeTransport(status)).check_auth("token"))
+    with pytest.raises(app_auth.ShinyLiveAuthExpired):
+        asyncio.run(RestAPIAuth(base_url="http://test", transport=FakeTransport(401)).check_auth("token"))
+
+
+def test_pyfetch_connection_errors_are_transport_errors(sleeps):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    # Outside pyodide, `pyfetch_mimic` raises httpx's errors
+    with pytest.raises(TransportError):
+        asyncio.run(PyfetchTransport().post_json(f"http://127.0.0.1:{port}/auth/check", {}))
+    app_auth = RestAPIAuth(base_url=f"http://127.0.0.1:{port}", transport=ResilientTransport(PyfetchTransport()))
+    with pytest.raises(auth.ShinyLiveAuthUnavailable):
+        asyncio.run(app_auth.check_auth("token"))
@@ -0,0 +1,320 @@
+"""Incremental, content-addressed deploy of exported shinylive apps (targets from `shinylive_deploy.toml`)
+
+- Every file is stored once per target under `<directory>/.objects/<sha256>`; app paths are links to those
+  objects (hard links locally, symlinks over SFTP), so apps sharing assets (i.e. the `shinylive_auth` wheel,
+  pyodide) upload and store them once
+- Each app has a manifest (`<directory>/<app>/.deploy-manifest.json`, path -> sha256); a deploy only uploads
+  objects the target doesn't have, relinks changed paths and removes deleted ones, so its cost follows the size
+  of the change rather than the size of the bundle
+- Local file hashes are cached by size/mtime in `<source>/.deploy-hashes.json`, so unchanged files aren't re-read
+
+Usage:
+    shinylive export src_dev staging/test-app                 # or however the bundle is exported
+    python tools/deploy.py local                              # [deploy.local] in shinylive_deploy.toml
+    python tools/deploy.py server --source staging/test-app   # [deploy.server]; needs `pip install paramiko`
+    python tools/deploy.py local --dry-run
+"""
+import argparse
+import hashlib
+import json
+import os
+import posixpath
+import shutil
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Protocol, Set
+
+ROOT = Path(__file__).resolve().parent.parent
+CONFIG = ROOT / "shinylive_deploy.toml"
+OBJECTS = ".objects"
+MANIFEST = ".deploy-manifest.json"
+HASH_CACHE = ".deploy-hashes.json"
+
+
+def load_config(path: Path = CONFIG) -> dict:
+    try:
+        import tomllib
+    except ImportError:  # Python < 3.11
+        import tomli as tomllib
+    with open(path, "rb") as f:
+        return tomllib.load(f)
+
+
+##########################################################################
+# Local bundle
+##########################################################################
+def hash_file(path: Path) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def scan(source: Path, save_cache: bool = True) -> Dict[str, str]:
+    """Relative POSIX path -> sha256 for every file under `source` (reusing cached hashes of unchanged files)
+
+    - `save_cache=False` leaves `source` untouched (i.e. on a dry run)
+    """
+    cache_path = source / HASH_CACHE
+    try:
+        cache = json.loads(cache_path.read_text())
+    except (OSError, ValueError):
+        cache = {}
+    files, new_cache = {}, {}
+    for path in sorted(source.rglob("*")):
+        if not path.is_file() or path.name in (HASH_CACHE, MANIFEST):
+            continue
+        rel = path.relative_to(source).as_posix()
+        stat = path.stat()
+        cached = cache.get(rel)
+        if cached is not None and cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+            digest = cached["sha256"]
+        else:
+            digest = hash_file(path)
+        files[rel] = digest
+        new_cache[rel] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}
+    if save_cache:
+        cache_path.write_text(json.dumps(new_cache))
+    return files
+
+
+##########################################################################
+# Targets
+##########################################################################
+class Target(Protocol):
+    def read_manifest(self, app: str) -> Dict[str, str]:
+        ...
+
+    def objects(self) -> Set[str]:
+        """sha256 of every object already stored on the target"""
+        ...
+
+    def put_object(self, digest: str, path: Path):
+        ...
+
+    def link(self, app: str, rel: str, digest: str):
+        """Point `<app>/<rel>` at the stored object `digest` (replacing what was there)"""
+        ...
+
+    def remove(self, app: str, rel: str):
+        ...
+
+    def write_manifest(self, app: str, manifest: Dict[str, str]):
+        ...
+
+
+@dataclass
+class LocalTarget:
+    """Deploy into a local directory (i.e. the test webserver's `shinyapps/`), with hard-linked objects"""
+    directory: Path
+
+    def __post_init__(self):
+        self.directory = Path(self.directory)
+        (self.directory / OBJECTS).mkdir(parents=True, exist_ok=True)
+
+    def read_manifest(self, app: str) -> Dict[str, str]:
+        try:
+            return json.loads((self.directory / app / MANIFEST).read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def objects(self) -> Set[str]:
+        return {p.name for p in (self.directory / OBJECTS).iterdir()}
+
+    def put_object(self, digest: str, path: Path):
+        destination = self.directory / OBJECTS / digest
+        tmp = destination.with_name(f"{digest}.tmp")
+        shutil.copyfile(path, tmp)
+        os.replace(tmp, destination)
+
+    def link(self, app: str, rel: str, digest: str):
+        destination = self.directory / app / rel
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        tmp = destination.with_name(f".{destination.name}.tmp")
+        tmp.unlink(missing_ok=True)
+        try:
+            os.link(self.directory / OBJECTS / digest, tmp)
+        except OSError:  # i.e. filesystems without hard links
+            shutil.copyfile(self.directory / OBJECTS / digest, tmp)
+        os.replace(tmp, destination)
+
+    def remove(self, app: str, rel: str):
+        (self.directory / app / rel).unlink(missing_ok=True)
+
+    def write_manifest(self, app: str, manifest: Dict[str, str]):
+        path = self.directory / app / MANIFEST
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{MANIFEST}.tmp")
+        tmp.write_text(json.dumps(manifest, indent=1, sort_keys=True))
+        os.replace(tmp, path)
+
+
+@dataclass
+class SFTPTarget:
+    """Deploy over SFTP; app paths are relative symlinks into `.objects` (SFTP has no portable hard link)
+
+    - The web server must follow the symlinks and take the content type from the link's name (i.e. nginx, or
+      Starlette `StaticFiles(follow_symlink=True)`)
+    """
+    host: str
+    user: str
+    directory: str
+    port: int = 22
+    key_filename: Optional[str] = None
+    _sftp: Optional[object] = field(default=None, init=False, repr=False)
+
+    @property
+    def sftp(self):
+        if self._sftp is None:
+            import paramiko
+
+            client = paramiko.SSHClient()
+            client.load_system_host_keys()
+            client.connect(self.host, port=self.port, username=self.user, key_filename=self.key_filename)
+            self._sftp = client.open_sftp()
+            self._makedirs(posixpath.join(self.directory, OBJECTS))
+        return self._sftp
+
+    def read_manifest(self, app: str) -> Dict[str, str]:
+        try:
+            with self.sftp.open(posixpath.join(self.directory, app, MANIFEST)) as f:
+                return json.loads(f.read())
+        except (OSError, ValueError):
+            return {}
+
+    def objects(self) -> Set[str]:
+        return set(self.sftp.listdir(posixpath.join(self.directory, OBJECTS)))
+
+    def put_object(self, digest: str, path: Path):
+        destination = posixpath.join(self.directory, OBJECTS, digest)
+        self.sftp.put(str(path), f"{destination}.tmp")
+        self.sftp.posix_rename(f"{destination}.tmp", destination)
+
+    def link(self, app: str, rel: str, digest: str):
+        destination = posixpath.join(self.directory, app, rel)
+        self._makedirs(posixpath.dirname(destination))
+        target = posixpath.relpath(posixpath.join(self.directory, OBJECTS, digest), posixpath.dirname(destination))
+        tmp = posixpath.join(posixpath.dirname(destination), f".{posixpath.basename(destination)}.tmp")
+        self._remove(tmp)
+        self.sftp.symlink(target, tmp)
+        self.sftp.posix_rename(tmp, destination)
+
+    def remove(self, app: str, rel: str):
+        self._remove(posixpath.join(self.directory, app, rel))
+
+    def write_manifest(self, app: str, manifest: Dict[str, str]):
+        path = posixpath.join(self.directory, app, MANIFEST)
+        self._makedirs(posixpath.dirname(path))
+        with self.sftp.open(f"{path}.tmp", "w") as f:
+            f.write(json.dumps(manifest, indent=1, sort_keys=True))
+        self.sftp.posix_rename(f"{path}.tmp", path)
+
+    def _remove(self, path: str):
+        try:
+            self.sftp.remove(path)
+        except OSError:
+            pass
+
+    def _makedirs(self, path: str):
+        parts = [p for p in path.split("/") if p]
+        current = "/" if path.startswith("/") else ""
+        for part in parts:
+            current = posixpath.join(current, part) if current else part
+            try:
+                self.sftp.stat(current)
+            except OSError:
+                self.sftp.mkdir(current)
+
+
+##########################################################################
+# Deploy
+##########################################################################
+@dataclass
+class DeployResult:
+    uploaded: int = 0
+    uploaded_bytes: int = 0
+    linked: int = 0
+    removed: int = 0
+    unchanged: int = 0
+    seconds: float = 0.0
+
+
+def deploy(source: Path, app: str, target: Target, dry_run: bool = False) -> DeployResult:
+    """Bring `<target>/<app>` in line with `source`, uploading only objects the target doesn't have yet"""
+    start = time.perf_counter()
+    source = Path(source)
+    files = scan(source, save_cache=not dry_run)
+    deployed = target.read_manifest(app)
+    stored = target.objects()
+    result = DeployResult()
+
+    changed = {rel: digest for rel, digest in files.items() if deployed.get(rel) != digest}
+    removed = [rel for rel in deployed if rel not in files]
+    result.unchanged = len(files) - len(changed)
+    uploads: Dict[str, str] = {}
+    for rel, digest in changed.items():
+        if digest not in stored and digest not in uploads:
+            uploads[digest] = rel
+
+    if not dry_run:
+        # Objects first, then links, then the manifest: an interrupted deploy is finished by the next run
+        for digest, rel in uploads.items():
+            target.put_object(digest, source / rel)
+        for rel, digest in changed.items():
+            target.link(app, rel, digest)
+        for rel in removed:
+            target.remove(app, rel)
+        target.write_manifest(app, files)
+
+    result.uploaded = len(uploads)
+    result.uploaded_bytes = sum((source / rel).stat().st_size for rel in uploads.values())
+    result.linked = len(changed)
+    result.removed = len(removed)
+    result.seconds = round(time.perf_counter() - start, 3)
+    return result
+
+
+def make_target(name: str, config: dict) -> Target:
+    settings = config["deploy"][name]
+    if name == "local":
+        return LocalTarget(ROOT / settings["directory"])
+    if name == "server":
+        return SFTPTarget(
+            host=settings["host"], user=settings["user"], port=int(settings.get("port", 22)),
+            directory=settings["directory"], key_filename=settings.get("key_filename")
+        )
+    raise ValueError(f"Unknown deploy target '{name}'")
+
+
+def parse_args(argv: Optional[Iterable[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("target", choices=["local", "server"], help="[deploy.<target>] in shinylive_deploy.toml")
+    parser.add_argument("--config", type=Path, default=CONFIG)
+    parser.add_argument("--app", help="app name (default: [general] app_name)")
+    parser.add_argument("--source", type=Path, help="exported bundle (default: <staging directory>/<app>)")
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without deploying")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[Iterable[str]] = None) -> int:
+    args = parse_args(argv)
+    config = load_config(args.config)
+    app = args.app or config["general"]["app_name"]
+    source = args.source or ROOT / config["deploy"]["staging"]["directory"] / app
+    if not source.is_dir():
+        print(f"No exported bundle at {source}; export the app first (or pass --source)", file=sys.stderr)
+        return 1
+    result = deploy(source, app, make_target(args.target, config), dry_run=args.dry_run)
+    print(
+        f"{'[dry run] ' if args.dry_run else ''}{app} -> {args.target}: "
+        f"{result.uploaded} objects uploaded ({result.uploaded_bytes / 1e6:.1f} MB), {result.linked} paths linked, "
+        f"{result.removed} removed, {result.unchanged} unchanged in {result.seconds}s"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())